@@ -1,7 +1,13 @@
 import streamlit as st
-import pdfplumber
-from utils.extraccion import extract_datos_pulmonar
-from utils.analisis_gli import analizar_espirometria, analizar_dlco, analizar_volumenes, generar_interpretacion_general, calcular_valor_esperado_fev1, calcular_valor_esperado_fvc, interpretar_z_score_con_severidad, calcular_z_score
+from utils.procesamiento import ingerir_pdfs
+from utils.exportacion import ESCRITORES, TIPOS_MIME, exportar_bytes
+from utils.analisis_gli import analizar_estudio, generar_interpretacion_general, calcular_valor_esperado_fev1, calcular_valor_esperado_fvc, interpretar_z_score_con_severidad, estadisticas_cache_predicciones
+from utils.cache_extraccion import estadisticas_cache_extraccion
+from utils.graficos import estadisticas_cache_graficos, grafico_cacheado, grafico_z_scores, nueva_figura
+from utils.instrumentacion import medir, metricas_activas, registro_metricas, servir_metricas
+from utils.lms_gli import obtener_s_l, calcular_z_score_lms
+from utils.reporte_pdf import generar_reporte_pdf as construir_reporte_pdf
+from utils.reportes_lote import ESCRITORES_REPORTES, MAX_BYTES_REPORTES_EN_MEMORIA, TIPOS_MIME_REPORTES, exportar_reportes, nombre_reporte
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -9,21 +15,15 @@ from plotly.subplots import make_subplots
 import hashlib
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.colors import LinearSegmentedColormap
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
 import io
 import base64
+import tempfile
 from patrones_functions import (
     mostrar_deteccion_patrones, 
     procesar_multiples_pdfs, 
-    mostrar_comparacion_temporal,
-    mapear_claves_pre
+    mostrar_comparacion_temporal
 )
 
 st.set_page_config(
@@ -33,6 +33,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Endpoint Prometheus de las métricas por etapa si se define PULMOREPORT_METRICAS_PUERTO
+servir_metricas()
+
 # Configurar el tema personalizado
 st.markdown("""
 <style>
@@ -255,24 +258,118 @@ def mostrar_dashboard_overview(metricas):
             </div>
             """, unsafe_allow_html=True)
 
-def crear_grafico_espirometria_horizontal(resultados):
-    """Función placeholder - implementar según el archivo original"""
-    return None
+@medir('graficos.espirometria')
+def crear_grafico_espirometria_horizontal(resultados, destino='pantalla'):
+    """
+    Gráfico de puntuaciones Z de espirometría (PNG en bytes), o None si no hay z-scores.
+    """
+    return grafico_z_scores('Análisis de Espirometría - Puntuaciones Z', resultados, destino)
 
-def crear_grafico_dlco_horizontal(resultados):
-    """Función placeholder - implementar según el archivo original"""
-    return None
+@medir('graficos.dlco')
+def crear_grafico_dlco_horizontal(resultados, destino='pantalla'):
+    """
+    Gráfico de puntuaciones Z de difusión (PNG en bytes), o None si no hay z-scores.
+    """
+    return grafico_z_scores('Análisis de DLCO - Puntuaciones Z', resultados, destino)
 
-def crear_grafico_volumenes_horizontal(resultados):
-    """Función placeholder - implementar según el archivo original"""
-    return None
+@medir('graficos.volumenes')
+def crear_grafico_volumenes_horizontal(resultados, destino='pantalla'):
+    """
+    Gráfico de puntuaciones Z de volúmenes pulmonares (PNG en bytes), o None si no hay z-scores.
+    """
+    return grafico_z_scores('Análisis de Volúmenes Pulmonares - Puntuaciones Z', resultados, destino)
 
-def crear_grafico_broncodilatacion_horizontal(datos):
+def _figura_broncodilatacion(cambio_fev1, cambio_fvc):
+    """
+    Figura del gráfico de broncodilatación a partir del % de cambio de FEV1 y FVC.
+    """
+    # Configurar figura
+    fig, ax = nueva_figura((10, 4))  # Gráfico más pequeño
+    
+    # Parámetros y valores
+    params = ['FEV1', 'FVC']
+    cambios = [cambio_fev1, cambio_fvc]
+    colores = []
+    
+    # Determinar colores basados en el cambio
+    for cambio in cambios:
+        if cambio >= 12:  # Respuesta significativa
+            colores.append('#90EE90')  # Verde claro
+        elif cambio >= 5:  # Respuesta parcial
+            colores.append('#FFB347')  # Naranja claro
+        else:  # Sin respuesta significativa
+            colores.append('#FFB6C1')  # Rojo claro
+    
+    # Crear barras horizontales
+    y_positions = np.arange(len(params))
+    bar_width = 0.3
+    
+    # Calcular límites dinámicos primero
+    min_cambio = min(cambios) if cambios else -20
+    max_cambio = max(cambios) if cambios else 40
+    
+    # Ajustar límites para mantener valores cerca de las barras
+    if min_cambio < -20:
+        x_min = min_cambio - 2  # Un poco más allá del valor mínimo
+    else:
+        x_min = -20
+    
+    if max_cambio > 40:
+        x_max = max_cambio + 2  # Un poco más allá del valor máximo
+    else:
+        x_max = 40
+    
+    # Crear barras de cambio
+    for i, (param, cambio, color) in enumerate(zip(params, cambios, colores)):
+        # Crear rectángulo de fondo
+        rect = patches.Rectangle((x_min, i - bar_width/2), x_max - x_min, bar_width, 
+                               facecolor='lightgray', alpha=0.3, edgecolor='gray', linewidth=0.5)
+        ax.add_patch(rect)
+        
+        # Marcar la posición del cambio
+        ax.plot(cambio, i, '*', markersize=15, markeredgecolor='white', 
+                markeredgewidth=1, color=color)
+        
+        # Agregar valor del cambio como texto
+        ax.text(cambio + 1, i, f'{cambio:.1f}%', ha='left', va='center', 
+                fontsize=10, fontweight='bold', color=color)
+    
+    # Líneas de referencia
+    ax.axvline(x=0, color='black', linewidth=2, linestyle='-', alpha=0.7)
+    ax.axvline(x=5, color='orange', linewidth=2, linestyle='--', alpha=0.7)
+    ax.axvline(x=12, color='green', linewidth=2, linestyle='--', alpha=0.7)
+    
+    # Agregar etiquetas a las líneas
+    ax.text(0, len(params) + 0.2, 'Sin cambio', ha='center', va='bottom', 
+            fontsize=10, fontweight='bold', color='black')
+    ax.text(5, len(params) + 0.2, '5%', ha='center', va='bottom', 
+            fontsize=10, fontweight='bold', color='orange')
+    ax.text(12, len(params) + 0.2, '12%', ha='center', va='bottom', 
+            fontsize=10, fontweight='bold', color='green')
+    
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(-0.5, len(params) - 0.5)
+    ax.set_yticks(y_positions)
+    ax.set_yticklabels(params, fontsize=12, fontweight='bold')
+    ax.set_xlabel('Cambio (%)', fontsize=14, fontweight='bold')
+    ax.set_title('Respuesta a Broncodilatador', fontsize=16, fontweight='bold', pad=20)
+    
+    # Agregar grid horizontal
+    ax.grid(axis='x', alpha=0.3, linestyle='--')
+    
+    # Configurar espaciado
+    fig.tight_layout()
+    
+    return fig
+
+@medir('graficos.broncodilatacion')
+def crear_grafico_broncodilatacion_horizontal(datos, destino='pantalla'):
     """
     Crea un gráfico de barras horizontal para broncodilatación con:
     - Comparación pre/post broncodilatador
     - Porcentaje de cambio
     - Interpretación visual de la respuesta
+    Devuelve el PNG en bytes con la resolución del destino ('pantalla' o 'pdf').
     """
     if not datos:
         return None
@@ -303,89 +400,9 @@ def crear_grafico_broncodilatacion_horizontal(datos):
         cambio_fev1 = ((fev1_post - fev1_pre) / fev1_pre) * 100
         cambio_fvc = ((fvc_post - fvc_pre) / fvc_pre) * 100
         
-        # Configurar figura
-        fig, ax = plt.subplots(figsize=(10, 4))  # Gráfico más pequeño
-        
-        # Parámetros y valores
-        params = ['FEV1', 'FVC']
-        cambios = [cambio_fev1, cambio_fvc]
-        colores = []
-        
-        # Determinar colores basados en el cambio
-        for cambio in cambios:
-            if cambio >= 12:  # Respuesta significativa
-                colores.append('#90EE90')  # Verde claro
-            elif cambio >= 5:  # Respuesta parcial
-                colores.append('#FFB347')  # Naranja claro
-            else:  # Sin respuesta significativa
-                colores.append('#FFB6C1')  # Rojo claro
-        
-        # Crear barras horizontales
-        y_positions = np.arange(len(params))
-        bar_width = 0.3
-        
-        # Calcular límites dinámicos primero
-        min_cambio = min(cambios) if cambios else -20
-        max_cambio = max(cambios) if cambios else 40
-        
-        # Ajustar límites para mantener valores cerca de las barras
-        if min_cambio < -20:
-            x_min = min_cambio - 2  # Un poco más allá del valor mínimo
-        else:
-            x_min = -20
-        
-        if max_cambio > 40:
-            x_max = max_cambio + 2  # Un poco más allá del valor máximo
-        else:
-            x_max = 40
-        
-        # Crear barras de cambio
-        for i, (param, cambio, color) in enumerate(zip(params, cambios, colores)):
-            # Crear rectángulo de fondo
-            rect = patches.Rectangle((x_min, i - bar_width/2), x_max - x_min, bar_width, 
-                                   facecolor='lightgray', alpha=0.3, edgecolor='gray', linewidth=0.5)
-            ax.add_patch(rect)
-            
-            # Marcar la posición del cambio
-            ax.plot(cambio, i, '*', markersize=15, markeredgecolor='white', 
-                    markeredgewidth=1, color=color)
-            
-            # Agregar valor del cambio como texto
-            ax.text(cambio + 1, i, f'{cambio:.1f}%', ha='left', va='center', 
-                    fontsize=10, fontweight='bold', color=color)
-        
-        # Líneas de referencia
-        ax.axvline(x=0, color='black', linewidth=2, linestyle='-', alpha=0.7)
-        ax.axvline(x=5, color='orange', linewidth=2, linestyle='--', alpha=0.7)
-        ax.axvline(x=12, color='green', linewidth=2, linestyle='--', alpha=0.7)
-        
-        # Agregar etiquetas a las líneas
-        ax.text(0, len(params) + 0.2, 'Sin cambio', ha='center', va='bottom', 
-                fontsize=10, fontweight='bold', color='black')
-        ax.text(5, len(params) + 0.2, '5%', ha='center', va='bottom', 
-                fontsize=10, fontweight='bold', color='orange')
-        ax.text(12, len(params) + 0.2, '12%', ha='center', va='bottom', 
-                fontsize=10, fontweight='bold', color='green')
-        
-        ax.set_xlim(x_min, x_max)
-        ax.set_ylim(-0.5, len(params) - 0.5)
-        ax.set_yticks(y_positions)
-        ax.set_yticklabels(params, fontsize=12, fontweight='bold')
-        ax.set_xlabel('Cambio (%)', fontsize=14, fontweight='bold')
-        ax.set_title('Respuesta a Broncodilatador', fontsize=16, fontweight='bold', pad=20)
-        
-        # Agregar grid horizontal
-        ax.grid(axis='x', alpha=0.3, linestyle='--')
-        
-        # Configurar espaciado
-        plt.tight_layout()
-        
-        # Guardar con fondo transparente
-        plt.savefig('broncodilatacion_z_scores.png', dpi=300, bbox_inches='tight', 
-                    transparent=True, facecolor='none')
-        plt.close()
-        
-        return 'broncodilatacion_z_scores.png'
+        # Se reutiliza el PNG ya renderizado si los cambios no han variado (p.ej. al cambiar otro widget)
+        return grafico_cacheado('broncodilatacion', [cambio_fev1, cambio_fvc],
+                                lambda: _figura_broncodilatacion(cambio_fev1, cambio_fvc), destino)
         
     except (ValueError, TypeError):
         return None
@@ -478,10 +495,12 @@ def interpretar_broncodilatacion(datos):
         # Calcular z-score pre y post
         fev1_esp = calcular_valor_esperado_fev1(edad, altura, sexo)
         fvc_esp = calcular_valor_esperado_fvc(edad, altura, sexo)
-        z_fev1_pre = calcular_z_score(fev1_pre, fev1_esp)
-        z_fev1_post = calcular_z_score(fev1_post, fev1_esp)
-        z_fvc_pre = calcular_z_score(fvc_pre, fvc_esp)
-        z_fvc_post = calcular_z_score(fvc_post, fvc_esp)
+        s_fev1, l_fev1 = obtener_s_l('fev1', edad, sexo)
+        s_fvc, l_fvc = obtener_s_l('fvc', edad, sexo)
+        z_fev1_pre = calcular_z_score_lms(fev1_pre, fev1_esp, s_fev1, l_fev1)
+        z_fev1_post = calcular_z_score_lms(fev1_post, fev1_esp, s_fev1, l_fev1)
+        z_fvc_pre = calcular_z_score_lms(fvc_pre, fvc_esp, s_fvc, l_fvc)
+        z_fvc_post = calcular_z_score_lms(fvc_post, fvc_esp, s_fvc, l_fvc)
         int_fev1_pre, sev_fev1_pre = interpretar_z_score_con_severidad(z_fev1_pre)
         int_fev1_post, sev_fev1_post = interpretar_z_score_con_severidad(z_fev1_post)
         int_fvc_pre, sev_fvc_pre = interpretar_z_score_con_severidad(z_fvc_pre)
@@ -508,8 +527,49 @@ def generar_recomendaciones_clinicas(resultados_espiro, resultados_dlco, resulta
     return "Recomendaciones clínicas"
 
 def generar_reporte_pdf(datos, resultados_espiro, resultados_dlco, resultados_vol, interpretacion_bd, nombre_archivo="PulmoReport_AI"):
-    """Función placeholder - implementar según el archivo original"""
-    return None
+    """
+    Genera un reporte PDF completo del análisis de función pulmonar (buffer en memoria, o None si falla)
+    """
+    try:
+        recomendaciones = generar_recomendaciones_clinicas(resultados_espiro, resultados_dlco, resultados_vol, interpretacion_bd)
+        return io.BytesIO(construir_reporte_pdf(
+            datos, resultados_espiro, resultados_dlco, resultados_vol,
+            interpretacion_bd, recomendaciones, titulo=nombre_archivo
+        ))
+    except Exception as e:
+        st.error(f"Error generando PDF: {str(e)}")
+        return None
+
+def crear_reporte_lote(estudio):
+    """
+    (nombre, PDF) del reporte de un estudio para la exportación masiva, con la misma interpretación
+    de broncodilatación y recomendaciones que el botón de cada archivo. Se ejecuta en los hilos del
+    pool: no usa comandos de Streamlit.
+    """
+    datos = estudio['datos']
+    interpretacion_bd = interpretar_broncodilatacion(datos)
+    recomendaciones = generar_recomendaciones_clinicas(estudio['espiro'], estudio['dlco'], estudio['vol'], interpretacion_bd)
+    nombre = nombre_reporte(estudio['archivo'])
+    pdf = construir_reporte_pdf(datos, estudio['espiro'], estudio['dlco'], estudio['vol'],
+                                interpretacion_bd, recomendaciones, titulo=nombre[:-4])
+    return nombre, pdf
+
+def exportar_reportes_app(estudios, formato):
+    """
+    Genera los reportes de todos los estudios en paralelo con una barra de progreso. El resultado va
+    a un archivo temporal que pasa a disco por encima de MAX_BYTES_REPORTES_EN_MEMORIA.
+    """
+    destino = tempfile.SpooledTemporaryFile(max_size=MAX_BYTES_REPORTES_EN_MEMORIA)
+    progreso = st.progress(0.0, text=f"Generando {len(estudios)} reporte(s)...")
+
+    def al_avanzar(completados, estudio, error):
+        if error is not None:
+            st.warning(f"No se pudo generar el reporte de {estudio['archivo']}: {error}")
+        progreso.progress(completados / len(estudios), text=f"{completados} de {len(estudios)} reporte(s) generados")
+
+    totales = exportar_reportes(estudios, destino, formato, crear_reporte_lote, al_avanzar=al_avanzar)
+    progreso.empty()
+    return destino, totales
 
 def validar_datos_extraidos(datos):
     """Función placeholder - implementar según el archivo original"""
@@ -523,300 +583,414 @@ def validar_datos_extraidos(datos):
         'parametros_disponibles': []
     }
 
-# Código principal
-if uploaded_files:
-    # Generar un identificador único para este conjunto de archivos
-    files_hash = hashlib.md5(str([f.name for f in uploaded_files]).encode()).hexdigest()
+@medir('app.mostrar_archivo')
+def mostrar_resultado_archivo(resultado):
+    """
+    Muestra el dashboard de un archivo procesado con ingerir_pdfs.
+    """
+    nombre = resultado['archivo']
+    if resultado['error'] is not None:
+        st.error(f"Error procesando {nombre}: {resultado['error']}")
+        return
     
-    # Verificar si es un nuevo conjunto de archivos
-    if 'current_files_hash' not in st.session_state or st.session_state['current_files_hash'] != files_hash:
-        st.session_state['current_files_hash'] = files_hash
-        # Limpiar cualquier contenido previo
-        st.empty()
+    # Texto y extracción estructurada (caché por contenido del PDF, compartido entre sesiones)
+    text = ''.join(resultado['paginas'])
     
-    # Si hay múltiples archivos, mostrar comparación temporal
-    if len(uploaded_files) > 1:
-        st.markdown("## 📈 Análisis de Múltiples PDFs")
-        
-        # Procesar todos los PDFs para comparación temporal
-        with st.spinner("Procesando múltiples PDFs para comparación temporal..."):
-            resultados_multiples = procesar_multiples_pdfs(uploaded_files)
-        
-        if resultados_multiples:
-            mostrar_comparacion_temporal(resultados_multiples)
-            st.markdown("---")
+    with st.expander("📋 Texto extraído del PDF"):
+        st.text_area('Texto extraído', text, height=300, key=f"texto_area_{nombre}")
     
-    # Procesar cada archivo individualmente
-    for uploaded_file in uploaded_files:
-        st.subheader(f'📄 Archivo: {uploaded_file.name}')
-        with pdfplumber.open(uploaded_file) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text() or ''
+    datos = resultado['datos']
+    
+    # Guardar datos en session_state para uso posterior
+    st.session_state['datos_extraidos'] = datos
+    
+    # Validación de datos
+    validacion = validar_datos_extraidos(datos)
+    
+    # Mostrar información de debug
+    with st.expander("🔍 Información de Debug"):
+        st.write(f"**Parámetros disponibles:** {', '.join(validacion['parametros_disponibles'])}")
+        st.write(f"**Datos espirometría encontrados:** {validacion['datos_espiro']}")
+        st.write(f"**Datos DLCO encontrados:** {validacion['datos_dlco']}")
+        st.write(f"**Datos volúmenes encontrados:** {validacion['datos_vol']}")
+    
+    # Mostrar errores y advertencias
+    if validacion['errores']:
+        st.error("**Errores encontrados:**")
+        for error in validacion['errores']:
+            st.error(error)
+    
+    if validacion['advertencias']:
+        st.warning("**Advertencias:**")
+        for advertencia in validacion['advertencias']:
+            st.warning(advertencia)
+    
+    if validacion['sugerencias']:
+        with st.expander("💡 Sugerencias de corrección"):
+            for sugerencia in validacion['sugerencias']:
+                st.info(sugerencia)
+    
+    with st.expander("📊 Datos Extraídos (Click para ver)"):
+        # Añadir unidades a los nombres de las variables
+        datos_con_unidades = {}
+        for k, v in datos.items():
+            if k.lower() == 'talla' or k.lower() == 'altura':
+                datos_con_unidades[k + ' (cm)'] = v
+            elif k.lower() == 'peso':
+                datos_con_unidades[k + ' (kg)'] = v
+            elif k.lower() == 'edad':
+                datos_con_unidades[k + ' (años)'] = v
+            else:
+                datos_con_unidades[k] = v
+        st.table(datos_con_unidades)
+    
+    # Análisis GLI con caché
+    st.subheader('🔬 Análisis GLI e Interpretación Visual')
+    
+    # Verificar datos mínimos necesarios
+    if datos.get('Edad') and datos.get('Altura') and datos.get('Sexo'):
+        if datos['Edad'] != 'Valor no encontrado' and datos['Altura'] != 'Valor no encontrado':
             
-            with st.expander("📋 Texto extraído del PDF"):
-                st.text_area('Texto extraído', text, height=300, key=f"texto_area_{uploaded_file.name}")
+            # Caché de análisis - verificar si ya se realizó
+            cache_key = f"analisis_{hashlib.md5(str(datos).encode()).hexdigest()}"
             
-            # Extracción estructurada
-            datos = extract_datos_pulmonar(text)
-            datos = mapear_claves_pre(datos)
+            if cache_key not in st.session_state:
+                # Guardar en caché el análisis hecho durante la ingesta
+                estudio = resultado['estudio'] if resultado['estudio'] is not None else analizar_estudio(datos)
+                st.session_state[cache_key] = {
+                    'espiro': estudio['espiro'],
+                    'dlco': estudio['dlco'],
+                    'vol': estudio['vol'],
+                    'bd': interpretar_broncodilatacion(datos)
+                }
             
-            # Guardar datos en session_state para uso posterior
-            st.session_state['datos_extraidos'] = datos
+            # Obtener resultados del caché
+            resultados_espiro = st.session_state[cache_key]['espiro']
+            resultados_dlco = st.session_state[cache_key]['dlco']
+            resultados_vol = st.session_state[cache_key]['vol']
+            interpretacion_bd = st.session_state[cache_key]['bd']
             
-            # Validación de datos
-            validacion = validar_datos_extraidos(datos)
+            # Crear y mostrar dashboard overview
+            metricas = crear_metricas_dashboard(datos, resultados_espiro, resultados_dlco, resultados_vol)
+            mostrar_dashboard_overview(metricas)
             
-            # Mostrar información de debug
-            with st.expander("🔍 Información de Debug"):
-                st.write(f"**Parámetros disponibles:** {', '.join(validacion['parametros_disponibles'])}")
-                st.write(f"**Datos espirometría encontrados:** {validacion['datos_espiro']}")
-                st.write(f"**Datos DLCO encontrados:** {validacion['datos_dlco']}")
-                st.write(f"**Datos volúmenes encontrados:** {validacion['datos_vol']}")
+            # Botón de exportación PDF
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col2:
+                if st.button("📄 Exportar Reporte PDF", use_container_width=True, type="primary", key=f"export_pdf_{nombre}"):
+                    with st.spinner("Generando reporte PDF..."):
+                        pdf_buffer = generar_reporte_pdf(
+                            datos, resultados_espiro, resultados_dlco, 
+                            resultados_vol, interpretacion_bd, 
+                            f"PulmoReport_{nombre.replace('.pdf', '')}"
+                        )
+                        if pdf_buffer:
+                            st.download_button(
+                                label="⬇️ Descargar PDF",
+                                data=pdf_buffer.getvalue(),
+                                file_name=f"PulmoReport_{nombre.replace('.pdf', '')}.pdf",
+                                mime="application/pdf",
+                                use_container_width=True,
+                                key=f"download_pdf_{nombre}"
+                            )
+                        else:
+                            st.error("Error generando el PDF")
             
-            # Mostrar errores y advertencias
-            if validacion['errores']:
-                st.error("**Errores encontrados:**")
-                for error in validacion['errores']:
-                    st.error(error)
+            # Crear pestañas para diferentes tipos de análisis
+            tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Espirometría", "🫁 DLCO", "📏 Volúmenes", "💨 Broncodilatación", "📋 Resumen"])
             
-            if validacion['advertencias']:
-                st.warning("**Advertencias:**")
-                for advertencia in validacion['advertencias']:
-                    st.warning(advertencia)
+            with tab1:
+                st.markdown("### 📊 Análisis Visual de Espirometría")
+                # Usar resultados del caché
+                
+                if "error" not in resultados_espiro:
+                    # Filtrar solo parámetros de espirometría
+                    espiro_params = ['FEV1', 'FVC', 'FEF25-75%']
+                    resultados_filtrados = {k: v for k, v in resultados_espiro.items() if k in espiro_params}
+                    
+                    if resultados_filtrados:
+                        # Crear gráfico visual horizontal
+                        imagen_espiro = crear_grafico_espirometria_horizontal(resultados_filtrados)
+                        if imagen_espiro:
+                            st.image(imagen_espiro, use_container_width=True, caption="Gráfico de Puntuaciones Z de Espirometría")
+                        
+                        # Tabla de resultados
+                        st.markdown("**Resultados Detallados:**")
+                        espiro_data = []
+                        for param, datos_analisis in resultados_filtrados.items():
+                            espiro_data.append({
+                                'Parámetro': param,
+                                'Observado': datos_analisis['observado'],
+                                'Esperado': datos_analisis['esperado'],
+                                'Z-Score': datos_analisis['z_score'],
+                                'Interpretación': datos_analisis['interpretacion'],
+                                'Severidad': datos_analisis['severidad']
+                            })
+                        
+                        espiro_df = pd.DataFrame(espiro_data)
+                        st.table(espiro_df)
+                    else:
+                        st.warning("⚠️ No se encontraron datos de espirometría válidos.")
+                else:
+                    st.error(f"❌ Error en el análisis: {resultados_espiro['error']}")
             
-            if validacion['sugerencias']:
-                with st.expander("💡 Sugerencias de corrección"):
-                    for sugerencia in validacion['sugerencias']:
-                        st.info(sugerencia)
+            with tab2:
+                st.markdown("### 🫁 Análisis Visual de DLCO")
+                # Usar resultados del caché
+                
+                if "error" not in resultados_dlco:
+                    dlco_params = ['DLCO', 'KCO', 'VA']
+                    resultados_filtrados = {k: v for k, v in resultados_dlco.items() if k in dlco_params}
+                    
+                    if resultados_filtrados:
+                        # Crear gráfico visual horizontal
+                        imagen_dlco = crear_grafico_dlco_horizontal(resultados_filtrados)
+                        if imagen_dlco:
+                            st.image(imagen_dlco, use_container_width=True, caption="Gráfico de Puntuaciones Z de DLCO")
+                        
+                        # Tabla de resultados
+                        st.markdown("**Resultados Detallados:**")
+                        dlco_data = []
+                        for param, datos_analisis in resultados_filtrados.items():
+                            dlco_data.append({
+                                'Parámetro': param,
+                                'Observado': datos_analisis['observado'],
+                                'Esperado': datos_analisis['esperado'],
+                                'Z-Score': datos_analisis['z_score'],
+                                'Interpretación': datos_analisis['interpretacion'],
+                                'Severidad': datos_analisis['severidad']
+                            })
+                        
+                        dlco_df = pd.DataFrame(dlco_data)
+                        st.table(dlco_df)
+                    else:
+                        st.warning("⚠️ No se encontraron datos de DLCO válidos.")
+                else:
+                    st.error(f"❌ Error en el análisis DLCO: {resultados_dlco['error']}")
             
-            with st.expander("📊 Datos Extraídos (Click para ver)"):
-                # Añadir unidades a los nombres de las variables
-                datos_con_unidades = {}
-                for k, v in datos.items():
-                    if k.lower() == 'talla' or k.lower() == 'altura':
-                        datos_con_unidades[k + ' (cm)'] = v
-                    elif k.lower() == 'peso':
-                        datos_con_unidades[k + ' (kg)'] = v
-                    elif k.lower() == 'edad':
-                        datos_con_unidades[k + ' (años)'] = v
+            with tab3:
+                st.markdown("### 📏 Análisis Visual de Volúmenes Pulmonares")
+                # Usar resultados del caché
+                
+                if "error" not in resultados_vol:
+                    vol_params = ['TLC', 'VC', 'RV', 'RV/TLC']
+                    resultados_filtrados = {k: v for k, v in resultados_vol.items() if k in vol_params}
+                    
+                    if resultados_filtrados:
+                        # Crear gráfico visual horizontal
+                        imagen_vol = crear_grafico_volumenes_horizontal(resultados_filtrados)
+                        if imagen_vol:
+                            st.image(imagen_vol, use_container_width=True, caption="Gráfico de Puntuaciones Z de Volúmenes Pulmonares")
+                        
+                        # Tabla de resultados
+                        st.markdown("**Resultados Detallados:**")
+                        vol_data = []
+                        for param, datos_analisis in resultados_filtrados.items():
+                            vol_data.append({
+                                'Parámetro': param,
+                                'Observado': datos_analisis['observado'],
+                                'Esperado': datos_analisis['esperado'],
+                                'Z-Score': datos_analisis['z_score'],
+                                'Interpretación': datos_analisis['interpretacion'],
+                                'Severidad': datos_analisis['severidad']
+                            })
+                        
+                        vol_df = pd.DataFrame(vol_data)
+                        st.table(vol_df)
                     else:
-                        datos_con_unidades[k] = v
-                st.table(datos_con_unidades)
+                        st.warning("⚠️ No se encontraron datos de volúmenes válidos.")
+                else:
+                    st.error(f"❌ Error en el análisis de volúmenes: {resultados_vol['error']}")
             
-            # Análisis GLI con caché
-            st.subheader('🔬 Análisis GLI e Interpretación Visual')
+            with tab4:
+                st.markdown("### 💨 Análisis Visual de Broncodilatación")
+                # Usar resultados del caché
+                
+                # Crear gráfico de broncodilatación horizontal
+                imagen_bd = crear_grafico_broncodilatacion_horizontal(datos)
+                if imagen_bd:
+                    st.image(imagen_bd, use_container_width=True, caption="Respuesta a Broncodilatador")
+                
+                # Mostrar interpretación del caché
+                st.markdown(interpretacion_bd)
             
-            # Verificar datos mínimos necesarios
-            if datos.get('Edad') and datos.get('Altura') and datos.get('Sexo'):
-                if datos['Edad'] != 'Valor no encontrado' and datos['Altura'] != 'Valor no encontrado':
-                    
-                    # Caché de análisis - verificar si ya se realizó
-                    cache_key = f"analisis_{hashlib.md5(str(datos).encode()).hexdigest()}"
-                    
-                    if cache_key not in st.session_state:
-                        # Realizar análisis y guardar en caché
-                        st.session_state[cache_key] = {
-                            'espiro': analizar_espirometria(datos),
-                            'dlco': analizar_dlco(datos),
-                            'vol': analizar_volumenes(datos),
-                            'bd': interpretar_broncodilatacion(datos)
-                        }
-                    
-                    # Obtener resultados del caché
-                    resultados_espiro = st.session_state[cache_key]['espiro']
-                    resultados_dlco = st.session_state[cache_key]['dlco']
-                    resultados_vol = st.session_state[cache_key]['vol']
-                    interpretacion_bd = st.session_state[cache_key]['bd']
-                    
-                    # Crear y mostrar dashboard overview
-                    metricas = crear_metricas_dashboard(datos, resultados_espiro, resultados_dlco, resultados_vol)
-                    mostrar_dashboard_overview(metricas)
+            with tab5:
+                st.markdown("### 📋 Resumen General con Semáforo")
+                # Usar resultados del caché
+                
+                if "error" not in resultados_espiro:
+                    # Crear semáforo de interpretación
+                    color_semaforo, texto_semaforo = crear_semaforo_interpretacion(
+                        resultados_espiro, resultados_dlco, resultados_vol
+                    )
                     
-                    # Botón de exportación PDF
-                    col1, col2, col3 = st.columns([1, 1, 1])
+                    # Mostrar semáforo
+                    col1, col2, col3 = st.columns([1, 2, 1])
                     with col2:
-                        if st.button("📄 Exportar Reporte PDF", use_container_width=True, type="primary", key=f"export_pdf_{uploaded_file.name}"):
-                            with st.spinner("Generando reporte PDF..."):
-                                pdf_buffer = generar_reporte_pdf(
-                                    datos, resultados_espiro, resultados_dlco, 
-                                    resultados_vol, interpretacion_bd, 
-                                    f"PulmoReport_{uploaded_file.name.replace('.pdf', '')}"
-                                )
-                                if pdf_buffer:
-                                    st.download_button(
-                                        label="⬇️ Descargar PDF",
-                                        data=pdf_buffer.getvalue(),
-                                        file_name=f"PulmoReport_{uploaded_file.name.replace('.pdf', '')}.pdf",
-                                        mime="application/pdf",
-                                        use_container_width=True,
-                                        key=f"download_pdf_{uploaded_file.name}"
-                                    )
-                                else:
-                                    st.error("Error generando el PDF")
-                    
-                    # Crear pestañas para diferentes tipos de análisis
-                    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Espirometría", "🫁 DLCO", "📏 Volúmenes", "💨 Broncodilatación", "📋 Resumen"])
-                    
-                    with tab1:
-                        st.markdown("### 📊 Análisis Visual de Espirometría")
-                        # Usar resultados del caché
-                        
-                        if "error" not in resultados_espiro:
-                            # Filtrar solo parámetros de espirometría
-                            espiro_params = ['FEV1', 'FVC', 'FEF25-75%']
-                            resultados_filtrados = {k: v for k, v in resultados_espiro.items() if k in espiro_params}
-                            
-                            if resultados_filtrados:
-                                # Crear gráfico visual horizontal
-                                imagen_espiro = crear_grafico_espirometria_horizontal(resultados_filtrados)
-                                if imagen_espiro:
-                                    st.image(imagen_espiro, use_container_width=True, caption="Gráfico de Puntuaciones Z de Espirometría")
-                                
-                                # Tabla de resultados
-                                st.markdown("**Resultados Detallados:**")
-                                espiro_data = []
-                                for param, datos_analisis in resultados_filtrados.items():
-                                    espiro_data.append({
-                                        'Parámetro': param,
-                                        'Observado': datos_analisis['observado'],
-                                        'Esperado': datos_analisis['esperado'],
-                                        'Z-Score': datos_analisis['z_score'],
-                                        'Interpretación': datos_analisis['interpretacion'],
-                                        'Severidad': datos_analisis['severidad']
-                                    })
-                                
-                                espiro_df = pd.DataFrame(espiro_data)
-                                st.table(espiro_df)
-                            else:
-                                st.warning("⚠️ No se encontraron datos de espirometría válidos.")
-                        else:
-                            st.error(f"❌ Error en el análisis: {resultados_espiro['error']}")
+                        st.markdown(f"""
+                        <div style="text-align: center; padding: 20px; background-color: #f8f9fa; border-radius: 10px;">
+                            <div class="traffic-light {color_semaforo}" style="margin: 0 auto 10px auto;"></div>
+                            <h3 style="color: {color_semaforo}; margin: 0;">{texto_semaforo}</h3>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    with tab2:
-                        st.markdown("### 🫁 Análisis Visual de DLCO")
-                        # Usar resultados del caché
-                        
-                        if "error" not in resultados_dlco:
-                            dlco_params = ['DLCO', 'KCO', 'VA']
-                            resultados_filtrados = {k: v for k, v in resultados_dlco.items() if k in dlco_params}
-                            
-                            if resultados_filtrados:
-                                # Crear gráfico visual horizontal
-                                imagen_dlco = crear_grafico_dlco_horizontal(resultados_filtrados)
-                                if imagen_dlco:
-                                    st.image(imagen_dlco, use_container_width=True, caption="Gráfico de Puntuaciones Z de DLCO")
-                                
-                                # Tabla de resultados
-                                st.markdown("**Resultados Detallados:**")
-                                dlco_data = []
-                                for param, datos_analisis in resultados_filtrados.items():
-                                    dlco_data.append({
-                                        'Parámetro': param,
-                                        'Observado': datos_analisis['observado'],
-                                        'Esperado': datos_analisis['esperado'],
-                                        'Z-Score': datos_analisis['z_score'],
-                                        'Interpretación': datos_analisis['interpretacion'],
-                                        'Severidad': datos_analisis['severidad']
-                                    })
-                                
-                                dlco_df = pd.DataFrame(dlco_data)
-                                st.table(dlco_df)
-                            else:
-                                st.warning("⚠️ No se encontraron datos de DLCO válidos.")
-                        else:
-                            st.error(f"❌ Error en el análisis DLCO: {resultados_dlco['error']}")
+                    # Detección de patrones de enfermedad
+                    mostrar_deteccion_patrones(resultados_espiro, resultados_dlco, resultados_vol, datos)
                     
-                    with tab3:
-                        st.markdown("### 📏 Análisis Visual de Volúmenes Pulmonares")
-                        # Usar resultados del caché
-                        
-                        if "error" not in resultados_vol:
-                            vol_params = ['TLC', 'VC', 'RV', 'RV/TLC']
-                            resultados_filtrados = {k: v for k, v in resultados_vol.items() if k in vol_params}
-                            
-                            if resultados_filtrados:
-                                # Crear gráfico visual horizontal
-                                imagen_vol = crear_grafico_volumenes_horizontal(resultados_filtrados)
-                                if imagen_vol:
-                                    st.image(imagen_vol, use_container_width=True, caption="Gráfico de Puntuaciones Z de Volúmenes Pulmonares")
-                                
-                                # Tabla de resultados
-                                st.markdown("**Resultados Detallados:**")
-                                vol_data = []
-                                for param, datos_analisis in resultados_filtrados.items():
-                                    vol_data.append({
-                                        'Parámetro': param,
-                                        'Observado': datos_analisis['observado'],
-                                        'Esperado': datos_analisis['esperado'],
-                                        'Z-Score': datos_analisis['z_score'],
-                                        'Interpretación': datos_analisis['interpretacion'],
-                                        'Severidad': datos_analisis['severidad']
-                                    })
-                                
-                                vol_df = pd.DataFrame(vol_data)
-                                st.table(vol_df)
-                            else:
-                                st.warning("⚠️ No se encontraron datos de volúmenes válidos.")
-                        else:
-                            st.error(f"❌ Error en el análisis de volúmenes: {resultados_vol['error']}")
+                    # Interpretación general
+                    st.markdown("**📋 Interpretación General:**")
+                    interpretacion = generar_interpretacion_general(resultados_espiro)
+                    st.markdown(interpretacion)
                     
-                    with tab4:
-                        st.markdown("### 💨 Análisis Visual de Broncodilatación")
-                        # Usar resultados del caché
-                        
-                        # Crear gráfico de broncodilatación horizontal
-                        imagen_bd = crear_grafico_broncodilatacion_horizontal(datos)
-                        if imagen_bd:
-                            st.image(imagen_bd, use_container_width=True, caption="Respuesta a Broncodilatador")
-                        
-                        # Mostrar interpretación del caché
-                        st.markdown(interpretacion_bd)
-                    
-                    with tab5:
-                        st.markdown("### 📋 Resumen General con Semáforo")
-                        # Usar resultados del caché
-                        
-                        if "error" not in resultados_espiro:
-                            # Crear semáforo de interpretación
-                            color_semaforo, texto_semaforo = crear_semaforo_interpretacion(
-                                resultados_espiro, resultados_dlco, resultados_vol
-                            )
-                            
-                            # Mostrar semáforo
-                            col1, col2, col3 = st.columns([1, 2, 1])
-                            with col2:
-                                st.markdown(f"""
-                                <div style="text-align: center; padding: 20px; background-color: #f8f9fa; border-radius: 10px;">
-                                    <div class="traffic-light {color_semaforo}" style="margin: 0 auto 10px auto;"></div>
-                                    <h3 style="color: {color_semaforo}; margin: 0;">{texto_semaforo}</h3>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            
-                            # Detección de patrones de enfermedad
-                            mostrar_deteccion_patrones(resultados_espiro, resultados_dlco, resultados_vol, datos)
-                            
-                            # Interpretación general
-                            st.markdown("**📋 Interpretación General:**")
-                            interpretacion = generar_interpretacion_general(resultados_espiro)
-                            st.markdown(interpretacion)
-                            
-                            # Generar recomendaciones clínicas
-                            st.markdown("**🎯 Recomendaciones Clínicas:**")
-                            recomendaciones = generar_recomendaciones_clinicas(
-                                resultados_espiro, 
-                                resultados_dlco, 
-                                resultados_vol, 
-                                interpretacion_bd
-                            )
-                            st.markdown(recomendaciones)
-                        else:
-                            st.error(f"❌ Error en el análisis: {resultados_espiro['error']}")
-                
+                    # Generar recomendaciones clínicas
+                    st.markdown("**🎯 Recomendaciones Clínicas:**")
+                    recomendaciones = generar_recomendaciones_clinicas(
+                        resultados_espiro, 
+                        resultados_dlco, 
+                        resultados_vol, 
+                        interpretacion_bd
+                    )
+                    st.markdown(recomendaciones)
                 else:
-                    st.warning("⚠️ Faltan datos de edad o altura para realizar el análisis GLI.")
-            else:
-                st.warning("⚠️ Faltan datos demográficos (edad, altura, sexo) para realizar el análisis GLI.") 
+                    st.error(f"❌ Error en el análisis: {resultados_espiro['error']}")
+        
+        else:
+            st.warning("⚠️ Faltan datos de edad o altura para realizar el análisis GLI.")
+    else:
+        st.warning("⚠️ Faltan datos demográficos (edad, altura, sexo) para realizar el análisis GLI.") 
+
+# Código principal
+if uploaded_files:
+    # Generar un identificador único para este conjunto de archivos
+    files_hash = hashlib.md5(str([f.name for f in uploaded_files]).encode()).hexdigest()
+    
+    # Verificar si es un nuevo conjunto de archivos
+    if 'current_files_hash' not in st.session_state or st.session_state['current_files_hash'] != files_hash:
+        st.session_state['current_files_hash'] = files_hash
+        # Limpiar cualquier contenido previo
+        st.empty()
+    
+    # Si hay múltiples archivos, la comparación temporal va arriba y se completa al terminar todos
+    if len(uploaded_files) > 1:
+        st.markdown("## 📈 Análisis de Múltiples PDFs")
+        contenedor_comparacion = st.container()
+    
+    # Un contenedor por archivo, con su estado mientras se procesa
+    progreso = st.progress(0.0, text=f"Procesando {len(uploaded_files)} archivo(s)...")
+    contenedores = []
+    for uploaded_file in uploaded_files:
+        st.subheader(f'📄 Archivo: {uploaded_file.name}')
+        contenedor = st.container()
+        estado = contenedor.empty()
+        estado.info("⏳ En cola")
+        contenedores.append((contenedor, estado))
+    
+    estados_mostrados = ['en cola'] * len(uploaded_files)
+    
+    def mostrar_estados(estados):
+        for indice, etapa in enumerate(estados):
+            if etapa != estados_mostrados[indice] and etapa not in ('listo', 'error'):
+                estados_mostrados[indice] = etapa
+                contenedores[indice][1].info(f"⏳ {etapa.capitalize()}...")
+    
+    # Lectura, extracción y análisis concurrentes: cada archivo se muestra en cuanto termina
+    resultados = [None] * len(uploaded_files)
+    for completados, (indice, resultado) in enumerate(ingerir_pdfs(uploaded_files, al_esperar=mostrar_estados), 1):
+        resultados[indice] = resultado
+        contenedor, estado = contenedores[indice]
+        estado.empty()
+        with contenedor:
+            mostrar_resultado_archivo(resultado)
+        progreso.progress(completados / len(uploaded_files),
+                          text=f"{completados} de {len(uploaded_files)} archivo(s) procesados")
+    progreso.empty()
+    
+    # Exportación de los estudios analizados (un registro por estudio con valores extraídos,
+    # resultados GLI y patrones detectados)
+    estudios_exportables = [r['estudio'] for r in resultados if r['estudio'] is not None]
+    if estudios_exportables:
+        st.markdown("---")
+        st.markdown("### ⬇️ Exportar Resultados")
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            formato_exportacion = st.selectbox("Formato", list(ESCRITORES), key="formato_exportacion")
+        with col2:
+            # La exportación se genera al pulsar la descarga, no en cada ejecución del script
+            def exportar_estudios_app(estudios=estudios_exportables, formato=formato_exportacion):
+                return exportar_bytes(estudios, formato)
+            
+            st.download_button(
+                label=f"⬇️ Descargar {len(estudios_exportables)} estudio(s)",
+                data=exportar_estudios_app,
+                file_name=f"PulmoReport_estudios.{formato_exportacion}",
+                mime=TIPOS_MIME[formato_exportacion],
+                use_container_width=True,
+                key="descargar_exportacion"
+            )
+        
+        # Reportes PDF de todos los estudios en un solo archivo: se generan al pulsar el botón y
+        # el archivo se lee al pulsar la descarga (no en cada ejecución del script)
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            formato_reportes = st.selectbox("Reportes PDF", list(ESCRITORES_REPORTES), key="formato_reportes",
+                                            format_func=lambda f: "ZIP (un PDF por estudio)" if f == 'zip' else "PDF combinado")
+        with col2:
+            if st.button(f"📄 Generar {len(estudios_exportables)} reporte(s) PDF", use_container_width=True,
+                         key="generar_reportes"):
+                # El archivo de la generación anterior ya no se puede descargar: se cierra (y se borra)
+                anterior = st.session_state.pop('reportes_lote', None)
+                if anterior:
+                    anterior[2].close()
+                archivo_reportes, totales_reportes = exportar_reportes_app(estudios_exportables, formato_reportes)
+                st.session_state['reportes_lote'] = (files_hash, formato_reportes, archivo_reportes, totales_reportes)
+            lote = st.session_state.get('reportes_lote')
+            if lote and lote[0] == files_hash and lote[1] == formato_reportes and lote[3]['generados']:
+                archivo_reportes = lote[2]
+                
+                def leer_reportes():
+                    archivo_reportes.seek(0)
+                    return archivo_reportes
+                
+                st.download_button(
+                    label=f"⬇️ Descargar {lote[3]['generados']} reporte(s)",
+                    data=leer_reportes,
+                    file_name=f"PulmoReport_reportes.{formato_reportes}",
+                    mime=TIPOS_MIME_REPORTES[formato_reportes],
+                    use_container_width=True,
+                    key="descargar_reportes"
+                )
+    
+    if len(uploaded_files) > 1:
+        with contenedor_comparacion:
+            resultados_multiples = procesar_multiples_pdfs(uploaded_files, resultados)
+            if resultados_multiples:
+                mostrar_comparacion_temporal(resultados_multiples)
+                st.markdown("---")
+
+# Tiempos por etapa acumulados por el proceso (solo con PULMOREPORT_METRICAS=1)
+if metricas_activas():
+    with st.expander("⏱️ Rendimiento"):
+        resumen_metricas = registro_metricas.resumen()
+        if resumen_metricas:
+            st.dataframe(pd.DataFrame(resumen_metricas), use_container_width=True, hide_index=True)
+            st.download_button(
+                label="Descargar métricas (Prometheus)",
+                data=registro_metricas.texto_prometheus(),
+                file_name="pulmoreport_metricas.prom",
+                mime="text/plain",
+                key="descargar_metricas"
+            )
+        else:
+            st.info("Aún no hay etapas medidas.")
+        cache_extraccion = estadisticas_cache_extraccion()
+        cache_predicciones = estadisticas_cache_predicciones()
+        cache_graficos = estadisticas_cache_graficos()
+        st.caption(f"Caché de extracción: {cache_extraccion['tasa_aciertos']:.0%} aciertos "
+                   f"({cache_extraccion['entradas']} entradas) · Caché de predicciones: "
+                   f"{cache_predicciones['tasa_aciertos']:.0%} aciertos ({cache_predicciones['entradas']} entradas) · "
+                   f"Caché de gráficos: {cache_graficos['tasa_aciertos']:.0%} aciertos "
+                   f"({cache_graficos['bytes'] / 2 ** 20:.1f} MiB)")
+
 
 # Footer con copyright
 st.markdown("---")
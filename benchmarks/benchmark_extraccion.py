@@ -0,0 +1,207 @@
+"""
+Benchmark de extracción sobre informes sintéticos (ver informes_sinteticos): rendimiento
+(informes/s), latencia por etapa, memoria máxima y exactitud frente a los valores esperados.
+Termina con código 1 si algún valor extraído no coincide.
+
+    python -m benchmarks.benchmark_extraccion --informes 2000 --pdfs 20 --relleno 40 --anexos 2
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import pdfplumber
+
+from benchmarks.informes_sinteticos import ESPIROMETRIA, InformeSintetico, escribir_pdf, generar_informes
+from utils.cache_extraccion import cache_extracciones, extraer_pdf
+from utils.extraccion import (extract_datos_pulmonar, extract_values_from_multiline, get_nth_number,
+                              tokenizar_parametros, tokenizar_texto)
+
+
+def _resumen(tiempos: List[float]) -> Dict[str, float]:
+    """
+    Latencias en milisegundos: media, p50, p95 y máximo.
+    """
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+    return {
+        'n': len(ordenados),
+        'media_ms': round(statistics.fmean(ordenados) * 1000, 4),
+        'p50_ms': round(statistics.median(ordenados) * 1000, 4),
+        'p95_ms': round(p95 * 1000, 4),
+        'max_ms': round(ordenados[-1] * 1000, 4)
+    }
+
+
+def _medir(funcion: Callable, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def _pico_memoria(funcion: Callable, *args) -> float:
+    """
+    Memoria máxima (MiB, tracemalloc) de una llamada. Se mide en una pasada aparte porque
+    tracemalloc ralentiza mucho las asignaciones.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcion(*args)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(pico / 2 ** 20, 3)
+
+
+def _diferencias(informe: InformeSintetico, datos: Dict) -> List[str]:
+    return [f'{clave}: esperado {esperado!r}, extraído {datos.get(clave)!r}'
+            for clave, esperado in informe.esperado.items() if datos.get(clave) != esperado]
+
+
+def _valores_legado(informe: InformeSintetico) -> Dict[str, Optional[str]]:
+    """
+    Valor pre de cada parámetro de espirometría con las funciones antiguas: el bloque de
+    extract_values_from_multiline desde su etiqueta y la columna pre con get_nth_number.
+    """
+    valores = {}
+    for _, clave, _ in ESPIROMETRIA:
+        bloque = extract_values_from_multiline(informe.lineas, informe.etiquetas[clave], clave)
+        valores[f'{clave} pre'] = get_nth_number(bloque, informe.columna_pre[clave])
+    return valores
+
+
+def benchmark_texto(informes: List[InformeSintetico]) -> Dict:
+    """
+    Etapas del parser sobre el texto de cada informe y exactitud de extract_datos_pulmonar y de
+    las funciones antiguas (extract_values_from_multiline + get_nth_number).
+    """
+    tiempos = {'tokenizar_texto': [], 'tokenizar_parametros': [], 'extract_datos_pulmonar': [],
+               'extract_values_from_multiline+get_nth_number': []}
+    errores = []
+    for i, informe in enumerate(informes):
+        texto = informe.texto
+        (lineas, claves), t = _medir(tokenizar_texto, texto)
+        tiempos['tokenizar_texto'].append(t)
+        _, t = _medir(tokenizar_parametros, lineas, claves)
+        tiempos['tokenizar_parametros'].append(t)
+        datos, t = _medir(extract_datos_pulmonar, texto)
+        tiempos['extract_datos_pulmonar'].append(t)
+        errores.extend(f'informe {i}: {d}' for d in _diferencias(informe, datos))
+
+        legado, t = _medir(_valores_legado, informe)
+        tiempos['extract_values_from_multiline+get_nth_number'].append(t)
+        errores.extend(f'informe {i} (legado) {clave}: esperado {informe.esperado[clave]!r}, extraído {valor!r}'
+                       for clave, valor in legado.items() if valor != informe.esperado[clave])
+
+    total = sum(tiempos['extract_datos_pulmonar'])
+    return {
+        'informes': len(informes),
+        'lineas_media': round(statistics.fmean(len(inf.lineas) for inf in informes), 1),
+        'informes_por_segundo': round(len(informes) / total, 1) if total else None,
+        'etapas': {etapa: _resumen(t) for etapa, t in tiempos.items()},
+        'memoria_pico_mib': _pico_memoria(lambda: [extract_datos_pulmonar(inf.texto) for inf in informes]),
+        'errores': errores
+    }
+
+
+def _texto_completo(contenido: bytes) -> str:
+    with pdfplumber.open(io.BytesIO(contenido)) as pdf:
+        return ''.join(page.extract_text() or '' for page in pdf.pages)
+
+
+def benchmark_pdf(informes: List[InformeSintetico], paginas_anexo: int = 0, semilla: int = 0) -> Dict:
+    """
+    Lectura y extracción de PDFs generados a partir de los informes: lectura completa con
+    pdfplumber + parser, frente a extraer_pdf (lectura incremental) sin caché.
+    """
+    rng = random.Random(semilla)
+    tiempos = {'pdfplumber_texto_completo': [], 'extract_datos_pulmonar': [], 'extraer_pdf': []}
+    errores = []
+    paginas = []
+    with tempfile.TemporaryDirectory() as directorio:
+        contenidos = []
+        for i, informe in enumerate(informes):
+            ruta = os.path.join(directorio, f'sintetico{i:05d}.pdf')
+            escribir_pdf(informe, ruta, paginas_anexo=paginas_anexo, rng=rng)
+            with open(ruta, 'rb') as f:
+                contenidos.append(f.read())
+
+        for i, (informe, contenido) in enumerate(zip(informes, contenidos)):
+            texto, t = _medir(_texto_completo, contenido)
+            tiempos['pdfplumber_texto_completo'].append(t)
+            _, t = _medir(extract_datos_pulmonar, texto)
+            tiempos['extract_datos_pulmonar'].append(t)
+
+            cache_extracciones.limpiar()
+            (leidas, datos), t = _medir(extraer_pdf, io.BytesIO(contenido), False)
+            tiempos['extraer_pdf'].append(t)
+            paginas.append(len(leidas))
+            errores.extend(f'pdf {i}: {d}' for d in _diferencias(informe, datos))
+
+        cache_extracciones.limpiar()
+        memoria = _pico_memoria(lambda: [extraer_pdf(io.BytesIO(c), False) for c in contenidos])
+        cache_extracciones.limpiar()
+
+    completo = [a + b for a, b in zip(tiempos['pdfplumber_texto_completo'], tiempos['extract_datos_pulmonar'])]
+    return {
+        'pdfs': len(informes),
+        'paginas_leidas_media': round(statistics.fmean(paginas), 2) if paginas else None,
+        'pdfs_por_segundo': round(len(informes) / sum(tiempos['extraer_pdf']), 1) if informes else None,
+        'etapas': {etapa: _resumen(t) for etapa, t in tiempos.items() if t},
+        'lectura_completa_mas_parser': _resumen(completo) if completo else None,
+        'memoria_pico_mib': memoria,
+        'errores': errores
+    }
+
+
+def _imprimir(nombre: str, resultado: Dict) -> None:
+    print(f'\n== {nombre} ==')
+    for clave, valor in resultado.items():
+        if clave in ('etapas', 'errores'):
+            continue
+        print(f'{clave}: {valor}')
+    for etapa, resumen in resultado['etapas'].items():
+        print(f"  {etapa:<46} p50 {resumen['p50_ms']:>9.3f} ms  p95 {resumen['p95_ms']:>9.3f} ms  "
+              f"max {resumen['max_ms']:>9.3f} ms")
+    print(f"errores: {len(resultado['errores'])}")
+    for error in resultado['errores'][:10]:
+        print(f'  {error}')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de extracción con informes sintéticos')
+    parser.add_argument('--informes', type=int, default=1000, help='Informes de texto')
+    parser.add_argument('--pdfs', type=int, default=20, help='Informes en PDF (0 para omitir)')
+    parser.add_argument('--relleno', type=int, default=0, help='Líneas de relleno por informe')
+    parser.add_argument('--anexos', type=int, default=0, help='Páginas de curvas por PDF')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--json', help='Guardar los resultados en este archivo JSON')
+    args = parser.parse_args(argv)
+
+    resultados = {'parametros': vars(args).copy()}
+    resultados['parametros'].pop('json')
+    resultados['texto'] = benchmark_texto(generar_informes(args.informes, args.semilla,
+                                                           lineas_relleno=args.relleno))
+    _imprimir('texto', resultados['texto'])
+    if args.pdfs:
+        informes_pdf = generar_informes(args.pdfs, args.semilla + 1, lineas_relleno=args.relleno)
+        resultados['pdf'] = benchmark_pdf(informes_pdf, args.anexos, args.semilla)
+        _imprimir('pdf', resultados['pdf'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+    return 1 if any(r['errores'] for r in resultados.values() if isinstance(r, dict) and 'errores' in r) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Micro-benchmark del motor GLI (utils.analisis_gli y utils.lote_gli) con seguimiento de
+regresiones: cada caso se compara con la referencia guardada en benchmarks/baselines/ y el
+proceso termina con código 1 si alguno pierde más del umbral de rendimiento.
+
+Para que la referencia sirva en otra máquina o con otra carga, los tiempos no se comparan en
+absoluto sino relativos a una calibración (Python puro, sin código del proyecto) medida justo
+después de cada medición; se compara la mediana de esos cocientes en varias ejecuciones completas
+de la batería.
+
+    python -m benchmarks.benchmark_gli                       # comparar con la referencia
+    python -m benchmarks.benchmark_gli --guardar-referencia  # actualizar la referencia
+
+Casos:
+- frio/*: carga de tablas (caché .npz y Excel) y primera predicción con el almacén vacío.
+- escalar/*: una llamada por paciente con las tablas cargadas y el caché de predicciones vacío.
+- memoizado/*: las mismas llamadas con el caché de predicciones lleno.
+- lote/*: los mismos pacientes de una vez con utils.lote_gli.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils import tablas_gli
+from utils.analisis_gli import (CALCULOS_ESPERADO, analizar_dlco, analizar_espirometria, analizar_estudio,
+                                analizar_volumenes, cache_predicciones, calcular_valor_esperado_fev1,
+                                calcular_z_score, generar_interpretacion_general)
+from utils.lote_gli import analizar_lote, calcular_valores_esperados_lote
+
+DIRECTORIO_REFERENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+ARCHIVO_REFERENCIA = os.path.join(DIRECTORIO_REFERENCIAS, 'benchmark_gli.json')
+
+# Pérdida de rendimiento relativo respecto a la referencia a partir de la cual un caso es una regresión
+UMBRAL_REGRESION = 0.25
+# Casos de menos de 2 µs por operación (p.ej. los aciertos del caché de predicciones): la
+# resolución del reloj, el propio bucle y la disposición de memoria del proceso pesan más que el código
+UMBRAL_CASO_CORTO = 0.5
+CASO_CORTO_S = 2e-6
+# Casos en frío: dependen de la caché de disco del sistema y solo se miden una vez por ronda, así
+# que solo cuentan las pérdidas grandes, como que la primera predicción vuelva a parsear los Excel
+# porque el .npz falta o no se puede usar (cientos de veces más lenta)
+PREFIJOS_FRIO = ('frio/',)
+UMBRAL_FRIO = 0.8
+
+# Duración mínima (s) de cada medición de los casos que se pueden repetir
+TIEMPO_MINIMO = 0.1
+# Tope de mediciones de los casos que hay que preparar antes de cada ronda
+MAX_MEDICIONES_PREPARADAS = 50
+# Llamadas a _calibracion (~0.3 ms cada una) tras cada medición
+REPETICIONES_CALIBRACION = 20
+
+# Claves de `datos` de cada parámetro observado (como las de extract_datos_pulmonar)
+CLAVES_DATOS = {
+    'FEV1': 'FEV1 pre',
+    'FVC': 'FVC pre',
+    'FEF25-75%': 'FEF25-75% pre',
+    'DLCO': 'DLCO pre',
+    'VA': 'VA pre',
+    'KCO': 'DLCO/VA',
+    'TLC': 'TLC pre',
+    'VC': 'VC pre',
+    'RV': 'RV pre',
+    'RV/TLC': 'RV/TLC pre'
+}
+
+# Parámetro de resultados -> clave de CALCULOS_ESPERADO
+PARAMETROS = {
+    'FEV1': 'fev1', 'FVC': 'fvc', 'FEF25-75%': 'fef2575', 'DLCO': 'dlco', 'KCO': 'kco', 'VA': 'va',
+    'TLC': 'tlc', 'VC': 'vc', 'RV': 'rv', 'RV/TLC': 'rvtlc'
+}
+
+
+def generar_pacientes(n: int, semilla: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Edad, altura y sexo de n pacientes distintos y un valor observado por parámetro (alrededor del
+    esperado, para que los z-scores cubran todas las severidades).
+    """
+    rng = np.random.default_rng(semilla)
+    pacientes = {
+        'edad': np.round(rng.uniform(20, 85, n), 2),
+        'altura': np.round(rng.uniform(145, 195, n), 1),
+        'sexo': np.where(rng.random(n) < 0.5, 'Femenino', 'Masculino')
+    }
+    for nombre, clave in PARAMETROS.items():
+        esperado = calcular_valores_esperados_lote(clave, pacientes['edad'], pacientes['altura'], pacientes['sexo'])
+        if clave == 'rvtlc':
+            esperado = np.where(esperado > 2, esperado / 100, esperado)
+        pacientes[nombre] = np.round(esperado * rng.uniform(0.4, 1.2, n), 2)
+    return pacientes
+
+
+def datos_pacientes(pacientes: Dict[str, np.ndarray]) -> List[Dict[str, str]]:
+    """
+    Los pacientes como diccionarios de datos extraídos (valores en texto).
+    """
+    datos = []
+    for i in range(len(pacientes['edad'])):
+        registro = {'Edad': str(pacientes['edad'][i]), 'Altura': str(pacientes['altura'][i]),
+                    'Sexo': str(pacientes['sexo'][i])}
+        registro.update({clave: str(pacientes[nombre][i]) for nombre, clave in CLAVES_DATOS.items()})
+        datos.append(registro)
+    return datos
+
+
+def _calibracion() -> None:
+    # Carga parecida a la de los casos (aritmética, diccionarios, llamadas) sin código del proyecto
+    tabla = {}
+    for i in range(2000):
+        tabla[i % 97] = tabla.get(i % 97, 0.0) + (i * 1.5) ** 0.5
+    sorted(tabla.values())
+
+
+def _medir_calibracion() -> float:
+    """
+    Tiempo de REPETICIONES_CALIBRACION llamadas a _calibracion (con el recolector ya desactivado).
+    """
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES_CALIBRACION):
+        _calibracion()
+    return time.perf_counter() - inicio
+
+
+def _medir(ronda: Callable[[], None], operaciones: int, rondas: int,
+           preparar: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Mide `rondas` veces `ronda` (que hace `operaciones` operaciones), con el recolector de basura
+    desactivado como en timeit. Sin `preparar`, cada medición repite la ronda hasta durar al menos
+    TIEMPO_MINIMO; con `preparar` (que deja el estado de partida, p.ej. el caché vacío) se ejecuta
+    una sola ronda, justo después de prepararla, y se hacen al menos `rondas` mediciones.
+
+    Justo después de cada medición se mide la calibración: 'relativo' es la mediana de los
+    cocientes de cada par, que no cambia si la máquina va más lenta durante unos segundos.
+    """
+    repeticiones = 1
+    if preparar is None:
+        # Como timeit.autorange: 1, 2, 5, 10, 20, 50... hasta superar TIEMPO_MINIMO
+        pasos = (1, 2, 5)
+        i = 0
+        while True:
+            repeticiones = pasos[i % 3] * 10 ** (i // 3)
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                ronda()
+            if time.perf_counter() - inicio >= TIEMPO_MINIMO:
+                break
+            i += 1
+
+    tiempos = []
+    relativos = []
+    gc_activo = gc.isenabled()
+    try:
+        # Con `preparar` cada medición es una sola ronda: se hacen más mediciones, hasta sumar
+        # TIEMPO_MINIMO por ronda pedida, para que el resultado no dependa de unas pocas muestras
+        while len(tiempos) < rondas or (preparar is not None and len(tiempos) < MAX_MEDICIONES_PREPARADAS
+                                        and sum(tiempos) < TIEMPO_MINIMO * rondas):
+            if preparar is not None:
+                preparar()
+            gc.disable()
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                ronda()
+            tiempo = (time.perf_counter() - inicio) / repeticiones
+            relativos.append(tiempo / _medir_calibracion())
+            tiempos.append(tiempo)
+            if gc_activo:
+                gc.enable()
+    finally:
+        if gc_activo:
+            gc.enable()
+    mejor = min(tiempos)
+    return {
+        'operaciones': operaciones,
+        'mejor_s': mejor,
+        'operaciones_por_segundo': operaciones / mejor if mejor else float('inf'),
+        'relativos': relativos
+    }
+
+
+def _vaciar_almacen() -> None:
+    # Estado de un proceso recién arrancado: sin tablas cargadas ni predicciones
+    tablas_gli._tablas.clear()
+    cache_predicciones.limpiar()
+
+
+def casos_frio(rondas: int, excel: bool = True) -> Dict[str, Dict]:
+    casos = {
+        'frio/tablas_cache_npz': _medir(lambda: tablas_gli.cargar_tablas_referencia(forzar=True), 1, rondas),
+        # Si el .npz falta o está obsoleto, esta llamada paga el parseo completo de los Excel
+        'frio/primera_prediccion_fev1': _medir(lambda: calcular_valor_esperado_fev1(45, 170, 'Masculino'), 1,
+                                               rondas, preparar=_vaciar_almacen)
+    }
+    if excel:
+        casos['frio/tablas_excel'] = _medir(tablas_gli._cargar_desde_excel, 1, min(rondas, 2))
+    tablas_gli.cargar_tablas_referencia()
+    return casos
+
+
+def casos_escalares(pacientes: Dict[str, np.ndarray], rondas: int) -> Dict[str, Dict]:
+    """
+    Cada calcular_valor_esperado_* por paciente (sin y con memoización), calcular_z_score,
+    los analizadores y generar_interpretacion_general.
+    """
+    tablas_gli.cargar_tablas_referencia()
+    edades = pacientes['edad'].tolist()
+    alturas = pacientes['altura'].tolist()
+    sexos = pacientes['sexo'].tolist()
+    n = len(edades)
+    casos = {}
+
+    for clave, calcular in CALCULOS_ESPERADO.items():
+        def ronda(calcular=calcular):
+            for edad, altura, sexo in zip(edades, alturas, sexos):
+                calcular(edad, altura, sexo)
+        casos[f'escalar/calcular_valor_esperado_{clave}'] = _medir(ronda, n, rondas,
+                                                                   preparar=cache_predicciones.limpiar)
+        ronda()
+        casos[f'memoizado/calcular_valor_esperado_{clave}'] = _medir(ronda, n, rondas)
+
+    observados = pacientes['FEV1'].tolist()
+    esperados = [calcular_valor_esperado_fev1(e, a, s) for e, a, s in zip(edades, alturas, sexos)]
+
+    def ronda_z():
+        for observado, esperado in zip(observados, esperados):
+            calcular_z_score(observado, esperado)
+    casos['escalar/calcular_z_score'] = _medir(ronda_z, n, rondas)
+
+    datos = datos_pacientes(pacientes)
+    analizadores = {
+        'analizar_espirometria': analizar_espirometria,
+        'analizar_dlco': analizar_dlco,
+        'analizar_volumenes': analizar_volumenes,
+        'analizar_estudio': analizar_estudio
+    }
+    for nombre, analizar in analizadores.items():
+        def ronda(analizar=analizar):
+            for registro in datos:
+                analizar(registro)
+        casos[f'escalar/{nombre}'] = _medir(ronda, n, rondas, preparar=cache_predicciones.limpiar)
+        casos[f'memoizado/{nombre}'] = _medir(ronda, n, rondas)
+
+    resultados = [analizar_espirometria(registro) for registro in datos]
+
+    def ronda_interpretacion():
+        for resultado in resultados:
+            generar_interpretacion_general(resultado)
+    casos['escalar/generar_interpretacion_general'] = _medir(ronda_interpretacion, n, rondas)
+    return casos
+
+
+def casos_lote(pacientes: Dict[str, np.ndarray], rondas: int) -> Dict[str, Dict]:
+    """
+    Los mismos cálculos vectorizados (operaciones = pacientes).
+    """
+    tablas_gli.cargar_tablas_referencia()
+    edad, altura, sexo = pacientes['edad'], pacientes['altura'], pacientes['sexo']
+    n = len(edad)
+    casos = {}
+    for clave in CALCULOS_ESPERADO:
+        casos[f'lote/calcular_valores_esperados_{clave}'] = _medir(
+            lambda clave=clave: calcular_valores_esperados_lote(clave, edad, altura, sexo), n, rondas)
+    observados = {nombre: pacientes[nombre] for nombre in PARAMETROS}
+    casos['lote/analizar_lote'] = _medir(lambda: analizar_lote(edad, altura, sexo, observados), n, rondas)
+    return casos
+
+
+def ejecutar(n: int = 400, rondas: int = 5, semilla: int = 0, excel: bool = True, repeticiones: int = 3) -> Dict:
+    """
+    Ejecuta la batería `repeticiones` veces: 'mejor_s' es el mejor tiempo de cada caso y
+    'relativo' la mediana de los cocientes con la calibración de todas sus mediciones.
+    """
+    tablas_gli.cargar_tablas_referencia()
+    pacientes = generar_pacientes(n, semilla)
+    casos = {}
+    for _ in range(repeticiones):
+        bateria = {}
+        bateria.update(casos_frio(rondas, excel))
+        bateria.update(casos_escalares(pacientes, rondas))
+        bateria.update(casos_lote(pacientes, rondas))
+        for caso, medida in bateria.items():
+            anterior = casos.get(caso)
+            if anterior is not None:
+                medida['relativos'] += anterior['relativos']
+                if anterior['mejor_s'] < medida['mejor_s']:
+                    medida.update({k: anterior[k] for k in ('mejor_s', 'operaciones_por_segundo')})
+            casos[caso] = medida
+    for medida in casos.values():
+        medida['relativo'] = statistics.median(medida.pop('relativos'))
+    return {
+        'entorno': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'maquina': platform.machine(),
+            'procesador': platform.processor() or platform.machine()
+        },
+        'parametros': {'pacientes': n, 'rondas': rondas, 'semilla': semilla, 'repeticiones': repeticiones},
+        'casos': casos
+    }
+
+
+def umbral_caso(caso: str, medida: Dict, umbral: float = UMBRAL_REGRESION) -> float:
+    """
+    Umbral de regresión del caso: más amplio en los casos en frío y si cada operación dura menos
+    de 2 µs.
+    """
+    if caso.startswith(PREFIJOS_FRIO):
+        return max(umbral, UMBRAL_FRIO)
+    if medida['mejor_s'] / medida['operaciones'] < CASO_CORTO_S:
+        return max(umbral, UMBRAL_CASO_CORTO)
+    return umbral
+
+
+def comparar(actual: Dict, referencia: Dict, umbral: float = UMBRAL_REGRESION) -> List[Dict]:
+    """
+    Compara el tiempo relativo a la calibración caso a caso. Devuelve una fila por caso presente en
+    ambos, con 'ratio' (rendimiento actual / referencia, >1 es más rápido), su 'umbral' y
+    'regresion' si el ratio cae por debajo de 1 - umbral.
+    """
+    filas = []
+    for caso, medida in actual['casos'].items():
+        anterior = referencia['casos'].get(caso)
+        if anterior is None or 'relativo' not in anterior:
+            continue
+        ratio = anterior['relativo'] / medida['relativo']
+        umbral_fila = umbral_caso(caso, medida, umbral)
+        filas.append({'caso': caso, 'referencia': anterior['relativo'], 'actual': medida['relativo'],
+                      'ratio': ratio, 'umbral': umbral_fila,
+                      'regresion': ratio < 1 - umbral_fila})
+    return filas
+
+
+def _imprimir(resultado: Dict, comparacion: Optional[List[Dict]]) -> None:
+    ratios = {fila['caso']: fila for fila in comparacion or []}
+    for caso, medida in resultado['casos'].items():
+        linea = f"{caso:<52} {medida['operaciones_por_segundo']:>14,.1f} op/s"
+        if caso in ratios:
+            fila = ratios[caso]
+            linea += f"  x{fila['ratio']:.2f}"
+            if fila['regresion']:
+                linea += '  REGRESIÓN'
+
+        print(linea)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmark del motor GLI')
+    parser.add_argument('--pacientes', type=int, default=400,
+                        help='Pacientes distintos (memoizado/analizar_* necesita 10 por paciente en el caché)')
+    parser.add_argument('--rondas', type=int, default=5)
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help='Ejecuciones completas de la batería (se reúnen las mediciones de cada caso)')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--sin-excel', action='store_true', help='No medir la carga desde los Excel')
+    parser.add_argument('--referencia', default=ARCHIVO_REFERENCIA, help='Archivo JSON de referencia')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help='Pérdida de rendimiento tolerada (0.25 = 25%%)')
+    parser.add_argument('--guardar-referencia', action='store_true',
+                        help='Guardar los resultados como nueva referencia')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo JSON')
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(args.pacientes, args.rondas, args.semilla, not args.sin_excel, args.repeticiones)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    if args.guardar_referencia:
+        os.makedirs(os.path.dirname(os.path.abspath(args.referencia)), exist_ok=True)
+        with open(args.referencia, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        _imprimir(resultado, None)
+        print(f'\nReferencia guardada en {args.referencia}')
+        return 0
+
+    if not os.path.exists(args.referencia):
+        _imprimir(resultado, None)
+        print(f'\nSin referencia en {args.referencia}: ejecute con --guardar-referencia')
+        return 0
+
+    with open(args.referencia, encoding='utf-8') as f:
+        referencia = json.load(f)
+    if referencia.get('parametros') != resultado['parametros']:
+        # Con otros pacientes, rondas o repeticiones los tiempos relativos no son comparables
+        _imprimir(resultado, None)
+        print(f"\nLa referencia se midió con otros parámetros ({referencia.get('parametros')}, ahora "
+              f"{resultado['parametros']}): repita con los mismos o ejecute con --guardar-referencia")
+        return 2
+    if referencia.get('entorno') != resultado['entorno']:
+        print(f"Aviso: la referencia se midió en otro entorno ({referencia.get('entorno')})")
+    comparacion = comparar(resultado, referencia, args.umbral)
+    _imprimir(resultado, comparacion)
+    regresiones = [fila['caso'] for fila in comparacion if fila['regresion']]
+    if regresiones:
+        print(f"\n{len(regresiones)} regresiones (umbral {args.umbral:.0%}): {', '.join(regresiones)}")
+        return 1
+    print(f'\nSin regresiones (umbral {args.umbral:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Informes de funcionalismo pulmonar sintéticos con el formato que entiende utils.extraccion, junto
+con los valores que el parser debe extraer de cada uno.
+
+    python -m benchmarks.informes_sinteticos 50 /tmp/informes --pdf
+"""
+import argparse
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+# Parámetros de espirometría: (etiqueta en el informe, clave, valor de referencia)
+ESPIROMETRIA = (
+    ('FVC [L]', 'FVC', 3.8),
+    ('FEV1 [L]', 'FEV1', 3.0),
+    ('FEV1/FVC [%]', 'FEV1/FVC', 78.0),
+    ('FEF25-75 [L/s]', 'FEF25-75%', 3.1)
+)
+
+# Parámetros con un solo valor en la misma línea: (etiqueta, clave, mínimo, máximo, teórico)
+UNA_LINEA = (
+    ('DLCO SB [mmol/min/kPa]', 'DLCO', 4.0, 11.0, 8.1),
+    ('VA sb [L]', 'VA', 3.5, 6.5, 5.5),
+)
+VOLUMENES = (
+    ('TLC sb [L]', 'TLC', 4.0, 7.5, 6.0),
+    ('VCmax [L]', 'VC', 2.5, 5.5, 4.0),
+    ('RV sb [L]', 'RV', 1.0, 2.8, 1.9),
+    ('RV/TLC sb [%]', 'RV/TLC', 22.0, 48.0, 33.0)
+)
+
+# Texto sin palabras clave del parser (relleno de cabecera y anexos)
+RELLENO = (
+    'Laboratorio de Función Pulmonar',
+    'Equipo calibrado antes de la prueba',
+    'Maniobras aceptables y repetibles',
+    'Informe generado de forma automática',
+    'Técnico responsable: turno de mañana',
+    'Pendiente de firma por el facultativo'
+)
+
+
+@dataclass
+class InformeSintetico:
+    """
+    Líneas del informe y datos esperados (mismas claves y formato que extract_datos_pulmonar).
+    """
+    lineas: List[str]
+    esperado: Dict[str, str]
+    # Índice de la línea de etiqueta de cada parámetro de espirometría y número de columna del
+    # valor pre en su bloque (1 con post, 3 sin post), para get_nth_number
+    etiquetas: Dict[str, int] = field(default_factory=dict)
+    columna_pre: Dict[str, int] = field(default_factory=dict)
+    # Líneas [inicio, fin) de datos; en el PDF no se parten entre páginas
+    tabla: Tuple[int, int] = (0, 0)
+
+    @property
+    def texto(self) -> str:
+        return '\n'.join(self.lineas)
+
+
+def _formato(valor: float, rng: random.Random, prob_coma: float) -> str:
+    texto = f'{valor:.2f}'
+    return texto.replace('.', ',') if rng.random() < prob_coma else texto
+
+
+def generar_informe(rng: random.Random, prob_coma: float = 0.3, prob_sin_post: float = 0.25,
+                    prob_partido: float = 0.3, prob_sin_feno: float = 0.2, lineas_relleno: int = 0) -> InformeSintetico:
+    """
+    Un informe aleatorio con decimales con coma, parámetros sin valor post y bloques de valores
+    partidos en varias líneas en las proporciones indicadas. lineas_relleno añade texto sin datos
+    antes y después de la tabla (tamaño del informe).
+    """
+    lineas = [f'{RELLENO[0]} - Informe {rng.randint(1000, 9999)}']
+    lineas.extend(rng.choice(RELLENO[1:]) for _ in range(lineas_relleno // 2))
+    esperado = {}
+    informe = InformeSintetico(lineas, esperado)
+
+    inicio_tabla = len(lineas)
+    sexo = rng.choice(('Masculino', 'Femenino'))
+    altura, peso, edad = rng.randint(145, 195), rng.randint(45, 110), rng.randint(18, 85)
+    lineas.append(f'Sexo: {sexo}   Altura: {altura} cm   Peso: {peso} kg')
+    lineas.append(f'Edad: {edad}   Origen étnico Caucásico')
+    esperado.update({'Sexo': sexo, 'Altura': str(altura), 'Peso': str(peso), 'Edad': str(edad),
+                     'Origen étnico': 'Caucásico'})
+
+    for etiqueta, clave, referencia in ESPIROMETRIA:
+        pre = round(referencia * rng.uniform(0.5, 1.15), 2)
+        teorico, lln = referencia, round(referencia * 0.8, 2)
+        if rng.random() < prob_sin_post:
+            # Sin post: Teór LLN Pre [%Teór] (el valor pre es el tercero)
+            valores = [teorico, lln, pre] + ([round(pre / teorico * 100, 2)] if rng.random() < 0.5 else [])
+            esperado[f'{clave} pre'] = f'{pre:.2f}'
+            esperado[f'{clave} post'] = 'Valor no encontrado'
+            informe.columna_pre[clave] = 3
+        else:
+            # Con post: Pre Teór LLN %Teór Post %Cambio (pre, el primero; post, el quinto)
+            post = round(pre * rng.uniform(0.95, 1.25), 2)
+            valores = [pre, teorico, lln, round(pre / teorico * 100, 2), post, round((post - pre) / pre * 100, 2)]
+            esperado[f'{clave} pre'] = f'{pre:.2f}'
+            esperado[f'{clave} post'] = f'{post:.2f}'
+            informe.columna_pre[clave] = 1
+        numeros = [_formato(v, rng, prob_coma) for v in valores]
+        informe.etiquetas[clave] = len(lineas)
+        if rng.random() < prob_partido:
+            # Etiqueta sola y valores repartidos en dos líneas
+            corte = rng.randint(1, len(numeros) - 1)
+            lineas.extend([etiqueta, ' '.join(numeros[:corte]), ' '.join(numeros[corte:])])
+        else:
+            lineas.append(f"{etiqueta} {' '.join(numeros)}")
+
+    for etiqueta, clave, minimo, maximo, teorico in UNA_LINEA:
+        valor = round(rng.uniform(minimo, maximo), 2)
+        lineas.append(f'{etiqueta} {_formato(valor, rng, prob_coma)} {_formato(teorico, rng, prob_coma)}')
+        esperado[clave] = f'{valor:.2f}'
+
+    # DLCO/VA: etiqueta y valor en una de las líneas siguientes
+    dlco_va = round(rng.uniform(0.8, 2.2), 2)
+    lineas.append('DLCO/VA [mmol/min/kPa/L]')
+    if rng.random() < prob_partido:
+        lineas.append('(corregido por hemoglobina)')
+    lineas.append(f'{_formato(dlco_va, rng, prob_coma)} {_formato(1.5, rng, prob_coma)}')
+    esperado['DLCO/VA'] = f'{dlco_va:.2f}'
+
+    for etiqueta, clave, minimo, maximo, teorico in VOLUMENES:
+        valor = round(rng.uniform(minimo, maximo), 2)
+        lineas.append(f'{etiqueta} {_formato(valor, rng, prob_coma)} {_formato(teorico, rng, prob_coma)}')
+        esperado[clave] = f'{valor:.2f}'
+
+    if rng.random() < prob_sin_feno:
+        esperado['FeNO'] = 'Valor no encontrado'
+    else:
+        feno = rng.randint(5, 120)
+        lineas.append(f'FeNO {feno} ppb')
+        esperado['FeNO'] = str(feno)
+    informe.tabla = (inicio_tabla, len(lineas))
+
+    lineas.extend(rng.choice(RELLENO[1:]) for _ in range(lineas_relleno - lineas_relleno // 2))
+    return informe
+
+
+def generar_informes(n: int, semilla: int = 0, **opciones) -> List[InformeSintetico]:
+    """
+    n informes reproducibles a partir de la semilla (opciones: ver generar_informe).
+    """
+    rng = random.Random(semilla)
+    return [generar_informe(rng, **opciones) for _ in range(n)]
+
+
+def escribir_pdf(informe: InformeSintetico, ruta: str, lineas_por_pagina: int = 48, paginas_anexo: int = 0,
+                 rng: Optional[random.Random] = None) -> None:
+    """
+    PDF del informe (una línea de texto por línea del informe) seguido de paginas_anexo páginas
+    de curvas: trazos vectoriales y etiquetas de ejes, como las de los equipos reales. Si la tabla
+    de datos no cabe en lo que queda de página empieza en la siguiente (el texto de páginas
+    consecutivas se concatena sin salto de línea).
+    """
+    rng = rng or random.Random(0)
+    lienzo = canvas.Canvas(ruta, pagesize=A4)
+    _, alto = A4
+    inicio_tabla, fin_tabla = informe.tabla
+    en_pagina = 0
+    for i, linea in enumerate(informe.lineas):
+        if en_pagina == lineas_por_pagina or (i == inicio_tabla and en_pagina
+                                             and en_pagina + fin_tabla - inicio_tabla > lineas_por_pagina):
+            lienzo.showPage()
+            en_pagina = 0
+        lienzo.drawString(40, alto - 40 - 16 * en_pagina, linea)
+        en_pagina += 1
+    lienzo.showPage()
+    for pagina in range(paginas_anexo):
+        lienzo.drawString(40, alto - 40, f'Gráfica flujo-volumen {pagina + 1}')
+        for marca in range(0, 11):
+            lienzo.drawString(50 + marca * 45, 80, f'{marca * 0.5:.1f}')
+        trazo = lienzo.beginPath()
+        trazo.moveTo(50, 100)
+        for x in range(1, 500):
+            trazo.lineTo(50 + x, 100 + 300 * (x / 500) ** 0.3 * (1 - x / 500) + rng.uniform(-2, 2))
+        lienzo.drawPath(trazo)
+        lienzo.showPage()
+    lienzo.save()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Genera informes sintéticos (texto o PDF)')
+    parser.add_argument('n', type=int, help='Número de informes')
+    parser.add_argument('directorio', help='Directorio de salida')
+    parser.add_argument('--pdf', action='store_true', help='Generar PDF en lugar de texto')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--relleno', type=int, default=0, help='Líneas de relleno por informe')
+    parser.add_argument('--anexos', type=int, default=0, help='Páginas de curvas por PDF')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directorio, exist_ok=True)
+    rng = random.Random(args.semilla)
+    for i, informe in enumerate(generar_informes(args.n, args.semilla, lineas_relleno=args.relleno)):
+        ruta = os.path.join(args.directorio, f'2024-01-01_sintetico{i:05d}')
+        if args.pdf:
+            escribir_pdf(informe, ruta + '.pdf', paginas_anexo=args.anexos, rng=rng)
+        else:
+            with open(ruta + '.txt', 'w', encoding='utf-8') as f:
+                f.write(informe.texto)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
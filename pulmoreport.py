@@ -0,0 +1,208 @@
+"""
+Línea de comandos de PulmoReport AI (sin interfaz Streamlit).
+
+    python pulmoreport.py batch <directorio> -o resultados.parquet [--workers 8] [--bloque 16]
+    python pulmoreport.py reportes [<directorio>] -o reportes.zip [--workers 8]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from utils.cache_extraccion import MODOS_EXTRACCION
+from utils.cohorte import cargar_cohorte, estudios_desde_cohorte, guardar_filas
+from utils.exportacion import ESCRITORES, ESQUEMA_EXPORTACION, abrir_escritor, formato_desde_ruta, registro_exportacion
+from utils.procesamiento import procesar_pdf
+from utils.reportes_lote import ESCRITORES_REPORTES, exportar_reportes, reporte_desde_pdf, reporte_estudio
+from utils.tablas_gli import cargar_tablas_referencia
+
+FILAS_POR_PARTE_COHORTE = 5000
+
+
+def _inicializar_worker() -> None:
+    # Cada proceso carga las tablas GLI una sola vez (desde el caché compilado)
+    cargar_tablas_referencia()
+
+
+def _procesar_bloque(rutas: List[str], fecha_analisis: pd.Timestamp,
+                     modo: str = 'texto') -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    Procesa un bloque de PDFs en un proceso hijo. Devuelve (ruta, fila, error) por archivo.
+    """
+    resultados = []
+    for ruta in rutas:
+        try:
+            estudio = procesar_pdf(ruta, modo=modo)
+            if estudio is None:
+                resultados.append((ruta, None, "Faltan edad, altura o sexo"))
+            else:
+                resultados.append((ruta, registro_exportacion(estudio, fecha_analisis), None))
+        except Exception as e:
+            resultados.append((ruta, None, str(e)))
+    return resultados
+
+
+def buscar_pdfs(directorio: str, recursivo: bool = False) -> Iterator[str]:
+    """
+    Rutas de los PDF del directorio en orden alfabético.
+    """
+    if recursivo:
+        for raiz, dirs, archivos in os.walk(directorio):
+            dirs.sort()
+            for nombre in sorted(archivos):
+                if nombre.lower().endswith('.pdf'):
+                    yield os.path.join(raiz, nombre)
+    else:
+        for nombre in sorted(os.listdir(directorio)):
+            ruta = os.path.join(directorio, nombre)
+            if nombre.lower().endswith('.pdf') and os.path.isfile(ruta):
+                yield ruta
+
+
+def _bloques(rutas: Iterator[str], tamano: int) -> Iterator[List[str]]:
+    bloque = []
+    for ruta in rutas:
+        bloque.append(ruta)
+        if len(bloque) == tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def procesar_directorio(directorio: str, salida: str, formato: Optional[str] = None, workers: Optional[int] = None,
+                        tamano_bloque: int = 16, recursivo: bool = False, cohorte: bool = False,
+                        modo: str = 'texto') -> Dict[str, int]:
+    """
+    Extrae y analiza todos los PDF del directorio en un pool de procesos y escribe un registro por
+    estudio (ver registro_exportacion) en `salida` a medida que terminan los bloques. Solo hay en
+    vuelo 2 bloques por worker, así que la memoria no depende del número de archivos.
+    """
+    workers = workers or os.cpu_count() or 1
+    fecha_analisis = pd.Timestamp.now().floor('ms')
+    totales = {'procesados': 0, 'escritos': 0, 'errores': 0}
+    para_cohorte = []
+    inicio = time.perf_counter()
+
+    escritor = abrir_escritor(salida, formato, ESQUEMA_EXPORTACION)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as executor:
+            pendientes = set()
+            bloques = _bloques(buscar_pdfs(directorio, recursivo), tamano_bloque)
+            agotado = False
+            while pendientes or not agotado:
+                while not agotado and len(pendientes) < 2 * workers:
+                    bloque = next(bloques, None)
+                    if bloque is None:
+                        agotado = True
+                    else:
+                        pendientes.add(executor.submit(_procesar_bloque, bloque, fecha_analisis, modo))
+                if not pendientes:
+                    break
+                terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    filas = []
+                    for ruta, fila, error in futuro.result():
+                        totales['procesados'] += 1
+                        if error is not None:
+                            totales['errores'] += 1
+                            print(f"⚠️ {ruta}: {error}", file=sys.stderr)
+                        else:
+                            filas.append(fila)
+                    escritor.escribir(filas)
+                    totales['escritos'] += len(filas)
+                    if cohorte:
+                        # Agrupar para no llenar la cohorte de archivos Parquet diminutos
+                        para_cohorte.extend(filas)
+                        if len(para_cohorte) >= FILAS_POR_PARTE_COHORTE:
+                            guardar_filas(para_cohorte)
+                            para_cohorte = []
+                    print(f"{totales['procesados']} archivos procesados "
+                          f"({totales['procesados'] / (time.perf_counter() - inicio):.1f}/s)", file=sys.stderr)
+        if cohorte and para_cohorte:
+            guardar_filas(para_cohorte)
+    finally:
+        escritor.cerrar()
+    return totales
+
+
+def exportar_reportes_lote(salida: str, directorio: Optional[str] = None, formato: Optional[str] = None,
+                           workers: Optional[int] = None, recursivo: bool = False) -> Dict[str, int]:
+    """
+    Reportes PDF de todos los PDF del directorio (extraídos y analizados en los mismos procesos) o,
+    sin directorio, de los estudios del almacén de cohorte, en un ZIP o un PDF combinado.
+    """
+    formato = formato or os.path.splitext(salida)[1].lstrip('.').lower()
+    if directorio is not None:
+        tareas, crear, total = buscar_pdfs(directorio, recursivo), reporte_desde_pdf, None
+    else:
+        tareas = estudios_desde_cohorte(cargar_cohorte())
+        crear, total = reporte_estudio, len(tareas)
+    inicio = time.perf_counter()
+
+    def al_avanzar(completados, tarea, error):
+        if error is not None:
+            origen = tarea if isinstance(tarea, str) else tarea.get('archivo')
+            print(f"⚠️ {origen}: {error}", file=sys.stderr)
+        if completados % 10 == 0 or completados == total:
+            print(f"{completados}{f' de {total}' if total else ''} reportes "
+                  f"({completados / (time.perf_counter() - inicio):.1f}/s)", file=sys.stderr)
+
+    return exportar_reportes(tareas, salida, formato, crear, workers, procesos=True, al_avanzar=al_avanzar)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='pulmoreport', description='PulmoReport AI sin interfaz')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    batch = subparsers.add_parser('batch', help='Analiza todos los PDF de un directorio')
+    batch.add_argument('directorio', help='Directorio con los informes PDF')
+    batch.add_argument('-o', '--salida', required=True, help='Archivo de salida (.jsonl, .csv o .parquet)')
+    batch.add_argument('-f', '--formato', choices=sorted(ESCRITORES), help='Formato (por defecto, según la extensión)')
+    batch.add_argument('-w', '--workers', type=int, default=None, help='Procesos en paralelo (por defecto, nº de CPUs)')
+    batch.add_argument('-b', '--bloque', type=int, default=16, help='PDFs por tarea enviada al pool')
+    batch.add_argument('-r', '--recursivo', action='store_true', help='Incluir subdirectorios')
+    batch.add_argument('--cohorte', action='store_true', help='Añadir también los estudios al almacén de cohorte')
+    batch.add_argument('-m', '--modo', choices=MODOS_EXTRACCION, default='texto',
+                       help='Extracción sobre el texto aplanado o por columnas de la tabla')
+
+    reportes = subparsers.add_parser('reportes', help='Reportes PDF de muchos estudios en un ZIP o un PDF combinado')
+    reportes.add_argument('directorio', nargs='?', help='Directorio con los informes PDF (por defecto, el almacén de cohorte)')
+    reportes.add_argument('-o', '--salida', required=True, help='Archivo de salida (.zip o .pdf)')
+    reportes.add_argument('-f', '--formato', choices=sorted(ESCRITORES_REPORTES), help='Formato (por defecto, según la extensión)')
+    reportes.add_argument('-w', '--workers', type=int, default=None, help='Procesos en paralelo (por defecto, nº de CPUs)')
+    reportes.add_argument('-r', '--recursivo', action='store_true', help='Incluir subdirectorios')
+
+    args = parser.parse_args(argv)
+    if args.comando == 'reportes':
+        if args.directorio is not None and not os.path.isdir(args.directorio):
+            parser.error(f"No existe el directorio: {args.directorio}")
+        formato = args.formato or os.path.splitext(args.salida)[1].lstrip('.').lower()
+        if formato not in ESCRITORES_REPORTES:
+            parser.error(f"Formato de reportes no soportado: '{formato}' (use {', '.join(ESCRITORES_REPORTES)})")
+        totales = exportar_reportes_lote(args.salida, args.directorio, formato, args.workers, args.recursivo)
+        print(f"✅ {totales['generados']} reportes escritos en {args.salida} "
+              f"({totales['errores']} con error)", file=sys.stderr)
+        return 0
+
+    if not os.path.isdir(args.directorio):
+        parser.error(f"No existe el directorio: {args.directorio}")
+
+    try:
+        formato = args.formato or formato_desde_ruta(args.salida)
+    except ValueError as e:
+        parser.error(str(e))
+
+    totales = procesar_directorio(args.directorio, args.salida, formato, args.workers,
+                                  args.bloque, args.recursivo, args.cohorte, args.modo)
+    print(f"✅ {totales['escritos']} estudios escritos en {args.salida} "
+          f"({totales['errores']} archivos con error)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import os
+import time
+
+from utils.cache_extraccion import podar_cache_disco
+
+
+def _entrada(directorio, nombre: str, tamano: int, antiguedad: float) -> str:
+    ruta = os.path.join(directorio, nombre[:2], f'{nombre}.json')
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(b'x' * tamano)
+    instante = time.time() - antiguedad
+    os.utime(ruta, (instante, instante))
+    return ruta
+
+
+def test_poda_borra_las_caducadas(tmp_path):
+    vieja = _entrada(tmp_path, 'aa01', 10, antiguedad=3600)
+    nueva = _entrada(tmp_path, 'bb01', 10, antiguedad=0)
+    assert podar_cache_disco(str(tmp_path), max_bytes=1000, max_edad=60) == 10
+    assert not os.path.exists(vieja)
+    assert os.path.exists(nueva)
+
+
+def test_poda_borra_las_menos_usadas_por_encima_del_limite(tmp_path):
+    rutas = [_entrada(tmp_path, f'{i:02d}ab', 100, antiguedad=10 * (5 - i)) for i in range(5)]
+    assert podar_cache_disco(str(tmp_path), max_bytes=250, max_edad=3600) == 200
+    assert [os.path.exists(r) for r in rutas] == [False, False, False, True, True]
+
+
+def test_poda_sin_directorio(tmp_path):
+    assert podar_cache_disco(str(tmp_path / 'no_existe')) == 0
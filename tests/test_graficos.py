@@ -0,0 +1,50 @@
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.graficos import CodificadorPNGFranjas, PlantillaZScores, _adler32_concatenado
+
+PARAMETROS = ('FEV1', 'FVC', 'FEF25-75%')
+
+
+def _idat(png: bytes) -> bytes:
+    datos = []
+    posicion = 8
+    while posicion < len(png):
+        longitud, tipo = struct.unpack('>I4s', png[posicion:posicion + 8])
+        if tipo == b'IDAT':
+            datos.append(png[posicion + 8:posicion + 8 + longitud])
+        posicion += 12 + longitud
+    return b''.join(datos)
+
+
+@pytest.mark.parametrize('transparente', [True, False])
+@pytest.mark.parametrize('dpi', [150, 300])
+@pytest.mark.parametrize('rango, z_scores', [
+    ((-5, 3), (-5.0, 0.0, 3.0)),
+    ((-5, 3), (-1.64, -2.5, 1.2)),
+    ((-10, 5), (-9.9, 4.9, -0.01)),
+])
+def test_png_coincide_con_el_lienzo(transparente, dpi, rango, z_scores):
+    plantilla = PlantillaZScores('Prueba', PARAMETROS, rango, dpi, transparente)
+    png = plantilla.renderizar(z_scores)
+    # zlib comprueba el Adler-32 combinado a mano
+    zlib.decompress(_idat(png))
+    imagen = Image.open(io.BytesIO(png))
+    imagen.load()
+    assert imagen.mode == ('RGBA' if transparente else 'RGB')
+    np.testing.assert_array_equal(np.asarray(imagen), plantilla._pixeles())
+
+
+def test_adler32_concatenado():
+    a, b = b'espirometria' * 50, b'dlco' * 333
+    assert _adler32_concatenado(zlib.adler32(a), zlib.adler32(b), len(b)) == zlib.adler32(a + b)
+
+
+def test_unir_franjas_solapadas():
+    franjas = [(20, 25), (5, 10), (8, 15), (15, 18), (-3, 2), (30, 40), (12, 12)]
+    assert CodificadorPNGFranjas._unir(franjas, alto=35) == [[0, 2], [5, 18], [20, 25], [30, 35]]
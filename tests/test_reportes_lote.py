@@ -0,0 +1,79 @@
+import io
+import zipfile
+
+import pdfplumber
+import pytest
+
+from utils.analisis_gli import analizar_estudio
+from utils.reportes_lote import EscritorReportesZIP, exportar_reportes, reporte_estudio
+
+DATOS = {
+    'Edad': '45', 'Altura': '170', 'Sexo': 'Masculino',
+    'FEV1 pre': '3.1', 'FVC pre': '4.0', 'FEF25-75% pre': '3.0',
+    'DLCO pre': '20', 'VA pre': '5', 'DLCO/VA': '4',
+    'TLC pre': '6', 'VC pre': '4.5', 'RV pre': '1.8', 'RV/TLC pre': '30'
+}
+
+
+def _estudio(archivo: str, edad: str) -> dict:
+    datos = dict(DATOS, Edad=edad)
+    estudio = analizar_estudio(datos)
+    return {'archivo': archivo, 'datos': datos, 'espiro': estudio['espiro'], 'dlco': estudio['dlco'],
+            'vol': estudio['vol']}
+
+
+@pytest.fixture(scope='module')
+def estudios():
+    return [_estudio(f'informe_{i}.pdf', edad) for i, edad in enumerate(('30', '45', '60', '75'))]
+
+
+def _paginas(pdf: bytes) -> int:
+    with pdfplumber.open(io.BytesIO(pdf)) as documento:
+        return len(documento.pages)
+
+
+def _texto(pdf: bytes) -> str:
+    with pdfplumber.open(io.BytesIO(pdf)) as documento:
+        return '\n'.join(pagina.extract_text() or '' for pagina in documento.pages)
+
+
+def test_pdf_combinado(estudios):
+    destino = io.BytesIO()
+    totales = exportar_reportes(estudios, destino, 'pdf', workers=2)
+    assert totales == {'generados': 4, 'errores': 0}
+
+    individuales = [reporte_estudio(estudio)[1] for estudio in estudios]
+    combinado = destino.getvalue()
+    assert _paginas(combinado) == sum(_paginas(pdf) for pdf in individuales)
+    texto = _texto(combinado)
+    assert texto.count('INFORMACIÓN DEL PACIENTE') == 4
+    for edad in ('30', '45', '60', '75'):
+        assert f'Edad {edad}' in texto
+
+
+def test_tarea_con_error_no_rompe_el_pdf(estudios):
+    def crear(estudio):
+        if estudio is None:
+            raise ValueError('estudio roto')
+        return reporte_estudio(estudio)
+
+    errores = []
+    destino = io.BytesIO()
+    totales = exportar_reportes([estudios[0], None, estudios[1]], destino, 'pdf', crear=crear, workers=2,
+                                al_avanzar=lambda completados, tarea, error: errores.append(error))
+    assert totales == {'generados': 2, 'errores': 1}
+    assert errores == [None, 'estudio roto', None]
+    esperadas = _paginas(reporte_estudio(estudios[0])[1]) + _paginas(reporte_estudio(estudios[1])[1])
+    assert _paginas(destino.getvalue()) == esperadas
+
+
+def test_zip_nombres_repetidos():
+    destino = io.BytesIO()
+    escritor = EscritorReportesZIP(destino)
+    for contenido in (b'1', b'2', b'3'):
+        escritor.agregar('PulmoReport_informe.pdf', contenido)
+    escritor.cerrar()
+    with zipfile.ZipFile(destino) as archivo:
+        assert archivo.namelist() == ['PulmoReport_informe.pdf', 'PulmoReport_informe_2.pdf',
+                                      'PulmoReport_informe_3.pdf']
+        assert archivo.read('PulmoReport_informe_3.pdf') == b'3'
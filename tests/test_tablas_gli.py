@@ -0,0 +1,17 @@
+import pytest
+
+from utils.analisis_gli import calcular_valor_esperado_fev1, calcular_valor_esperado_fvc
+from utils.tablas_gli import obtener_tabla
+
+
+def test_edad_3_1_usa_la_primera_fila_de_la_tabla():
+    # Antes de cargar las tablas en memoria la búsqueda saltaba la primera fila de datos (edad 3.0),
+    # así que de 3.0 a 3.25 años se usaba el spline de 3.25
+    tabla = obtener_tabla('FEV1', 'Masculino')
+    assert tabla.edad[0] == 3.0
+    assert tabla.indice_edad(3.1) == 0
+
+
+def test_valores_esperados_edad_3_1():
+    assert calcular_valor_esperado_fev1(3.1, 95, 'Masculino') == pytest.approx(0.7538246992, abs=1e-9)
+    assert calcular_valor_esperado_fvc(3.1, 95, 'Femenino') == pytest.approx(0.7681416012, abs=1e-9)
@@ -1,256 +1,132 @@
+import functools
 import math
-import pandas as pd
 from typing import Dict, Tuple
 
-# Variables globales para almacenar las tablas de lookup
-gli_tables = {}
-gli_coefficients = {}
-gli_dlco_tables = {}
-gli_vol_tables = {}
+# Los coeficientes fijos viven en el almacén de referencia; se reexportan aquí por compatibilidad
+from utils.tablas_gli import (
+    DLCO_COEFFICIENTS, KCO_COEFFICIENTS, VA_COEFFICIENTS,
+    TLC_COEFFICIENTS, VC_COEFFICIENTS, RV_COEFFICIENTS, RVTLC_COEFFICIENTS,
+    cargar_tablas_referencia, obtener_tabla, sexo_en, version_tablas
+)
+from utils.cache_lru import CacheLRU
+from utils.instrumentacion import medir
+from utils.lms_gli import obtener_s_l, calcular_z_score_lms, calcular_limite_lms, calcular_percentil
+from utils.resultados import SEVERIDADES, ResultadoEstudio, Severidad
 
-# Coeficientes fijos para ecuaciones GLI 2017 DLCO
-DLCO_COEFFICIENTS = {
-    'males': {'a': -7.034920, 'p': 2.018368, 'q': 0.012425},
-    'females': {'a': -5.159451, 'p': 1.618697, 'q': 0.015390}
-}
-
-KCO_COEFFICIENTS = {
-    'males': {'a': 4.088408, 'p': 0.415334, 'q': 0.113166},
-    'females': {'a': 5.131492, 'p': 0.645656, 'q': 0.097395}
-}
-
-VA_COEFFICIENTS = {
-    'males': {'a': -11.086573, 'p': 2.430021, 'q': 0.097047},
-    'females': {'a': -9.873970, 'p': 2.182316, 'q': 0.082868}
-}
-
-# Coeficientes fijos para ecuaciones GLI 2021 Volúmenes
-TLC_COEFFICIENTS = {
-    'males': {'a': -10.5861, 'p': 0.1433, 'q': 2.3155},
-    'females': {'a': -10.1128, 'p': 0.1062, 'q': 2.2259}
-}
+# Caché de valores esperados compartido por todo el proceso: los analizadores, la broncodilatación
+# y el procesado de múltiples PDFs repiten las mismas predicciones para un mismo paciente.
+cache_predicciones = CacheLRU(max_entradas=4096)
 
-VC_COEFFICIENTS = {
-    'males': {'a': -10.134371, 'p': -0.003532, 'q': 2.307980},
-    'females': {'a': -9.230600, 'p': -0.005517, 'q': 2.116822}
-}
+def memoizar_prediccion(parametro: str):
+    """
+    Decorador para calcular_valor_esperado_*: memoriza el resultado por
+    (parámetro, sexo, edad, altura, versión de las tablas).
+    """
+    def decorador(func):
+        # Solo se mide el cálculo (los aciertos del caché no cuentan como predicción)
+        calcular = medir('gli.prediccion')(func)
 
-RV_COEFFICIENTS = {
-    'males': {'a': -2.37211, 'p': 0.01346, 'q': 0.01307},
-    'females': {'a': -2.50593, 'p': 0.01307, 'q': 0.01379}
-}
+        @functools.wraps(func)
+        def envoltura(edad: float, altura: float, sexo: str) -> float:
+            clave = (parametro, sexo_en(sexo), float(edad), float(altura), version_tablas())
+            return cache_predicciones.obtener_o_calcular(clave, lambda: calcular(edad, altura, sexo))
+        return envoltura
+    return decorador
 
-RVTLC_COEFFICIENTS = {
-    'males': {'a': 2.634, 'p': 0.01302, 'q': -0.00008862},
-    'females': {'a': 2.666, 'p': 0.01411, 'q': -0.00003689}
-}
+def estadisticas_cache_predicciones() -> Dict:
+    """
+    Aciertos, fallos y ocupación del caché de valores esperados.
+    """
+    return cache_predicciones.estadisticas()
 
 def cargar_tablas_gli():
     """
-    Carga las tablas de lookup de GLI 2012 desde el archivo Excel.
+    Carga las tablas de lookup de GLI 2012 en el almacén de referencia (una vez por proceso).
     """
-    global gli_tables, gli_coefficients
-    try:
-        excel_file = 'lookuptables.xlsx'
-        # Nombres de hoja exactos según el archivo
-        sheet_names = {
-            'fev1_males': 'FEV1 males',
-            'fev1_females': 'FEV1 females',
-            'fvc_males': 'FVC males',
-            'fvc_females': 'FVC females',
-            'fef2575_males': 'FEF2575 males',
-            'fef2575_females': 'FEF2575 females'
-        }
-        
-        for key, sheet in sheet_names.items():
-            try:
-                # Leer columnas: B (edad), C (Lspline), D (Mspline), E (Sspline)
-                gli_tables[key] = pd.read_excel(excel_file, sheet_name=sheet, header=None, skiprows=4, usecols=[1, 2, 3, 4], engine='openpyxl')
-                gli_tables[key].columns = ['age', 'Lspline', 'Mspline', 'Sspline']
-                
-                # Leer coeficientes a0-a5 y p0-p5 una sola vez por hoja
-                original_table = pd.read_excel(excel_file, sheet_name=sheet, header=None, skiprows=4, engine='openpyxl')
-                
-                # Coeficientes a0-a5 (columna 8, filas 3-5)
-                a0 = float(original_table.iloc[3, 8])  # a0
-                a1 = float(original_table.iloc[4, 8])  # a1
-                a2 = float(original_table.iloc[5, 8])  # a2
-                a3 = 0.0  # No existe en el archivo
-                a4 = 0.0  # No existe en el archivo
-                a5 = 0.0  # No existe en el archivo
-                
-                # Coeficientes p0-p5 (columna 11, filas 3, 5)
-                p0 = float(original_table.iloc[3, 11])  # p0
-                p1 = float(original_table.iloc[5, 11])  # p1
-                p2 = 0.0  # No existe en el archivo
-                p3 = 0.0  # No existe en el archivo
-                p4 = 0.0  # No existe en el archivo
-                p5 = 0.0  # No existe en el archivo
-                
-                # Almacenar coeficientes
-                gli_coefficients[key] = (a0, a1, a2, a3, a4, a5, p0, p1, p2, p3, p4, p5)
-                
-            except Exception as sheet_error:
-                print(f"Error cargando hoja {sheet} del archivo {excel_file}: {sheet_error}")
-                return False
-                
-        return True
-    except Exception as e:
-        print(f"Error general cargando tablas GLI: {e}")
-        print("Asegúrate de que el archivo 'lookuptables.xlsx' esté presente y que openpyxl esté instalado correctamente.")
-        return False
+    return cargar_tablas_referencia()
 
 def cargar_tablas_dlco():
     """
-    Carga las tablas de lookup de DLCO desde el archivo Excel.
+    Carga las tablas de lookup de DLCO en el almacén de referencia (una vez por proceso).
     """
-    global gli_dlco_tables
-    try:
-        excel_file = 'lookuptablesdlco.xlsx'
-        # Nombres de hoja para DLCO
-        sheet_names = {
-            'dlco_females': 'DLCO_f',
-            'kco_females': 'KCO_f',
-            'va_females': 'VA_f',
-            'dlco_males': 'DLCO_m',
-            'kco_males': 'KCO_m',
-            'va_males': 'VA_m',
-        }
-        for key, sheet in sheet_names.items():
-            # Leer columnas: B (edad, índice 1), C (Mspline, índice 2)
-            df = pd.read_excel(excel_file, sheet_name=sheet, header=None, skiprows=1, usecols=[1,2])
-            df.columns = ['age', 'Mspline']
-            gli_dlco_tables[key] = df
-        return True
-    except Exception as e:
-        print(f"Error cargando tablas DLCO: {e}")
-        return False
+    return cargar_tablas_referencia()
 
 def cargar_tablas_volumenes():
     """
-    Carga las tablas de lookup de volúmenes desde el archivo Excel.
+    Carga las tablas de lookup de volúmenes en el almacén de referencia (una vez por proceso).
     """
-    global gli_vol_tables
-    try:
-        excel_file = 'lookuptablesvol.xlsx'
-        # Nombres de hoja para volúmenes (en minúsculas)
-        sheet_names = {
-            'tlc_males': 'tlc_m_lookuptable',
-            'tlc_females': 'tlc_f_lookuptable',
-            'vc_males': 'vc_m_lookuptable',
-            'vc_females': 'vc_f_lookuptable',
-            'rv_males': 'rv_m_lookuptable',
-            'rv_females': 'rv_f_lookuptable',
-            'rvtlc_males': 'rvtlc_m_lookuptable',
-            'rvtlc_females': 'rvtlc_f_lookuptable'
-        }
-        for key, sheet in sheet_names.items():
-            # Leer columnas: A (edad, índice 0), B (Mspline, índice 1)
-            df = pd.read_excel(excel_file, sheet_name=sheet, header=None, skiprows=1, usecols=[0,1])
-            df.columns = ['age', 'Mspline']
-            gli_vol_tables[key] = df
-        return True
-    except Exception as e:
-        print(f"Error cargando tablas volúmenes: {e}")
-        return False
+    return cargar_tablas_referencia()
 
-def obtener_spline_dlco(edad: float, sexo: str, parametro: str) -> float:
+def obtener_spline_dlco(edad: float, sexo: str, parametro: str, interpolar: bool = False) -> float:
     """
     Obtiene el valor Mspline para DLCO, KCO o VA según la edad y sexo.
+    Con interpolar=True interpola entre las edades tabuladas en lugar de usar la más cercana.
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    if parametro.lower() == 'dlco':
-        key = f'dlco_{sexo_en}'
-    elif parametro.lower() == 'kco':
-        key = f'kco_{sexo_en}'
-    elif parametro.lower() == 'va':
-        key = f'va_{sexo_en}'
-    else:
+    if parametro.lower() not in ('dlco', 'kco', 'va'):
         raise ValueError('Parámetro DLCO no soportado')
-    df = gli_dlco_tables[key]
-    closest_row = df.iloc[(df['age'] - edad).abs().argsort()[:1]]
-    mspline = float(closest_row.iloc[0]['Mspline'])
+    mspline = obtener_tabla(parametro, sexo).spline(edad, 'M', interpolar)
     return mspline
 
+@memoizar_prediccion('dlco')
 def calcular_valor_esperado_dlco(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de DLCO usando ecuaciones GLI 2017.
     ln(DLCO) = a + p*ln(altura) - q*ln(edad) + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = DLCO_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_dlco(edad, sexo, 'dlco')
+    tabla = obtener_tabla('dlco', sexo)
+    spline = tabla.spline(edad, 'M')
     
     ln_altura = math.log(altura)
     ln_edad = math.log(edad)
-    ln_valor = coef['a'] + coef['p'] * ln_altura - coef['q'] * ln_edad + spline
+    ln_valor = tabla.a + tabla.p * ln_altura - tabla.q * ln_edad + spline
     
     return math.exp(ln_valor)
 
+@memoizar_prediccion('kco')
 def calcular_valor_esperado_kco(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de KCO usando ecuaciones GLI 2017.
     ln(KCO) = a - p*ln(altura) - q*ln(edad) + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = KCO_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_dlco(edad, sexo, 'kco')
+    tabla = obtener_tabla('kco', sexo)
+    spline = tabla.spline(edad, 'M')
     
     ln_altura = math.log(altura)
     ln_edad = math.log(edad)
-    ln_valor = coef['a'] - coef['p'] * ln_altura - coef['q'] * ln_edad + spline
+    ln_valor = tabla.a - tabla.p * ln_altura - tabla.q * ln_edad + spline
     
     return math.exp(ln_valor)
 
+@memoizar_prediccion('va')
 def calcular_valor_esperado_va(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de VA usando ecuaciones GLI 2017.
     ln(VA) = a + p*ln(altura) + q*ln(edad) + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = VA_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_dlco(edad, sexo, 'va')
+    tabla = obtener_tabla('va', sexo)
+    spline = tabla.spline(edad, 'M')
     
     ln_altura = math.log(altura)
     ln_edad = math.log(edad)
-    ln_valor = coef['a'] + coef['p'] * ln_altura + coef['q'] * ln_edad + spline
+    ln_valor = tabla.a + tabla.p * ln_altura + tabla.q * ln_edad + spline
     
     return math.exp(ln_valor)
 
-def obtener_coeficientes_regresion(edad: float, sexo: str, parametro: str) -> tuple:
+def obtener_coeficientes_regresion(edad: float, sexo: str, parametro: str, interpolar: bool = False) -> tuple:
     """
     Obtiene los coeficientes a, p, q (fijos) y el spline (varía por edad) para el parámetro y sexo dados.
+    Con interpolar=True el spline se interpola entre las edades tabuladas que rodean a la edad.
     """
-    # Traducir sexo a inglés para construir el nombre de la hoja correcto
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    if parametro == 'fvc':
-        sheet = f'FVC {sexo_en}'
-        spline_col = 3  # Columna D (Mspline)
-    elif parametro == 'fev1':
-        sheet = f'FEV1 {sexo_en}'
-        spline_col = 3  # Columna D (Mspline)
-    elif parametro == 'fef2575':
-        sheet = f'FEF2575 {sexo_en}'
-        spline_col = 2  # Columna C (Mspline)
-    else:
+    if parametro not in ('fvc', 'fev1', 'fef2575'):
         raise ValueError('Parámetro no soportado')
 
-    # Leer el archivo completo sin eliminar filas
-    df = pd.read_excel('lookuptables.xlsx', sheet_name=sheet, header=None, engine='openpyxl')
-    
-    # Coeficientes fijos (no cambian con la edad)
-    # I4, I5, I6 corresponden a las filas 3, 4, 5 del Excel (índices 3, 4, 5)
-    a = float(df.iloc[3, 8])   # I4 (fila 4 del Excel)
-    p = float(df.iloc[4, 8])   # I5 (fila 5 del Excel)
-    q = float(df.iloc[5, 8])   # I6 (fila 6 del Excel)
+    # Coeficientes fijos (I4, I5, I6) y spline por edad, leídos del almacén cargado una vez
+    tabla = obtener_tabla(parametro, sexo)
+    spline = tabla.spline(edad, 'M', interpolar)
     
-    # Buscar el spline para la edad específica (saltando las primeras 4 filas de encabezados)
-    df_data = df.iloc[4:]  # Datos sin encabezados
-    closest_row = df_data.iloc[(df_data[1] - edad).abs().argsort()[:1]]
-    spline = float(closest_row.iloc[0, spline_col])
-    
-    return a, p, q, spline
+    return tabla.a, tabla.p, tabla.q, spline
 
+@memoizar_prediccion('fvc')
 def calcular_valor_esperado_fvc(edad: float, altura: float, sexo: str) -> float:
     a, p, q, spline = obtener_coeficientes_regresion(edad, sexo, 'fvc')
     ln_altura = math.log(altura)
@@ -258,6 +134,7 @@ def calcular_valor_esperado_fvc(edad: float, altura: float, sexo: str) -> float:
     ln_valor = a + p * ln_altura + q * ln_edad + spline
     return math.exp(ln_valor)
 
+@memoizar_prediccion('fev1')
 def calcular_valor_esperado_fev1(edad: float, altura: float, sexo: str) -> float:
     a, p, q, spline = obtener_coeficientes_regresion(edad, sexo, 'fev1')
     ln_altura = math.log(altura)
@@ -265,6 +142,7 @@ def calcular_valor_esperado_fev1(edad: float, altura: float, sexo: str) -> float
     ln_valor = a + p * ln_altura + q * ln_edad + spline
     return math.exp(ln_valor)
 
+@memoizar_prediccion('fef2575')
 def calcular_valor_esperado_fef2575(edad: float, altura: float, sexo: str) -> float:
     a, p, q, spline = obtener_coeficientes_regresion(edad, sexo, 'fef2575')
     ln_altura = math.log(altura)
@@ -276,371 +154,124 @@ def calcular_z_score(valor_observado: float, valor_esperado: float, rse: float =
     """
     Calcula el z-score usando la fórmula: (ln(observado) - ln(esperado)) / RSE
     RSE (Residual Standard Error) típico para espirometría es ~0.12
+    Aproximación con RSE fijo; los analizadores usan el método LMS completo (utils.lms_gli).
     """
     if valor_observado <= 0 or valor_esperado <= 0:
         return 0
     return (math.log(valor_observado) - math.log(valor_esperado)) / rse
 
+# Umbrales de z-score (ATS/ERS) que separan los códigos de severidad (0 = normal ... 4 = muy severa)
+UMBRALES_SEVERIDAD = (-1.64, -2.5, -4.0, -6.0)
+
+def codigo_severidad(z_score: float) -> int:
+    """
+    Devuelve el código de severidad (índice en SEVERIDADES) para un z-score.
+    """
+    return sum(z_score < umbral for umbral in UMBRALES_SEVERIDAD)
+
 def interpretar_z_score_con_severidad(z_score: float) -> Tuple[str, str]:
     """
     Interpreta el z-score con grado de severidad según criterios ATS/ERS.
     Retorna (interpretación, severidad)
     """
-    if z_score >= -1.64:
-        return "Normal", "Sin alteración"
-    elif z_score >= -2.5:
-        return "Ligeramente reducido", "Leve"
-    elif z_score >= -4.0:
-        return "Moderadamente reducido", "Moderada"
-    elif z_score >= -6.0:
-        return "Severamente reducido", "Severa"
-    else:
-        return "Muy severamente reducido", "Muy severa"
+    return SEVERIDADES[codigo_severidad(z_score)]
+
+def _resultado_parametro(parametro: str, observado: float, esperado: float, edad: float,
+                         sexo: str) -> Tuple[Tuple[float, ...], Severidad]:
+    """
+    Calcula z-score, LLN y percentil de un parámetro según el método LMS de GLI.
+    Devuelve los valores en el orden de COLUMNAS y el código de severidad.
+    """
+    s, l = obtener_s_l(parametro, edad, sexo)
+    z = calcular_z_score_lms(observado, esperado, s, l)
+    valores = (
+        observado,
+        round(esperado, 2),
+        round(z, 2),
+        round(calcular_limite_lms(esperado, s, l), 2),
+        round(calcular_percentil(z), 1)
+    )
+    return valores, Severidad(codigo_severidad(z))
 
 def analizar_espirometria(datos: Dict) -> Dict:
     """
     Analiza los datos de espirometría usando ecuaciones GLI.
+    Incluye también DLCO y volúmenes si están disponibles (vista 'espiro' de analizar_estudio).
     """
-    try:
-        edad = float(datos.get('Edad', 0))
-        altura = float(datos.get('Altura', 0))
-        sexo = datos.get('Sexo', 'Femenino')
-        
-        if edad <= 0 or altura <= 0:
-            return {"error": "Datos insuficientes para análisis"}
-        
-        # Validar rango de edad y altura
-        if edad < 3 or edad > 95:
-            return {"error": "Edad fuera del rango válido (3-95 años)"}
-        if altura < 100 or altura > 250:
-            return {"error": "Altura fuera del rango válido (100-250 cm)"}
-        
-        # Cargar tablas si no están cargadas
-        if not gli_tables:
-            cargar_tablas_gli()
-        if not gli_dlco_tables:
-            cargar_tablas_dlco()
-        if not gli_vol_tables:
-            cargar_tablas_volumenes()
-        
-        resultados = {}
-        
-        # FEV1
-        if datos.get('FEV1 pre') and datos.get('FEV1 pre') != 'Valor no encontrado':
-            fev1_obs = float(datos['FEV1 pre'])
-            fev1_esp = calcular_valor_esperado_fev1(edad, altura, sexo)
-            fev1_z = calcular_z_score(fev1_obs, fev1_esp)
-            interpretacion, severidad = interpretar_z_score_con_severidad(fev1_z)
-            resultados['FEV1'] = {
-                'observado': fev1_obs,
-                'esperado': round(fev1_esp, 2),
-                'z_score': round(fev1_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # FVC
-        if datos.get('FVC pre') and datos.get('FVC pre') != 'Valor no encontrado':
-            fvc_obs = float(datos['FVC pre'])
-            fvc_esp = calcular_valor_esperado_fvc(edad, altura, sexo)
-            fvc_z = calcular_z_score(fvc_obs, fvc_esp)
-            interpretacion, severidad = interpretar_z_score_con_severidad(fvc_z)
-            resultados['FVC'] = {
-                'observado': fvc_obs,
-                'esperado': round(fvc_esp, 2),
-                'z_score': round(fvc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # FEF25-75%
-        if datos.get('FEF25-75% pre') and datos.get('FEF25-75% pre') != 'Valor no encontrado':
-            fef_obs = float(datos['FEF25-75% pre'])
-            fef_esp = calcular_valor_esperado_fef2575(edad, altura, sexo)
-            fef_z = calcular_z_score(fef_obs, fef_esp)
-            interpretacion, severidad = interpretar_z_score_con_severidad(fef_z)
-            resultados['FEF25-75%'] = {
-                'observado': fef_obs,
-                'esperado': round(fef_esp, 2),
-                'z_score': round(fef_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # DLCO
-        if datos.get('DLCO pre') and datos.get('DLCO pre') != 'Valor no encontrado':
-            dlco_obs = float(datos['DLCO pre'])
-            dlco_esp = calcular_valor_esperado_dlco(edad, altura, sexo)
-            dlco_z = calcular_z_score(dlco_obs, dlco_esp, rse=0.15)  # RSE específico para DLCO
-            interpretacion, severidad = interpretar_z_score_con_severidad(dlco_z)
-            resultados['DLCO'] = {
-                'observado': dlco_obs,
-                'esperado': round(dlco_esp, 2),
-                'z_score': round(dlco_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # KCO
-        kco_valor = None
-        if datos.get('KCO pre') and datos.get('KCO pre') != 'Valor no encontrado':
-            kco_valor = datos['KCO pre']
-        elif datos.get('KCO') and datos.get('KCO') != 'Valor no encontrado':
-            kco_valor = datos['KCO']
-        elif datos.get('DLCO/VA pre') and datos.get('DLCO/VA pre') != 'Valor no encontrado':
-            kco_valor = datos['DLCO/VA pre']
-        elif datos.get('DLCO/VA') and datos.get('DLCO/VA') != 'Valor no encontrado':
-            kco_valor = datos['DLCO/VA']
-        if kco_valor is not None:
-            kco_obs = float(kco_valor)
-            kco_esp = calcular_valor_esperado_kco(edad, altura, sexo)
-            kco_z = calcular_z_score(kco_obs, kco_esp, rse=0.15)
-            interpretacion, severidad = interpretar_z_score_con_severidad(kco_z)
-            resultados['KCO'] = {
-                'observado': kco_obs,
-                'esperado': round(kco_esp, 2),
-                'z_score': round(kco_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # VA (si está disponible)
-        if datos.get('VA pre') and datos.get('VA pre') != 'Valor no encontrado':
-            va_obs = float(datos['VA pre'])
-            va_esp = calcular_valor_esperado_va(edad, altura, sexo)
-            va_z = calcular_z_score(va_obs, va_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(va_z)
-            resultados['VA'] = {
-                'observado': va_obs,
-                'esperado': round(va_esp, 2),
-                'z_score': round(va_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # TLC (si está disponible)
-        if datos.get('TLC pre') and datos.get('TLC pre') != 'Valor no encontrado':
-            tlc_obs = float(datos['TLC pre'])
-            tlc_esp = calcular_valor_esperado_tlc(edad, altura, sexo)
-            tlc_z = calcular_z_score(tlc_obs, tlc_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(tlc_z)
-            resultados['TLC'] = {
-                'observado': tlc_obs,
-                'esperado': round(tlc_esp, 2),
-                'z_score': round(tlc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # VC (si está disponible)
-        if datos.get('VC pre') and datos.get('VC pre') != 'Valor no encontrado':
-            vc_obs = float(datos['VC pre'])
-            vc_esp = calcular_valor_esperado_vc(edad, altura, sexo)
-            vc_z = calcular_z_score(vc_obs, vc_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(vc_z)
-            resultados['VC'] = {
-                'observado': vc_obs,
-                'esperado': round(vc_esp, 2),
-                'z_score': round(vc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # RV (si está disponible)
-        if datos.get('RV pre') and datos.get('RV pre') != 'Valor no encontrado':
-            rv_obs = float(datos['RV pre'])
-            rv_esp = calcular_valor_esperado_rv(edad, altura, sexo)
-            rv_z = calcular_z_score(rv_obs, rv_esp, rse=0.15)
-            interpretacion, severidad = interpretar_z_score_con_severidad(rv_z)
-            resultados['RV'] = {
-                'observado': rv_obs,
-                'esperado': round(rv_esp, 2),
-                'z_score': round(rv_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # RV/TLC
-        if datos.get('RV/TLC pre') and datos.get('RV/TLC pre') != 'Valor no encontrado':
-            rvtlc_obs = float(datos['RV/TLC pre'])
-            rvtlc_esp = calcular_valor_esperado_rvtlc(edad, altura, sexo)
-            print(f"DEBUG RV/TLC antes normalizar: observado={rvtlc_obs}, esperado={rvtlc_esp}")
-            # Normalizar solo el valor esperado si es >2
-            if rvtlc_esp > 2:
-                rvtlc_esp = rvtlc_esp / 100
-            print(f"DEBUG RV/TLC despues normalizar: observado={rvtlc_obs}, esperado={rvtlc_esp}")
-            rvtlc_z = calcular_z_score(rvtlc_obs, rvtlc_esp, rse=0.15)
-            print(f"DEBUG RV/TLC: z-score={rvtlc_z}")
-            interpretacion, severidad = interpretar_z_score_con_severidad(rvtlc_z)
-            resultados['RV/TLC'] = {
-                'observado': rvtlc_obs,
-                'esperado': round(rvtlc_esp, 2),
-                'z_score': round(rvtlc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        return resultados
-        
-    except Exception as e:
-        return {"error": f"Error en análisis: {str(e)}"}
+    return analizar_estudio(datos)['espiro']
 
 def analizar_dlco(datos: Dict) -> Dict:
     """
     Analiza específicamente los datos de DLCO usando ecuaciones GLI.
     """
-    try:
-        edad = float(datos.get('Edad', 0))
-        altura = float(datos.get('Altura', 0))
-        sexo = datos.get('Sexo', 'Femenino')
-        
-        if edad <= 0 or altura <= 0:
-            return {"error": "Datos insuficientes para análisis"}
-        
-        # Validar rango de edad y altura
-        if edad < 5 or edad > 90:  # Rango específico para DLCO
-            return {"error": "Edad fuera del rango válido para DLCO (5-90 años)"}
-        if altura < 100 or altura > 250:
-            return {"error": "Altura fuera del rango válido (100-250 cm)"}
-        
-        # Cargar tablas DLCO si no están cargadas
-        if not gli_dlco_tables:
-            cargar_tablas_dlco()
-        
-        resultados = {}
-        
-        # DLCO
-        if datos.get('DLCO pre') and datos.get('DLCO pre') != 'Valor no encontrado':
-            dlco_obs = float(datos['DLCO pre'])
-            dlco_esp = calcular_valor_esperado_dlco(edad, altura, sexo)
-            dlco_z = calcular_z_score(dlco_obs, dlco_esp, rse=0.15)
-            interpretacion, severidad = interpretar_z_score_con_severidad(dlco_z)
-            resultados['DLCO'] = {
-                'observado': dlco_obs,
-                'esperado': round(dlco_esp, 2),
-                'z_score': round(dlco_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # KCO
-        kco_valor = None
-        if datos.get('KCO pre') and datos.get('KCO pre') != 'Valor no encontrado':
-            kco_valor = datos['KCO pre']
-        elif datos.get('KCO') and datos.get('KCO') != 'Valor no encontrado':
-            kco_valor = datos['KCO']
-        elif datos.get('DLCO/VA pre') and datos.get('DLCO/VA pre') != 'Valor no encontrado':
-            kco_valor = datos['DLCO/VA pre']
-        elif datos.get('DLCO/VA') and datos.get('DLCO/VA') != 'Valor no encontrado':
-            kco_valor = datos['DLCO/VA']
-        if kco_valor is not None:
-            kco_obs = float(kco_valor)
-            kco_esp = calcular_valor_esperado_kco(edad, altura, sexo)
-            kco_z = calcular_z_score(kco_obs, kco_esp, rse=0.15)
-            interpretacion, severidad = interpretar_z_score_con_severidad(kco_z)
-            resultados['KCO'] = {
-                'observado': kco_obs,
-                'esperado': round(kco_esp, 2),
-                'z_score': round(kco_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # VA
-        if datos.get('VA pre') and datos.get('VA pre') != 'Valor no encontrado':
-            va_obs = float(datos['VA pre'])
-            va_esp = calcular_valor_esperado_va(edad, altura, sexo)
-            va_z = calcular_z_score(va_obs, va_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(va_z)
-            resultados['VA'] = {
-                'observado': va_obs,
-                'esperado': round(va_esp, 2),
-                'z_score': round(va_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        return resultados
-        
-    except Exception as e:
-        return {"error": f"Error en análisis DLCO: {str(e)}"}
+    return analizar_estudio(datos)['dlco']
 
-def obtener_spline_volumen(edad: float, sexo: str, parametro: str) -> float:
+def obtener_spline_volumen(edad: float, sexo: str, parametro: str, interpolar: bool = False) -> float:
     """
     Obtiene el valor Mspline para volúmenes según la edad y sexo.
+    Con interpolar=True interpola entre las edades tabuladas en lugar de usar la más cercana.
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    if parametro.lower() == 'tlc':
-        key = f'tlc_{sexo_en}'
-    elif parametro.lower() == 'vc':
-        key = f'vc_{sexo_en}'
-    elif parametro.lower() == 'rv':
-        key = f'rv_{sexo_en}'
-    elif parametro.lower() == 'rvtlc':
-        key = f'rvtlc_{sexo_en}'
-    else:
+    if parametro.lower() not in ('tlc', 'vc', 'rv', 'rvtlc'):
         raise ValueError('Parámetro volumen no soportado')
-    
-    df = gli_vol_tables[key]
-    closest_row = df.iloc[(df['age'] - edad).abs().argsort()[:1]]
-    mspline = float(closest_row.iloc[0]['Mspline'])
+    mspline = obtener_tabla(parametro, sexo).spline(edad, 'M', interpolar)
     return mspline
 
+@memoizar_prediccion('tlc')
 def calcular_valor_esperado_tlc(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de TLC usando ecuaciones GLI 2021.
     ln(TLC) = a + p*ln(edad) + q*ln(altura) + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = TLC_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_volumen(edad, sexo, 'tlc')
+    tabla = obtener_tabla('tlc', sexo)
+    spline = tabla.spline(edad, 'M')
     
     ln_edad = math.log(edad)
     ln_altura = math.log(altura)
-    ln_valor = coef['a'] + coef['p'] * ln_edad + coef['q'] * ln_altura + spline
+    ln_valor = tabla.a + tabla.p * ln_edad + tabla.q * ln_altura + spline
     
     return math.exp(ln_valor)
 
+@memoizar_prediccion('vc')
 def calcular_valor_esperado_vc(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de VC usando ecuaciones GLI 2021.
     ln(VC) = a + p*edad + q*ln(altura) + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = VC_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_volumen(edad, sexo, 'vc')
+    tabla = obtener_tabla('vc', sexo)
+    spline = tabla.spline(edad, 'M')
     
     ln_altura = math.log(altura)
-    ln_valor = coef['a'] + coef['p'] * edad + coef['q'] * ln_altura + spline
+    ln_valor = tabla.a + tabla.p * edad + tabla.q * ln_altura + spline
     
     return math.exp(ln_valor)
 
+@memoizar_prediccion('rv')
 def calcular_valor_esperado_rv(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de RV usando ecuaciones GLI 2021.
     ln(RV) = a + p*edad + q*altura + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = RV_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_volumen(edad, sexo, 'rv')
+    tabla = obtener_tabla('rv', sexo)
+    spline = tabla.spline(edad, 'M')
     
-    ln_valor = coef['a'] + coef['p'] * edad + coef['q'] * altura + spline
+    ln_valor = tabla.a + tabla.p * edad + tabla.q * altura + spline
     
     return math.exp(ln_valor)
 
+@memoizar_prediccion('rvtlc')
 def calcular_valor_esperado_rvtlc(edad: float, altura: float, sexo: str) -> float:
     """
     Calcula el valor esperado de RV/TLC usando ecuaciones GLI 2021.
     ln(RV/TLC) = a + p*edad + q*altura + spline
     """
-    sexo_en = 'females' if 'femenino' in sexo.lower() else 'males'
-    coef = RVTLC_COEFFICIENTS[sexo_en]
-    spline = obtener_spline_volumen(edad, sexo, 'rvtlc')
+    tabla = obtener_tabla('rvtlc', sexo)
+    spline = tabla.spline(edad, 'M')
     
-    ln_valor = coef['a'] + coef['p'] * edad + coef['q'] * altura + spline
+    ln_valor = tabla.a + tabla.p * edad + tabla.q * altura + spline
     
     return math.exp(ln_valor)
 
+@medir('gli.interpretacion')
 def generar_interpretacion_general(resultados: Dict) -> str:
     """
     Genera una interpretación general basada en los resultados del análisis.
@@ -708,89 +339,125 @@ def analizar_volumenes(datos: Dict) -> Dict:
     """
     Analiza específicamente los datos de volúmenes pulmonares usando ecuaciones GLI 2021.
     """
+    return analizar_estudio(datos)['vol']
+
+# Parámetros del estudio: (clave de tabla, claves aceptadas en `datos` por orden de preferencia)
+PARAMETROS_ESTUDIO = {
+    'FEV1': ('fev1', ('FEV1 pre',)),
+    'FVC': ('fvc', ('FVC pre',)),
+    'FEF25-75%': ('fef2575', ('FEF25-75% pre',)),
+    'DLCO': ('dlco', ('DLCO pre',)),
+    'KCO': ('kco', ('KCO pre', 'KCO', 'DLCO/VA pre', 'DLCO/VA')),
+    'VA': ('va', ('VA pre',)),
+    'TLC': ('tlc', ('TLC pre',)),
+    'VC': ('vc', ('VC pre',)),
+    'RV': ('rv', ('RV pre',)),
+    'RV/TLC': ('rvtlc', ('RV/TLC pre',))
+}
+
+CALCULOS_ESPERADO = {
+    'fev1': calcular_valor_esperado_fev1,
+    'fvc': calcular_valor_esperado_fvc,
+    'fef2575': calcular_valor_esperado_fef2575,
+    'dlco': calcular_valor_esperado_dlco,
+    'kco': calcular_valor_esperado_kco,
+    'va': calcular_valor_esperado_va,
+    'tlc': calcular_valor_esperado_tlc,
+    'vc': calcular_valor_esperado_vc,
+    'rv': calcular_valor_esperado_rv,
+    'rvtlc': calcular_valor_esperado_rvtlc
+}
+
+# Vistas por dominio: parámetros incluidos, rango de edad válido y textos de error
+DOMINIOS_ESTUDIO = {
+    'espiro': {
+        'parametros': tuple(PARAMETROS_ESTUDIO),
+        'rango_edad': (3, 95),
+        'error_edad': "Edad fuera del rango válido (3-95 años)",
+        'prefijo_error': "Error en análisis"
+    },
+    'dlco': {
+        'parametros': ('DLCO', 'KCO', 'VA'),
+        'rango_edad': (5, 90),
+        'error_edad': "Edad fuera del rango válido para DLCO (5-90 años)",
+        'prefijo_error': "Error en análisis DLCO"
+    },
+    'vol': {
+        'parametros': ('TLC', 'VC', 'RV', 'RV/TLC'),
+        'rango_edad': (5, 90),
+        'error_edad': "Edad fuera del rango válido para volúmenes (5-90 años)",
+        'prefijo_error': "Error en análisis volúmenes"
+    }
+}
+
+def _valor_disponible(datos: Dict, claves: Tuple[str, ...]):
+    """
+    Devuelve el primer valor presente (y distinto de 'Valor no encontrado') entre las claves dadas.
+    """
+    for clave in claves:
+        if datos.get(clave) and datos.get(clave) != 'Valor no encontrado':
+            return datos[clave]
+    return None
+
+@medir('gli.analisis')
+def analizar_estudio(datos: Dict) -> ResultadoEstudio:
+    """
+    Analiza un estudio completo en una sola pasada: valida los datos demográficos una vez,
+    calcula cada parámetro disponible una única vez y devuelve un ResultadoEstudio cuyas vistas
+    estudio['espiro'], estudio['dlco'] y estudio['vol'] tienen el mismo formato que los
+    analizadores individuales.
+    """
+    dominios = {d: cfg['parametros'] for d, cfg in DOMINIOS_ESTUDIO.items()}
     try:
         edad = float(datos.get('Edad', 0))
         altura = float(datos.get('Altura', 0))
         sexo = datos.get('Sexo', 'Femenino')
-        
-        if edad <= 0 or altura <= 0:
-            return {"error": "Datos insuficientes para análisis"}
-        
-        # Validar rango de edad y altura para volúmenes
-        if edad < 5 or edad > 90:  # Rango específico para volúmenes
-            return {"error": "Edad fuera del rango válido para volúmenes (5-90 años)"}
-        if altura < 100 or altura > 250:
-            return {"error": "Altura fuera del rango válido (100-250 cm)"}
-        
-        # Cargar tablas de volúmenes si no están cargadas
-        if not gli_vol_tables:
-            cargar_tablas_volumenes()
-        
-        resultados = {}
-        
-        # TLC
-        if datos.get('TLC pre') and datos.get('TLC pre') != 'Valor no encontrado':
-            tlc_obs = float(datos['TLC pre'])
-            tlc_esp = calcular_valor_esperado_tlc(edad, altura, sexo)
-            tlc_z = calcular_z_score(tlc_obs, tlc_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(tlc_z)
-            resultados['TLC'] = {
-                'observado': tlc_obs,
-                'esperado': round(tlc_esp, 2),
-                'z_score': round(tlc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # VC
-        if datos.get('VC pre') and datos.get('VC pre') != 'Valor no encontrado':
-            vc_obs = float(datos['VC pre'])
-            vc_esp = calcular_valor_esperado_vc(edad, altura, sexo)
-            vc_z = calcular_z_score(vc_obs, vc_esp, rse=0.12)
-            interpretacion, severidad = interpretar_z_score_con_severidad(vc_z)
-            resultados['VC'] = {
-                'observado': vc_obs,
-                'esperado': round(vc_esp, 2),
-                'z_score': round(vc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # RV
-        if datos.get('RV pre') and datos.get('RV pre') != 'Valor no encontrado':
-            rv_obs = float(datos['RV pre'])
-            rv_esp = calcular_valor_esperado_rv(edad, altura, sexo)
-            rv_z = calcular_z_score(rv_obs, rv_esp, rse=0.15)
-            interpretacion, severidad = interpretar_z_score_con_severidad(rv_z)
-            resultados['RV'] = {
-                'observado': rv_obs,
-                'esperado': round(rv_esp, 2),
-                'z_score': round(rv_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        # RV/TLC
-        if datos.get('RV/TLC pre') and datos.get('RV/TLC pre') != 'Valor no encontrado':
-            rvtlc_obs = float(datos['RV/TLC pre'])
-            rvtlc_esp = calcular_valor_esperado_rvtlc(edad, altura, sexo)
-            print(f"DEBUG RV/TLC antes normalizar: observado={rvtlc_obs}, esperado={rvtlc_esp}")
-            # Normalizar solo el valor esperado si es >2
-            if rvtlc_esp > 2:
-                rvtlc_esp = rvtlc_esp / 100
-            print(f"DEBUG RV/TLC despues normalizar: observado={rvtlc_obs}, esperado={rvtlc_esp}")
-            rvtlc_z = calcular_z_score(rvtlc_obs, rvtlc_esp, rse=0.15)
-            print(f"DEBUG RV/TLC: z-score={rvtlc_z}")
-            interpretacion, severidad = interpretar_z_score_con_severidad(rvtlc_z)
-            resultados['RV/TLC'] = {
-                'observado': rvtlc_obs,
-                'esperado': round(rvtlc_esp, 2),
-                'z_score': round(rvtlc_z, 2),
-                'interpretacion': interpretacion,
-                'severidad': severidad
-            }
-        
-        return resultados
-        
     except Exception as e:
-        return {"error": f"Error en análisis volúmenes: {str(e)}"}
\ No newline at end of file
+        return ResultadoEstudio(dominios, {d: f"{cfg['prefijo_error']}: {str(e)}" for d, cfg in DOMINIOS_ESTUDIO.items()})
+
+    if edad <= 0 or altura <= 0:
+        return ResultadoEstudio(dominios, {d: "Datos insuficientes para análisis" for d in DOMINIOS_ESTUDIO})
+
+    # Validar rango de edad y altura por dominio
+    errores = {}
+    for dominio, cfg in DOMINIOS_ESTUDIO.items():
+        edad_min, edad_max = cfg['rango_edad']
+        if edad < edad_min or edad > edad_max:
+            errores[dominio] = cfg['error_edad']
+        elif altura < 100 or altura > 250:
+            errores[dominio] = "Altura fuera del rango válido (100-250 cm)"
+
+    necesarios = {p for d, cfg in DOMINIOS_ESTUDIO.items() if d not in errores for p in cfg['parametros']}
+    if necesarios and not cargar_tablas_referencia():
+        return ResultadoEstudio(dominios, {
+            d: errores.get(d, "No se pudieron cargar las tablas de referencia GLI") for d in DOMINIOS_ESTUDIO
+        })
+
+    # Calcular cada parámetro disponible una sola vez
+    estudio = ResultadoEstudio(dominios, errores)
+    fallos = {}
+    for nombre in PARAMETROS_ESTUDIO:
+        if nombre not in necesarios:
+            continue
+        clave, claves_datos = PARAMETROS_ESTUDIO[nombre]
+        valor = _valor_disponible(datos, claves_datos)
+        if valor is None:
+            continue
+        try:
+            observado = float(valor)
+            esperado = CALCULOS_ESPERADO[clave](edad, altura, sexo)
+            if clave == 'rvtlc' and esperado > 2:
+                # Normalizar solo el valor esperado si viene en porcentaje
+                esperado = esperado / 100
+            estudio.registrar(nombre, *_resultado_parametro(clave, observado, esperado, edad, sexo))
+        except Exception as e:
+            fallos[nombre] = e
+
+    # Un fallo en cualquier parámetro invalida la vista de su dominio
+    for dominio, cfg in DOMINIOS_ESTUDIO.items():
+        if dominio in errores:
+            continue
+        fallo = next((fallos[p] for p in cfg['parametros'] if p in fallos), None)
+        if fallo is not None:
+            errores[dominio] = f"{cfg['prefijo_error']}: {str(fallo)}"
+    return estudio
@@ -0,0 +1,268 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pdfplumber
+
+from utils.cache_lru import CacheLRU
+from utils.extraccion import ExtraccionIncremental, extract_datos_pulmonar
+from utils.extraccion_tabla import ExtraccionTablaIncremental
+from utils.instrumentacion import medir
+from utils.plantillas import PLANTILLAS, detectar_plantilla, firma_registro, obtener_plantilla
+from utils.tablas_gli import BASE_DIR
+
+# Caché de extracción de PDFs por contenido (SHA-256 de los bytes del PDF), en dos niveles:
+# memoria (LRU compartido por todas las sesiones del proceso) y disco (compartido entre procesos
+# y reinicios). Incrementar VERSION_EXTRACCION cuando cambie el resultado del parser.
+VERSION_EXTRACCION = 2
+DIRECTORIO_CACHE_EXTRACCION = '.cache_extraccion'
+
+# 'texto': parser sobre el texto aplanado; 'tabla': columnas de la tabla por coordenadas
+MODOS_EXTRACCION = ('texto', 'tabla')
+
+cache_extracciones = CacheLRU(max_entradas=256)
+
+# Límites del nivel en disco, que contiene datos de pacientes: se borran las entradas sin leer en
+# más de MAX_EDAD_CACHE_DISCO y, por encima de MAX_BYTES_CACHE_DISCO, las leídas hace más tiempo
+# (cada lectura actualiza el mtime del archivo, así que el orden por mtime es un LRU)
+MAX_BYTES_CACHE_DISCO = 256 * 1024 * 1024
+MAX_EDAD_CACHE_DISCO = 30 * 24 * 3600
+# Cada cuántas escrituras se recorre el directorio aunque no se supere el tamaño (para la caducidad)
+PODA_CADA_ESCRITURAS = 100
+
+# Bytes en disco según este proceso (None hasta la primera poda) y escrituras desde el arranque
+_bytes_disco: Optional[int] = None
+_escrituras_disco = 0
+_lock_disco = threading.Lock()
+
+# Un lock por PDF en extracción, para que peticiones simultáneas del mismo archivo lo procesen una vez
+_en_curso: Dict[str, threading.Lock] = {}
+_lock_en_curso = threading.Lock()
+
+
+def leer_bytes_pdf(origen) -> bytes:
+    """
+    Bytes del PDF a partir de una ruta, un UploadedFile de Streamlit o un archivo abierto.
+    """
+    if isinstance(origen, (str, os.PathLike)):
+        with open(origen, 'rb') as f:
+            return f.read()
+    if hasattr(origen, 'getvalue'):
+        return origen.getvalue()
+    posicion = origen.tell()
+    contenido = origen.read()
+    origen.seek(posicion)
+    return contenido
+
+
+def hash_pdf(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _directorio_disco() -> str:
+    return os.path.join(BASE_DIR, DIRECTORIO_CACHE_EXTRACCION)
+
+
+def _ruta_disco(clave: str, directorio: Optional[str] = None) -> str:
+    return os.path.join(directorio or _directorio_disco(), clave[:2], f'{clave}.json')
+
+
+def podar_cache_disco(directorio: Optional[str] = None, max_bytes: Optional[int] = None,
+                      max_edad: Optional[float] = None) -> int:
+    """
+    Borra del nivel en disco las entradas sin leer en más de `max_edad` segundos y, si las demás
+    ocupan más de `max_bytes`, las leídas hace más tiempo (por defecto MAX_EDAD_CACHE_DISCO y
+    MAX_BYTES_CACHE_DISCO). Devuelve los bytes que quedan. Varios procesos pueden podar a la vez:
+    un archivo ya borrado por otro se da por borrado.
+    """
+    directorio = directorio or _directorio_disco()
+    max_bytes = MAX_BYTES_CACHE_DISCO if max_bytes is None else max_bytes
+    max_edad = MAX_EDAD_CACHE_DISCO if max_edad is None else max_edad
+    archivos = []
+    try:
+        subdirectorios = [d.path for d in os.scandir(directorio) if d.is_dir()]
+    except OSError:
+        return 0
+    for subdirectorio in subdirectorios:
+        try:
+            with os.scandir(subdirectorio) as entradas:
+                for entrada in entradas:
+                    estado = entrada.stat()
+                    archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        except OSError:
+            continue
+
+    limite_edad = time.time() - max_edad
+    total = sum(tamano for _, tamano, _ in archivos)
+    for mtime, tamano, ruta in sorted(archivos):
+        if mtime >= limite_edad and total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"No se pudo borrar la extracción en disco: {str(e)}")
+            continue
+        total -= tamano
+    return total
+
+
+def _leer_disco(clave: str) -> Optional[Dict]:
+    ruta = _ruta_disco(clave)
+    try:
+        if time.time() - os.path.getmtime(ruta) > MAX_EDAD_CACHE_DISCO:
+            return None
+        with open(ruta, encoding='utf-8') as f:
+            entrada = json.load(f)
+        # Marca de uso para la poda por antigüedad y tamaño
+        os.utime(ruta)
+    except (OSError, ValueError):
+        return None
+    if entrada.get('version') != VERSION_EXTRACCION:
+        return None
+    return entrada
+
+
+def _guardar_disco(clave: str, entrada: Dict) -> None:
+    """
+    Escritura atómica mediante archivo temporal; un fallo de disco no impide devolver el resultado.
+    Poda el directorio (ver podar_cache_disco) la primera vez, al superar MAX_BYTES_CACHE_DISCO y
+    cada PODA_CADA_ESCRITURAS escrituras.
+    """
+    global _bytes_disco, _escrituras_disco
+    ruta = _ruta_disco(clave)
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+        tamano = os.path.getsize(ruta)
+    except OSError as e:
+        print(f"No se pudo guardar la extracción en disco: {str(e)}")
+        return
+
+    with _lock_disco:
+        _escrituras_disco += 1
+        if _bytes_disco is not None:
+            _bytes_disco += tamano
+        podar = (_bytes_disco is None or _bytes_disco > MAX_BYTES_CACHE_DISCO
+                 or _escrituras_disco % PODA_CADA_ESCRITURAS == 0)
+    if podar:
+        restantes = podar_cache_disco()
+        with _lock_disco:
+            _bytes_disco = restantes
+
+
+def orden_paginas(n_paginas: int, pista: Sequence[int] = ()) -> List[int]:
+    """
+    Orden de lectura: primero las páginas de la pista (sin repetir y dentro del documento), después
+    el resto en orden.
+    """
+    primeras = list(dict.fromkeys(i % n_paginas for i in pista if -n_paginas <= i < n_paginas))
+    return primeras + [i for i in range(n_paginas) if i not in primeras]
+
+
+@medir('pdf.pagina')
+def _leer_pagina(page, modo: str):
+    contenido = page.extract_words() if modo == 'tabla' else page.extract_text() or ''
+    # Liberar caracteres y layout de la página ya leída
+    page.close()
+    return contenido
+
+
+def _extraer(contenido: bytes, modo: str = 'texto', plantilla: Optional[str] = None) -> Dict:
+    """
+    Lee la primera página, detecta la plantilla por su cabecera (salvo que se indique) y sigue
+    leyendo las páginas de una en una, empezando por las de la plantilla, hasta que están todos
+    los campos requeridos.
+    """
+    with medir('pdf.abrir'):
+        pdf = pdfplumber.open(io.BytesIO(contenido))
+    with pdf:
+        paginas = pdf.pages
+        primera = _leer_pagina(paginas[0], modo) if paginas else ''
+        if plantilla is None:
+            texto = ' '.join(w['text'] for w in primera) if modo == 'tabla' else primera
+            plantilla = detectar_plantilla(texto)
+        else:
+            plantilla = obtener_plantilla(plantilla)
+
+        if modo == 'tabla':
+            extraccion = ExtraccionTablaIncremental(plantilla=plantilla)
+        else:
+            extraccion = ExtraccionIncremental(plantilla=plantilla)
+        if paginas:
+            extraccion.añadir_pagina(primera, 0)
+        for i in orden_paginas(len(paginas), plantilla.paginas):
+            if extraccion.completo:
+                break
+            if i != 0:
+                extraccion.añadir_pagina(_leer_pagina(paginas[i], modo), i)
+    return {
+        'version': VERSION_EXTRACCION,
+        'plantilla': plantilla.nombre,
+        'paginas': extraccion.paginas,
+        'datos': extraccion.datos if extraccion.datos is not None else extract_datos_pulmonar('', plantilla)
+    }
+
+
+def _obtener_entrada(clave: str, contenido: bytes, usar_disco: bool, modo: str = 'texto',
+                     plantilla: Optional[str] = None) -> Dict:
+    entrada = cache_extracciones.obtener(clave)
+    if entrada is not None:
+        return entrada
+
+    with _lock_en_curso:
+        lock = _en_curso.setdefault(clave, threading.Lock())
+    with lock:
+        # Otro hilo puede haberlo extraído mientras esperábamos
+        entrada = cache_extracciones.obtener(clave)
+        if entrada is None:
+            entrada = _leer_disco(clave) if usar_disco else None
+            if entrada is None:
+                entrada = _extraer(contenido, modo, plantilla)
+                if usar_disco:
+                    _guardar_disco(clave, entrada)
+            cache_extracciones.guardar(clave, entrada)
+    with _lock_en_curso:
+        _en_curso.pop(clave, None)
+    return entrada
+
+
+@medir('extraccion.pdf')
+def extraer_pdf(origen, usar_disco: bool = True, modo: str = 'texto',
+                plantilla: Optional[str] = None) -> Tuple[List[str], Dict]:
+    """
+    Devuelve (texto de las páginas leídas, datos extraídos) del PDF, procesándolo solo si su
+    contenido no está ya en caché. modo='tabla' lee los parámetros de las columnas de la tabla por
+    coordenadas (ver extraccion_tabla). La plantilla del laboratorio se detecta por la cabecera de
+    la primera página; `plantilla` (nombre registrado) la fija. Los datos se devuelven como copia,
+    así que se pueden modificar (p.ej. con mapear_claves_pre) sin alterar el caché.
+    """
+    if modo not in MODOS_EXTRACCION:
+        raise ValueError(f"Modo de extracción no válido: {modo}")
+    contenido = leer_bytes_pdf(origen)
+    clave = hash_pdf(contenido)
+    if modo != 'texto':
+        # El modo texto conserva la clave original para no invalidar el caché ya generado
+        clave = f'{clave}-{modo}'
+    if plantilla is not None:
+        clave = f'{clave}-{obtener_plantilla(plantilla).nombre}'
+    if len(PLANTILLAS) > 1:
+        # Registrar o cambiar plantillas puede cambiar la detección y el resultado
+        clave = f'{clave}-{firma_registro()}'
+    entrada = _obtener_entrada(clave, contenido, usar_disco, modo, plantilla)
+    return list(entrada['paginas']), dict(entrada['datos'])
+
+
+def estadisticas_cache_extraccion() -> Dict:
+    """
+    Aciertos y ocupación del nivel en memoria del caché de extracción.
+    """
+    return cache_extracciones.estadisticas()
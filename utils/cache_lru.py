@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class CacheLRU:
+    """
+    Caché en memoria acotado con expulsión LRU, caducidad opcional (TTL) y contadores de aciertos.
+    Con max_bytes también se acota la suma de tamaños de los valores (medidos con `tamano`, por
+    defecto len, p.ej. para bytes). Es seguro entre hilos (Streamlit atiende cada sesión en un
+    hilo distinto).
+    """
+
+    def __init__(self, max_entradas: int = 1024, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                 tamano: Callable[[Any], int] = len):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.tamano = tamano
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable, defecto: Any = None) -> Any:
+        """
+        Devuelve el valor almacenado para la clave (y la marca como usada), o `defecto`.
+        """
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, instante, tamano = entrada
+                if self.ttl is None or time.monotonic() - instante < self.ttl:
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                del self._datos[clave]
+                self.bytes -= tamano
+            self.misses += 1
+            return defecto
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        """
+        Almacena el valor, expulsando las entradas menos usadas si se supera el límite. Un valor
+        mayor que max_bytes no se almacena.
+        """
+        tamano = self.tamano(valor) if self.max_bytes is not None else 0
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            if self.max_bytes is not None and tamano > self.max_bytes:
+                return
+            self._datos[clave] = (valor, time.monotonic(), tamano)
+            self.bytes += tamano
+            while len(self._datos) > self.max_entradas or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                _, (_, _, expulsado) = self._datos.popitem(last=False)
+                self.bytes -= expulsado
+
+    def obtener_o_calcular(self, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+        """
+        Devuelve el valor en caché o lo calcula con `calcular()` y lo almacena.
+        """
+        ausente = object()
+        valor = self.obtener(clave, ausente)
+        if valor is ausente:
+            valor = calcular()
+            self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Aciertos, fallos, tasa de aciertos y ocupación del caché.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'tasa_aciertos': self.hits / total if total else 0.0,
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def __len__(self) -> int:
+        return len(self._datos)
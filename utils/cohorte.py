@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.analisis_gli import PARAMETROS_ESTUDIO, DOMINIOS_ESTUDIO, codigo_severidad
+from utils.resultados import ResultadoParametro, SIN_DATO
+from utils.tablas_gli import BASE_DIR
+
+# Almacén columnar de estudios analizados: un directorio con un archivo Parquet por cada lote
+# añadido (una fila por estudio). Leer el directorio completo equivale a leer la cohorte.
+DIRECTORIO_COHORTE = 'cohorte_gli'
+
+# Partes con menos filas que esto se fusionan al compactar; se compacta automáticamente al pasar de
+# MAX_PARTES_PEQUENAS partes pequeñas
+FILAS_PARTE_COMPACTA = 5000
+MAX_PARTES_PEQUENAS = 32
+
+# Campos numéricos guardados por parámetro: columna '<clave>_<campo>' (p.ej. 'fev1_z_score')
+CAMPOS_PARAMETRO = ('observado', 'esperado', 'z_score', 'lln', 'percentil')
+
+COLUMNAS_ESTUDIO = [
+    pa.field('id_estudio', pa.string()),
+    pa.field('archivo', pa.string()),
+    pa.field('fecha', pa.string()),
+    pa.field('fecha_analisis', pa.timestamp('ms')),
+    pa.field('edad', pa.float64()),
+    pa.field('altura', pa.float64()),
+    pa.field('sexo', pa.string())
+]
+
+ESQUEMA_COHORTE = pa.schema(COLUMNAS_ESTUDIO + [
+    pa.field(f'{clave}_{campo}', pa.int8() if campo == 'severidad' else pa.float64())
+    for clave, _ in PARAMETROS_ESTUDIO.values()
+    for campo in CAMPOS_PARAMETRO + ('severidad',)
+])
+
+
+def ruta_cohorte(ruta: Optional[str] = None) -> str:
+    return ruta or os.path.join(BASE_DIR, DIRECTORIO_COHORTE)
+
+
+def _numero(valor) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _id_estudio(archivo: str, datos: Dict) -> str:
+    """
+    Identificador estable del estudio: SHA-256 del nombre de archivo y los datos extraídos.
+    Reprocesar el mismo informe produce el mismo id (la lectura se queda con la última versión).
+    """
+    contenido = json.dumps({'archivo': archivo, 'datos': datos}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def fila_estudio(estudio: Dict, fecha_analisis: pd.Timestamp) -> Dict:
+    """
+    Convierte una entrada {'archivo', 'fecha', 'datos', 'espiro', 'dlco', 'vol'} (formato de
+    procesar_multiples_pdfs) en una fila del almacén.
+    """
+    datos = estudio.get('datos', {})
+    fila = {
+        'id_estudio': _id_estudio(estudio.get('archivo', ''), datos),
+        'archivo': estudio.get('archivo'),
+        'fecha': estudio.get('fecha'),
+        'fecha_analisis': fecha_analisis,
+        'edad': _numero(datos.get('Edad')),
+        'altura': _numero(datos.get('Altura')),
+        'sexo': datos.get('Sexo')
+    }
+    # Un mismo parámetro puede aparecer en varias vistas: basta con la primera sin error
+    for dominio in DOMINIOS_ESTUDIO:
+        vista = estudio.get(dominio) or {}
+        if 'error' in vista:
+            continue
+        for nombre, resultado in vista.items():
+            clave = PARAMETROS_ESTUDIO[nombre][0]
+            if f'{clave}_severidad' in fila:
+                continue
+            for campo in CAMPOS_PARAMETRO:
+                fila[f'{clave}_{campo}'] = resultado[campo]
+            fila[f'{clave}_severidad'] = codigo_severidad(resultado['z_score'])
+    return fila
+
+
+def tabla_desde_filas(filas: List[Dict], esquema: pa.Schema = ESQUEMA_COHORTE) -> pa.Table:
+    """
+    Construye una tabla Arrow con el esquema dado (por defecto ESQUEMA_COHORTE) a partir de filas
+    de fila_estudio; las claves que no están en el esquema se ignoran.
+    """
+    columnas = {}
+    for campo in esquema:
+        valores = [f.get(campo.name) for f in filas]
+        if pa.types.is_int8(campo.type):
+            valores = [SIN_DATO if v is None else v for v in valores]
+        elif pa.types.is_float64(campo.type):
+            valores = [np.nan if v is None else v for v in valores]
+        columnas[campo.name] = pa.array(valores, type=campo.type)
+    return pa.Table.from_pydict(columnas, schema=esquema)
+
+
+def guardar_estudios(estudios: Iterable[Dict], ruta: Optional[str] = None) -> int:
+    """
+    Añade estudios analizados al almacén escribiendo un nuevo archivo Parquet (no reescribe los
+    existentes); los que ya estaban guardados se omiten. Devuelve el número de filas añadidas.
+    """
+    fecha_analisis = pd.Timestamp.now().floor('ms')
+    return guardar_filas([fila_estudio(e, fecha_analisis) for e in estudios], ruta)
+
+
+def guardar_filas(filas: List[Dict], ruta: Optional[str] = None) -> int:
+    """
+    Añade al almacén filas ya construidas con fila_estudio (p.ej. desde procesos de un lote). Las
+    filas cuyo id_estudio ya está en el almacén no se vuelven a escribir: el id depende del archivo
+    y de los datos extraídos, así que serían la misma fila. Devuelve las filas escritas.
+    """
+    directorio = ruta_cohorte(ruta)
+    with _lock_ids:
+        guardados = _ids_en_almacen(directorio)
+        nuevas = {}
+        for fila in filas:
+            if fila['id_estudio'] not in guardados:
+                nuevas[fila['id_estudio']] = fila
+        if not nuevas:
+            return 0
+        _escribir_parte(tabla_desde_filas(list(nuevas.values())), directorio)
+        guardados.update(nuevas)
+
+    if len(_partes_pequenas(directorio)) > MAX_PARTES_PEQUENAS:
+        compactar_cohorte(directorio)
+    return len(nuevas)
+
+
+# id_estudio ya escritos por directorio del almacén (se leen del disco la primera vez)
+_ids_guardados: Dict[str, set] = {}
+_lock_ids = threading.Lock()
+
+
+def _ids_en_almacen(directorio: str) -> set:
+    if directorio not in _ids_guardados:
+        ids = set()
+        if _partes(directorio):
+            ids.update(pq.read_table(directorio, columns=['id_estudio'], schema=ESQUEMA_COHORTE)
+                       .column('id_estudio').to_pylist())
+        _ids_guardados[directorio] = ids
+    return _ids_guardados[directorio]
+
+
+def _partes(directorio: str) -> List[str]:
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(os.path.join(directorio, n) for n in os.listdir(directorio) if n.endswith('.parquet'))
+
+
+def _partes_pequenas(directorio: str) -> List[str]:
+    return [p for p in _partes(directorio) if pq.ParquetFile(p).metadata.num_rows < FILAS_PARTE_COMPACTA]
+
+
+def _escribir_parte(tabla: pa.Table, directorio: str) -> str:
+    os.makedirs(directorio, exist_ok=True)
+    # Nombre ordenable por instante de escritura; escritura atómica mediante archivo temporal
+    nombre = f'parte-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet'
+    tmp = os.path.join(directorio, f'.{nombre}.tmp')
+    pq.write_table(tabla, tmp, compression='zstd')
+    ruta = os.path.join(directorio, nombre)
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def compactar_cohorte(ruta: Optional[str] = None) -> int:
+    """
+    Fusiona las partes pequeñas del almacén en una sola, con la versión más reciente de cada
+    estudio. La parte nueva se escribe antes de borrar las fusionadas, así que un lector concurrente
+    ve como mucho filas repetidas (que cargar_cohorte descarta). Devuelve las partes fusionadas.
+    """
+    directorio = ruta_cohorte(ruta)
+    with _lock_ids:
+        partes = _partes_pequenas(directorio)
+        if len(partes) < 2:
+            return 0
+        tabla = pa.concat_tables(pq.read_table(p, schema=ESQUEMA_COHORTE) for p in partes)
+        df = (tabla.to_pandas()
+                .sort_values('fecha_analisis', kind='stable')
+                .drop_duplicates('id_estudio', keep='last'))
+        _escribir_parte(pa.Table.from_pandas(df, schema=ESQUEMA_COHORTE, preserve_index=False), directorio)
+        for parte in partes:
+            os.remove(parte)
+    return len(partes)
+
+
+def columnas_parametro(parametros: Sequence[str], campos: Sequence[str] = CAMPOS_PARAMETRO) -> List[str]:
+    """
+    Nombres de columna para los parámetros ('FEV1', 'RV/TLC'...) y campos dados.
+    """
+    return [f'{PARAMETROS_ESTUDIO[p][0]}_{c}' for p in parametros for c in campos]
+
+
+def cargar_cohorte(columnas: Optional[Sequence[str]] = None, filtros=None,
+                   ruta: Optional[str] = None) -> pd.DataFrame:
+    """
+    Lee la cohorte como DataFrame (una fila por estudio, la versión más reciente de cada uno).
+    `columnas` limita la lectura a esas columnas (solo se leen del disco las pedidas) y `filtros`
+    se pasa a pyarrow para descartar filas antes de cargarlas, p.ej. [('sexo', '=', 'Femenino')].
+    """
+    directorio = ruta_cohorte(ruta)
+    leer = None
+    if columnas is not None:
+        leer = list(dict.fromkeys(['id_estudio', 'fecha_analisis', *columnas]))
+
+    if _partes(directorio):
+        tabla = pq.read_table(directorio, columns=leer, filters=filtros, schema=ESQUEMA_COHORTE)
+    else:
+        tabla = ESQUEMA_COHORTE.empty_table().select(leer or ESQUEMA_COHORTE.names)
+    df = tabla.to_pandas()
+    df = (df.sort_values('fecha_analisis', kind='stable')
+            .drop_duplicates('id_estudio', keep='last')
+            .reset_index(drop=True))
+    return df[list(columnas)] if columnas is not None else df
+
+
+def estudios_desde_cohorte(df: pd.DataFrame) -> List[Dict]:
+    """
+    Reconstruye entradas con el formato de procesar_multiples_pdfs a partir de filas del almacén,
+    para reutilizar la comparación temporal sin volver a procesar los PDF.
+    """
+    estudios = []
+    for fila in df.to_dict('records'):
+        resultados = {}
+        for nombre, (clave, _) in PARAMETROS_ESTUDIO.items():
+            codigo = fila.get(f'{clave}_severidad', SIN_DATO)
+            if codigo is None or codigo == SIN_DATO or pd.isna(codigo):
+                continue
+            valores = [fila[f'{clave}_{campo}'] for campo in CAMPOS_PARAMETRO]
+            resultados[nombre] = ResultadoParametro(*valores, int(codigo))
+        estudio = {
+            'archivo': fila.get('archivo'),
+            'fecha': fila.get('fecha'),
+            'datos': {'Edad': fila.get('edad'), 'Altura': fila.get('altura'), 'Sexo': fila.get('sexo')}
+        }
+        for dominio, cfg in DOMINIOS_ESTUDIO.items():
+            estudio[dominio] = {p: resultados[p] for p in cfg['parametros'] if p in resultados}
+        estudios.append(estudio)
+    return estudios
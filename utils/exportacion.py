@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+import math
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.cohorte import ESQUEMA_COHORTE, fila_estudio, tabla_desde_filas
+from utils.extraccion import CAMPOS_DATOS
+from utils.instrumentacion import medir
+from utils.patrones import generar_diagnostico_patron
+
+# Escritores en streaming de registros de estudio: cada llamada a escribir() vuelca los registros
+# al destino, así que la memoria no crece con el número de estudios.
+
+# Separador de las listas de patrones y diagnósticos en una sola celda
+SEPARADOR_LISTA = '; '
+
+
+def _nombre_columna(clave: str) -> str:
+    """
+    'FEV1/FVC pre' -> 'fev1_fvc_pre', 'Origen étnico' -> 'origen_etnico'.
+    """
+    sin_acentos = unicodedata.normalize('NFKD', clave).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^0-9a-z]+', '_', sin_acentos.lower()).strip('_')
+
+
+# Valores extraídos del informe tal cual (texto): columna 'extraido_<clave>'
+COLUMNAS_EXTRAIDAS = {clave: f'extraido_{_nombre_columna(clave)}' for clave in CAMPOS_DATOS}
+
+# Registro de exportación: fila de cohorte (demografía y observado/esperado/z/LLN/percentil/
+# severidad por parámetro) + valores extraídos + patrones detectados
+ESQUEMA_EXPORTACION = pa.schema(
+    list(ESQUEMA_COHORTE)
+    + [pa.field(columna, pa.string()) for columna in COLUMNAS_EXTRAIDAS.values()]
+    + [pa.field('patrones', pa.string()), pa.field('diagnostico', pa.string())]
+)
+
+
+def registro_exportacion(estudio: Dict, fecha_analisis: pd.Timestamp) -> Dict:
+    """
+    Registro completo de un estudio ({'archivo', 'fecha', 'datos', 'espiro', 'dlco', 'vol'}) con
+    los patrones de generar_diagnostico_patron. Es un superconjunto de fila_estudio, así que
+    también se puede guardar en la cohorte.
+    """
+    datos = estudio.get('datos', {})
+    registro = fila_estudio(estudio, fecha_analisis)
+    for clave, columna in COLUMNAS_EXTRAIDAS.items():
+        valor = datos.get(clave)
+        registro[columna] = None if valor is None else str(valor)
+    patrones, diagnostico = generar_diagnostico_patron(estudio.get('espiro') or {}, estudio.get('dlco') or {},
+                                                      estudio.get('vol') or {}, datos)
+    # Sin el icono inicial de cada patrón ('🫁 Obstructivo' -> 'Obstructivo')
+    registro['patrones'] = SEPARADOR_LISTA.join(p.split(' ', 1)[-1] for p in patrones)
+    registro['diagnostico'] = SEPARADOR_LISTA.join(diagnostico)
+    return registro
+
+
+def _valor_serializable(valor):
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.isoformat()
+    return valor
+
+
+def _abrir_texto(destino):
+    """
+    (archivo de texto, propio): una ruta se abre y se cierra al terminar; un archivo binario
+    abierto (p.ej. BytesIO) se envuelve y se deja abierto.
+    """
+    if isinstance(destino, (str, os.PathLike)):
+        return open(destino, 'w', encoding='utf-8', newline=''), True
+    return io.TextIOWrapper(destino, encoding='utf-8', newline='', write_through=True), False
+
+
+def _cerrar_texto(archivo, propio: bool) -> None:
+    if propio:
+        archivo.close()
+    else:
+        archivo.flush()
+        archivo.detach()
+
+
+class EscritorJSONL:
+    """
+    Una línea JSON por estudio.
+    """
+
+    def __init__(self, destino, esquema: pa.Schema = ESQUEMA_COHORTE):
+        self._archivo, self._propio = _abrir_texto(destino)
+
+    def escribir(self, filas: Iterable[Dict]) -> None:
+        for fila in filas:
+            registro = {k: _valor_serializable(v) for k, v in fila.items()}
+            self._archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self._archivo.flush()
+
+    def cerrar(self) -> None:
+        _cerrar_texto(self._archivo, self._propio)
+
+
+class EscritorCSV:
+    """
+    CSV con las columnas del esquema (celdas vacías para valores ausentes).
+    """
+
+    def __init__(self, destino, esquema: pa.Schema = ESQUEMA_COHORTE, columnas: Optional[List[str]] = None):
+        self._archivo, self._propio = _abrir_texto(destino)
+        self._csv = csv.DictWriter(self._archivo, fieldnames=columnas or esquema.names, extrasaction='ignore')
+        self._csv.writeheader()
+
+    def escribir(self, filas: Iterable[Dict]) -> None:
+        for fila in filas:
+            self._csv.writerow({k: _valor_serializable(v) for k, v in fila.items()})
+        self._archivo.flush()
+
+    def cerrar(self) -> None:
+        _cerrar_texto(self._archivo, self._propio)
+
+
+class EscritorParquet:
+    """
+    Parquet con el esquema dado; cada llamada a escribir() añade un row group.
+    """
+
+    def __init__(self, destino, esquema: pa.Schema = ESQUEMA_COHORTE):
+        self._esquema = esquema
+        self._writer = pq.ParquetWriter(destino, esquema, compression='zstd')
+
+    def escribir(self, filas: Iterable[Dict]) -> None:
+        filas = list(filas)
+        if filas:
+            self._writer.write_table(tabla_desde_filas(filas, self._esquema))
+
+    def cerrar(self) -> None:
+        self._writer.close()
+
+
+ESCRITORES = {
+    'jsonl': EscritorJSONL,
+    'csv': EscritorCSV,
+    'parquet': EscritorParquet
+}
+
+TIPOS_MIME = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def formato_desde_ruta(ruta: str) -> str:
+    """
+    Deduce el formato de salida de la extensión del archivo ('.jsonl', '.csv', '.parquet').
+    """
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    formato = {'json': 'jsonl', 'ndjson': 'jsonl', 'pq': 'parquet'}.get(extension, extension)
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato de salida no soportado: '{extension}' (use {', '.join(ESCRITORES)})")
+    return formato
+
+
+def abrir_escritor(destino, formato: Optional[str] = None, esquema: pa.Schema = ESQUEMA_COHORTE):
+    """
+    Crea el escritor para una ruta o un archivo binario abierto; con una ruta, el formato se deduce
+    de la extensión si no se indica.
+    """
+    formato = formato or formato_desde_ruta(destino)
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato de salida no soportado: '{formato}' (use {', '.join(ESCRITORES)})")
+    return ESCRITORES[formato](destino, esquema)
+
+
+@medir('exportacion.estudios')
+def exportar_estudios(estudios: Iterable[Dict], destino, formato: Optional[str] = None,
+                      fecha_analisis: Optional[pd.Timestamp] = None, tamano_bloque: int = 500) -> int:
+    """
+    Escribe un registro de exportación por estudio consumiendo `estudios` por bloques, de modo que
+    un generador de miles de estudios no se materializa en memoria. Devuelve los registros escritos.
+    """
+    fecha_analisis = fecha_analisis if fecha_analisis is not None else pd.Timestamp.now().floor('ms')
+    escritor = abrir_escritor(destino, formato, ESQUEMA_EXPORTACION)
+    total = 0
+    try:
+        bloque = []
+        for estudio in estudios:
+            bloque.append(registro_exportacion(estudio, fecha_analisis))
+            if len(bloque) == tamano_bloque:
+                escritor.escribir(bloque)
+                total += len(bloque)
+                bloque = []
+        escritor.escribir(bloque)
+        total += len(bloque)
+    finally:
+        escritor.cerrar()
+    return total
+
+
+def exportar_bytes(estudios: Iterable[Dict], formato: str) -> bytes:
+    """
+    Exportación en memoria (p.ej. para st.download_button).
+    """
+    buffer = io.BytesIO()
+    exportar_estudios(estudios, buffer, formato)
+    return buffer.getvalue()
@@ -1,8 +1,75 @@
 import re
+import threading
+from bisect import bisect_right
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from utils.instrumentacion import medir
+from utils.plantillas import COLUMNAS_PRE_POST, VARIABLES, Plantilla, obtener_plantilla
+
+# Números decimales tal como aparecen en los informes ('3.45' o '3,45')
+_NUMERO = re.compile(r'\d+[\.,]\d+')
+
+# Parámetros con columnas pre/post (el resto solo tiene valor pre)
+PARAMETROS_PRE_POST = ('FVC', 'FEV1', 'FEV1/FVC', 'FEF25-75%')
+
+DEMOGRAFICOS = ('sexo', 'altura', 'peso', 'edad', 'origen étnico', 'feno')
+
+# Claves del diccionario de datos extraídos, en orden
+CAMPOS_DATOS = (
+    'Sexo', 'Altura', 'Peso', 'Edad', 'Origen étnico',
+    'FVC pre', 'FVC post', 'FEV1 pre', 'FEV1 post',
+    'FEV1/FVC pre', 'FEV1/FVC post', 'FEF25-75% pre', 'FEF25-75% post',
+    'DLCO', 'VA', 'DLCO/VA',
+    'TLC', 'VC', 'RV', 'RV/TLC',
+    'FeNO'
+)
+
+# Campos que deben estar presentes para dejar de leer páginas: datos demográficos necesarios para
+# el análisis GLI y valores de espirometría, difusión y volúmenes
+CAMPOS_REQUERIDOS = (
+    'Sexo', 'Altura', 'Edad',
+    'FVC pre', 'FEV1 pre', 'FEV1/FVC pre', 'FEF25-75% pre',
+    'DLCO', 'VA', 'DLCO/VA',
+    'TLC', 'VC', 'RV', 'RV/TLC'
+)
+
+_SEXO = re.compile(r'(Femenino|Masculino)', re.IGNORECASE)
+_ALTURA = re.compile(r'(\d{2,3})\s*cm')
+_PESO = re.compile(r'(\d{2,3})\s*kg')
+_EDAD = re.compile(r'Edad[:\s]*(\d+)')
+_ORIGEN = re.compile(r'Origen étnico\s*([\wáéíóúüñ]+)', re.IGNORECASE)
+_ENTERO = re.compile(r'(\d+)')
+
+
+def _alternancia_trie(palabras) -> str:
+    """
+    Alternancia factorizada por prefijos comunes ('fev1', 'fev1 [l]' y 'fev1/fvc' comparten
+    'fev1'): el motor descarta cada posición con una sola comparación y, en cada posición, la
+    coincidencia es la palabra clave más larga.
+    """
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = {}
+
+    def construir(nodo):
+        ramas = [re.escape(c) + construir(hijo) for c, hijo in sorted(nodo.items()) if c]
+        if not ramas:
+            return ''
+        cuerpo = ramas[0] if len(ramas) == 1 else '(?:' + '|'.join(ramas) + ')'
+        return '(?:' + cuerpo + ')?' if '' in nodo else cuerpo
+
+    return construir(trie)
+
+
+_VACIO: FrozenSet[str] = frozenset()
+
 
 def get_nth_number(line, n):
     """Devuelve el n-ésimo número (1-indexed) en una línea, como string, o None si no existe."""
-    numbers = re.findall(r'\d+[\.,]\d+', line)
+    numbers = _NUMERO.findall(line)
     if len(numbers) >= n:
         return numbers[n-1].replace(',', '.')
     return None
@@ -11,259 +78,300 @@ def extract_values_from_multiline(lineas, start_idx, param_name):
     """Extrae valores de una línea y las siguientes hasta encontrar números o otra variable."""
     combined_text = ""
     i = start_idx
-    
-    # Lista de nombres de variables para detectar cuando parar
-    variable_names = ['fvc', 'fev1', 'fev1/fvc', 'fef25-75', 'pef', 'fet', 'dlco', 'dladj', 'va', 'dlco/va', 'kco', 'tlc', 'vcmax', 'rv', 'rv/tlc']
-    
+
     while i < len(lineas):
         l = lineas[i].strip()
-        
+
         # Detener si encontramos otra variable (excepto la actual)
-        for var_name in variable_names:
+        for var_name in VARIABLES:
             if var_name in l.lower() and var_name not in param_name.lower():
                 return combined_text.strip()
-        
+
         combined_text += l + " "
-        
+
         # Si encontramos números en esta línea, continuamos hasta la siguiente línea sin números
-        if re.search(r'\d+[\.,]\d+', l):
+        if _NUMERO.search(l):
             i += 1
             # Continuar hasta encontrar una línea sin números o con un nuevo parámetro
             while i < len(lineas):
                 next_line = lineas[i].strip()
-                
+
                 # Detener si encontramos otra variable
-                for var_name in variable_names:
+                for var_name in VARIABLES:
                     if var_name in next_line.lower() and var_name not in param_name.lower():
                         return combined_text.strip()
-                
+
                 # Detener si no hay números en esta línea
-                if not re.search(r'\d+[\.,]\d+', next_line):
+                if not _NUMERO.search(next_line):
                     break
-                    
+
                 combined_text += next_line + " "
                 i += 1
             break
         i += 1
-    
+
     return combined_text.strip()
 
-def extract_datos_pulmonar(texto: str) -> dict:
-    datos = {
-        'Sexo': None,
-        'Altura': None,
-        'Peso': None,
-        'Edad': None,
-        'Origen étnico': None,
-        'FVC pre': None,
-        'FVC post': None,
-        'FEV1 pre': None,
-        'FEV1 post': None,
-        'FEV1/FVC pre': None,
-        'FEV1/FVC post': None,
-        'FEF25-75% pre': None,
-        'FEF25-75% post': None,
-        'DLCO': None,
-        'VA': None,
-        'DLCO/VA': None,
-        'TLC': None,
-        'VC': None,
-        'RV': None,
-        'RV/TLC': None,
-        'FeNO': None
-    }
-    lineas = texto.splitlines()
-    
-    # Datos generales
-    for l in lineas:
-        if 'sexo' in l.lower() and datos['Sexo'] is None:
-            m = re.search(r'(Femenino|Masculino)', l, re.IGNORECASE)
-            if m:
-                datos['Sexo'] = m.group(1).capitalize()
-        if 'altura' in l.lower() and datos['Altura'] is None:
-            m = re.search(r'(\d{2,3})\s*cm', l)
-            if m:
-                datos['Altura'] = m.group(1)
-        if 'peso' in l.lower() and datos['Peso'] is None:
-            m = re.search(r'(\d{2,3})\s*kg', l)
-            if m:
-                datos['Peso'] = m.group(1)
-        if 'edad' in l.lower() and datos['Edad'] is None:
-            m = re.search(r'Edad[:\s]*(\d+)', l)
-            if m:
-                datos['Edad'] = m.group(1)
-        if 'origen étnico' in l.lower() and datos['Origen étnico'] is None:
-            m = re.search(r'Origen étnico\s*([\wáéíóúüñ]+)', l, re.IGNORECASE)
-            if m:
-                datos['Origen étnico'] = m.group(1).capitalize()
-    
-    # Buscar parámetros funcionales
-    for i, l in enumerate(lineas):
-        l_strip = l.strip()
-        
-        # FVC [L]
-        if 'fvc [l]' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'fvc')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 5:
-                # Si hay al menos 5 números, usar el primero para pre y el quinto para post
-                datos['FVC pre'] = numbers[0].replace(',', '.')
-                datos['FVC post'] = numbers[4].replace(',', '.')
-            elif len(numbers) >= 3:
-                # Si hay al menos 3 números pero menos de 5, usar el tercero para pre
-                datos['FVC pre'] = numbers[2].replace(',', '.')
-                datos['FVC post'] = 'Valor no encontrado'
-            elif len(numbers) >= 1:
-                # Si solo hay 1-2 números, usar el primero para pre
-                datos['FVC pre'] = numbers[0].replace(',', '.')
-                datos['FVC post'] = 'Valor no encontrado'
-            else:
-                datos['FVC pre'] = 'Valor no encontrado'
-                datos['FVC post'] = 'Valor no encontrado'
-        
-        # FEV1 [L]
-        elif 'fev1 [l]' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'fev1')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 5:
-                # Si hay al menos 5 números, usar el primero para pre y el quinto para post
-                datos['FEV1 pre'] = numbers[0].replace(',', '.')
-                datos['FEV1 post'] = numbers[4].replace(',', '.')
-            elif len(numbers) >= 3:
-                # Si hay al menos 3 números pero menos de 5, usar el tercero para pre
-                datos['FEV1 pre'] = numbers[2].replace(',', '.')
-                datos['FEV1 post'] = 'Valor no encontrado'
-            elif len(numbers) >= 1:
-                # Si solo hay 1-2 números, usar el primero para pre
-                datos['FEV1 pre'] = numbers[0].replace(',', '.')
-                datos['FEV1 post'] = 'Valor no encontrado'
-            else:
-                datos['FEV1 pre'] = 'Valor no encontrado'
-                datos['FEV1 post'] = 'Valor no encontrado'
-        
-        # FEV1/FVC
-        elif 'fev1/fvc' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'fev1/fvc')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 5:
-                # Si hay al menos 5 números, usar el primero para pre y el quinto para post
-                datos['FEV1/FVC pre'] = numbers[0].replace(',', '.')
-                datos['FEV1/FVC post'] = numbers[4].replace(',', '.')
-            elif len(numbers) >= 3:
-                # Si hay al menos 3 números pero menos de 5, usar el tercero para pre
-                datos['FEV1/FVC pre'] = numbers[2].replace(',', '.')
-                datos['FEV1/FVC post'] = 'Valor no encontrado'
-            elif len(numbers) >= 1:
-                # Si solo hay 1-2 números, usar el primero para pre
-                datos['FEV1/FVC pre'] = numbers[0].replace(',', '.')
-                datos['FEV1/FVC post'] = 'Valor no encontrado'
-            else:
-                datos['FEV1/FVC pre'] = 'Valor no encontrado'
-                datos['FEV1/FVC post'] = 'Valor no encontrado'
-        
-        # FEF25-75
-        elif 'fef25-75' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'fef25-75')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 5:
-                # Si hay al menos 5 números, usar el primero para pre y el quinto para post
-                datos['FEF25-75% pre'] = numbers[0].replace(',', '.')
-                datos['FEF25-75% post'] = numbers[4].replace(',', '.')
-            elif len(numbers) >= 3:
-                # Si hay al menos 3 números pero menos de 5, usar el tercero para pre
-                datos['FEF25-75% pre'] = numbers[2].replace(',', '.')
-                datos['FEF25-75% post'] = 'Valor no encontrado'
-            elif len(numbers) >= 1:
-                # Si solo hay 1-2 números, usar el primero para pre
-                datos['FEF25-75% pre'] = numbers[0].replace(',', '.')
-                datos['FEF25-75% post'] = 'Valor no encontrado'
-            else:
-                datos['FEF25-75% pre'] = 'Valor no encontrado'
-                datos['FEF25-75% post'] = 'Valor no encontrado'
-        
-        # DLCO/VA
-        elif 'dlco/va' in l_strip.lower() and datos['DLCO/VA'] is None:
-            print(f"DEBUG: Encontrada línea DLCO/VA: {l_strip}")
-            # Buscar números en las líneas siguientes
-            for j in range(i+1, min(i+5, len(lineas))):
-                next_line = lineas[j].strip()
-                print(f"DEBUG: Línea siguiente {j}: {next_line}")
-                numbers = re.findall(r'\d+[\.,]\d+', next_line)
-                if numbers:
-                    print(f"DEBUG: Números encontrados en línea {j}: {numbers}")
-                    datos['DLCO/VA'] = numbers[0].replace(',', '.')
-                    break
-            if datos['DLCO/VA'] is None:
-                datos['DLCO/VA'] = 'Valor no encontrado'
-        
-        # DLCO (pero no DLCO/VA)
-        elif 'dlco' in l_strip.lower() and 'dlco/va' not in l_strip.lower() and datos['DLCO'] is None:
-            print(f"DEBUG: Encontrada línea DLCO: {l_strip}")
-            combined_text = extract_values_from_multiline(lineas, i, 'dlco')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 1:
-                datos['DLCO'] = numbers[0].replace(',', '.')
-            else:
-                datos['DLCO'] = 'Valor no encontrado'
-        
-        # VA sb [L]
-        elif 'va sb [l]' in l_strip.lower():
-            print(f"DEBUG: Encontrada línea VA: {l_strip}")
-            combined_text = extract_values_from_multiline(lineas, i, 'va')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 1:
-                datos['VA'] = numbers[0].replace(',', '.')
-            else:
-                datos['VA'] = 'Valor no encontrado'
-        
-        # TLC sb [L]
-        elif 'tlc sb [l]' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'tlc')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 1:
-                datos['TLC'] = numbers[0].replace(',', '.')
-            else:
-                datos['TLC'] = 'Valor no encontrado'
-        
-        # VCmax [L]
-        elif 'vcmax [l]' in l_strip.lower():
-            print(f"DEBUG: Encontrada línea VC: {l_strip}")
-            # Buscar números en la misma línea
-            numbers = re.findall(r'\d+[\.,]\d+', l_strip)
-            if numbers:
-                print(f"DEBUG: Números encontrados VC en la misma línea: {numbers}")
-                datos['VC'] = numbers[0].replace(',', '.')
-            else:
-                datos['VC'] = 'Valor no encontrado'
-        
-        # RV sb [L]
-        elif 'rv sb [l]' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'rv')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 1:
-                datos['RV'] = numbers[0].replace(',', '.')
-            else:
-                datos['RV'] = 'Valor no encontrado'
-        
-        # RV/TLC sb
-        elif 'rv/tlc sb' in l_strip.lower():
-            combined_text = extract_values_from_multiline(lineas, i, 'rv/tlc')
-            numbers = re.findall(r'\d+[\.,]\d+', combined_text)
-            if len(numbers) >= 1:
-                datos['RV/TLC'] = numbers[0].replace(',', '.')
-                print(f"DEBUG EXTRACCION RV/TLC: extraido={datos['RV/TLC']}")
+def _inicios_de_linea(texto: str) -> List[int]:
+    inicios = [0]
+    for linea in texto.splitlines(keepends=True):
+        inicios.append(inicios[-1] + len(linea))
+    return inicios
+
+class _NumerosPorLinea(dict):
+    """
+    Números de cada línea, calculados solo para las líneas que se consultan.
+    """
+
+    def __init__(self, lineas: List[str]):
+        super().__init__()
+        self._lineas = lineas
+
+    def __missing__(self, i: int) -> List[str]:
+        numeros = [n.replace(',', '.') for n in _NUMERO.findall(self._lineas[i])]
+        self[i] = numeros
+        return numeros
+
+def _numeros_bloque(inicio: int, n_lineas: int, claves: Dict[int, FrozenSet[str]],
+                    numeros: _NumerosPorLinea, ajenas: FrozenSet[str]) -> List[str]:
+    """
+    Números del bloque de un parámetro: desde su línea, las líneas sin números hasta la primera
+    con números y las siguientes con números, cortando en cuanto aparece otra variable.
+    """
+    valores = []
+    i = inicio
+    while i < n_lineas:
+        if claves.get(i, _VACIO) & ajenas:
+            return valores
+        if numeros[i]:
+            valores.extend(numeros[i])
+            i += 1
+            while i < n_lineas and numeros[i] and not claves.get(i, _VACIO) & ajenas:
+                valores.extend(numeros[i])
+                i += 1
+            return valores
+        i += 1
+    return valores
+
+class ParserPlantilla:
+    """
+    Parser de una plantilla: la expresión de palabras clave y las tablas de solapes y de
+    variables que cortan cada bloque se construyen una sola vez (ver parser_plantilla).
+    """
+
+    def __init__(self, plantilla: Plantilla):
+        self.plantilla = plantilla
+        self.etiquetas = plantilla.etiquetas
+        palabras = tuple(sorted(set(plantilla.variables) | {e for _, e, _ in plantilla.etiquetas} | set(DEMOGRAFICOS)))
+
+        # Una sola expresión con todas las palabras clave (etiquetas, variables y datos demográficos)
+        self.tokenizador = re.compile(_alternancia_trie(palabras))
+
+        # Palabras clave contenidas en cada coincidencia ('rv/tlc sb' contiene 'rv/tlc', 'rv' y 'tlc')
+        self.contenidas = {p: frozenset(q for q in palabras if q in p) for p in palabras}
+
+        # Para cada palabra clave, (posición, palabras que pueden empezar ahí y salirse de ella): p.ej.
+        # 'fev1/fvc [l]' contiene 'fev1/fvc' y también 'fvc [l]', que empieza en la posición 5.
+        self.solapes = {
+            p: tuple(
+                (i, tuple(q for q in palabras if q.startswith(p[i:]) and len(q) > len(p) - i))
+                for i in range(1, len(p))
+                if any(q.startswith(p[i:]) and len(q) > len(p) - i for q in palabras)
+            )
+            for p in palabras
+        }
+
+        # Variables que cortan el bloque de cada parámetro (las que no forman parte de su nombre)
+        self.ajenas = {
+            nombre: frozenset(v for v in plantilla.variables if v not in nombre)
+            for _, _, nombre in plantilla.etiquetas if nombre is not None
+        }
+
+        # Etiquetas más largas que contienen a otra ('dlco/va' contiene 'dlco'): si están en la
+        # línea, la etiqueta corta no cuenta
+        self.contenedoras = {
+            etiqueta: frozenset(otra for _, otra, _ in plantilla.etiquetas if otra != etiqueta and etiqueta in otra)
+            for _, etiqueta, _ in plantilla.etiquetas
+        }
+
+    def tokenizar_texto(self, texto: str) -> Tuple[List[str], Dict[int, FrozenSet[str]]]:
+        """
+        Recorre el texto una sola vez con la expresión de palabras clave y devuelve las líneas y las
+        palabras clave presentes en cada línea (solo para las líneas que tienen alguna).
+        """
+        lineas = texto.splitlines()
+        texto_min = texto.lower()
+        inicios = _inicios_de_linea(texto_min)
+        tokenizador = self.tokenizador
+
+        claves: Dict[int, FrozenSet[str]] = {}
+        for m in tokenizador.finditer(texto_min):
+            palabra = m.group()
+            inicio = m.start()
+            presentes = self.contenidas[palabra]
+            for desplazamiento, candidatas in self.solapes[palabra]:
+                if texto_min.startswith(candidatas, inicio + desplazamiento):
+                    solapada = tokenizador.match(texto_min, inicio + desplazamiento)
+                    presentes = presentes | self.contenidas[solapada.group()]
+            fila = bisect_right(inicios, inicio) - 1
+            anteriores = claves.get(fila)
+            claves[fila] = presentes if anteriores is None else anteriores | presentes
+        return lineas, claves
+
+    def tokenizar_parametros(self, lineas: List[str], claves: Dict[int, FrozenSet[str]]) -> List[Tuple[str, List[str]]]:
+        """
+        Emite un token (parámetro, números) por cada línea con etiqueta de parámetro, en orden.
+        Los parámetros de primera_aparicion solo cuentan la primera vez que aparecen.
+        """
+        plantilla = self.plantilla
+        numeros = _NumerosPorLinea(lineas)
+        tokens = []
+        vistos = set()
+        n_lineas = len(lineas)
+        for i in sorted(claves):
+            presentes = claves[i]
+            for parametro, etiqueta, nombre in self.etiquetas:
+                if etiqueta not in presentes:
+                    continue
+                if parametro in vistos and parametro in plantilla.primera_aparicion:
+                    continue
+                if self.contenedoras[etiqueta] & presentes:
+                    continue
+                if parametro in plantilla.lineas_siguientes:
+                    # El valor está en alguna de las 4 líneas siguientes
+                    siguiente = next((j for j in range(i + 1, min(i + 5, n_lineas)) if numeros[j]), None)
+                    valores = numeros[siguiente] if siguiente is not None else []
+                elif parametro in plantilla.en_linea or nombre is None:
+                    # El valor está en la misma línea
+                    valores = numeros[i]
+                else:
+                    valores = _numeros_bloque(i, n_lineas, claves, numeros, self.ajenas[nombre])
+                vistos.add(parametro)
+                tokens.append((parametro, valores))
+                break
+        return tokens
+
+    @medir('extraccion.parser')
+    def extraer(self, texto: str) -> dict:
+        datos = dict.fromkeys(CAMPOS_DATOS)
+        lineas, claves = self.tokenizar_texto(texto)
+
+        # Datos generales (primera línea que los contiene; FeNO, la última)
+        feno_found = False
+        for i in sorted(claves):
+            presentes = claves[i]
+            l = lineas[i]
+            if 'sexo' in presentes and datos['Sexo'] is None:
+                m = _SEXO.search(l)
+                if m:
+                    datos['Sexo'] = m.group(1).capitalize()
+            if 'altura' in presentes and datos['Altura'] is None:
+                m = _ALTURA.search(l)
+                if m:
+                    datos['Altura'] = m.group(1)
+            if 'peso' in presentes and datos['Peso'] is None:
+                m = _PESO.search(l)
+                if m:
+                    datos['Peso'] = m.group(1)
+            if 'edad' in presentes and datos['Edad'] is None:
+                m = _EDAD.search(l)
+                if m:
+                    datos['Edad'] = m.group(1)
+            if 'origen étnico' in presentes and datos['Origen étnico'] is None:
+                m = _ORIGEN.search(l)
+                if m:
+                    datos['Origen étnico'] = m.group(1).capitalize()
+            if 'feno' in presentes:
+                m = _ENTERO.search(l)
+                if m:
+                    datos['FeNO'] = m.group(1)
+                    feno_found = True
+        if not feno_found:
+            datos['FeNO'] = 'Valor no encontrado'
+
+        # Parámetros funcionales: la última aparición de cada etiqueta prevalece
+        for parametro, valores in self.tokenizar_parametros(lineas, claves):
+            if parametro in PARAMETROS_PRE_POST:
+                _asignar_pre_post(datos, parametro, valores, self.plantilla.columnas_pre_post)
             else:
-                datos['RV/TLC'] = 'Valor no encontrado'
-    
-    # FeNO (buscar línea que contenga FeNO)
-    feno_found = False
-    for l in lineas:
-        if 'feno' in l.lower():
-            m = re.search(r'(\d+)', l)
-            if m:
-                datos['FeNO'] = m.group(1)
-                feno_found = True
-    if not feno_found:
-        datos['FeNO'] = 'Valor no encontrado'
-    
-    return datos 
\ No newline at end of file
+                datos[parametro] = valores[0] if valores else 'Valor no encontrado'
+
+        return datos
+
+# Parsers compilados por nombre de plantilla
+_parsers: Dict[str, ParserPlantilla] = {}
+_lock_parsers = threading.Lock()
+
+def parser_plantilla(plantilla=None) -> ParserPlantilla:
+    """
+    Parser compilado de la plantilla (nombre, Plantilla o None para la de por defecto).
+    Se recompila si la plantilla registrada con ese nombre ha cambiado.
+    """
+    plantilla = obtener_plantilla(plantilla)
+    parser = _parsers.get(plantilla.nombre)
+    if parser is None or parser.plantilla is not plantilla:
+        with _lock_parsers:
+            parser = _parsers.get(plantilla.nombre)
+            if parser is None or parser.plantilla is not plantilla:
+                parser = _parsers[plantilla.nombre] = ParserPlantilla(plantilla)
+    return parser
+
+def tokenizar_texto(texto: str) -> Tuple[List[str], Dict[int, FrozenSet[str]]]:
+    return parser_plantilla().tokenizar_texto(texto)
+
+def tokenizar_parametros(lineas: List[str], claves: Dict[int, FrozenSet[str]]) -> List[Tuple[str, List[str]]]:
+    return parser_plantilla().tokenizar_parametros(lineas, claves)
+
+def _asignar_pre_post(datos: dict, parametro: str, numbers: List[str],
+                      columnas: Tuple[Tuple[int, int, Optional[int]], ...] = COLUMNAS_PRE_POST) -> None:
+    # La primera regla cuyo mínimo de números se cumple indica las columnas pre y post
+    for minimo, pre, post in columnas:
+        if len(numbers) >= minimo:
+            datos[f'{parametro} pre'] = numbers[pre]
+            datos[f'{parametro} post'] = numbers[post] if post is not None else 'Valor no encontrado'
+            return
+    datos[f'{parametro} pre'] = 'Valor no encontrado'
+    datos[f'{parametro} post'] = 'Valor no encontrado'
+
+def extract_datos_pulmonar(texto: str, plantilla=None) -> dict:
+    """
+    Extrae los datos de un informe con el parser de la plantilla indicada (nombre o Plantilla);
+    sin plantilla se usa la de por defecto.
+    """
+    return parser_plantilla(plantilla).extraer(texto)
+
+def datos_completos(datos: Dict, campos: Sequence[str] = CAMPOS_REQUERIDOS) -> bool:
+    return all(datos.get(campo) not in (None, '', 'Valor no encontrado') for campo in campos)
+
+class ExtraccionIncremental:
+    """
+    extract_datos_pulmonar alimentado página a página, para dejar de leer el PDF en cuanto los
+    campos requeridos están completos. Las páginas se concatenan en su orden en el documento
+    aunque se añadan en otro (p.ej. primero las indicadas para la plantilla), así que al final
+    el resultado es el mismo que el de extract_datos_pulmonar sobre el texto de esas páginas.
+    El parser se reejecuta sobre el texto acumulado: es despreciable frente a extraer el texto
+    de una página con pdfplumber.
+    """
+
+    def __init__(self, campos: Sequence[str] = CAMPOS_REQUERIDOS, plantilla=None):
+        self.campos = campos
+        self.parser = parser_plantilla(plantilla)
+        self.textos: Dict[int, str] = {}
+        self.datos: Optional[Dict] = None
+
+    @property
+    def plantilla(self) -> Plantilla:
+        return self.parser.plantilla
+
+    @property
+    def paginas(self) -> List[str]:
+        return [self.textos[i] for i in sorted(self.textos)]
+
+    @property
+    def completo(self) -> bool:
+        return self.datos is not None and datos_completos(self.datos, self.campos)
+
+    def añadir_pagina(self, texto: str, indice: Optional[int] = None) -> Dict:
+        self.textos[len(self.textos) if indice is None else indice] = texto
+        self.datos = self.parser.extraer(''.join(self.paginas))
+        return self.datos
@@ -0,0 +1,176 @@
+import re
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.extraccion import CAMPOS_REQUERIDOS, PARAMETROS_PRE_POST, ExtraccionIncremental
+from utils.instrumentacion import medir
+from utils.plantillas import CABECERAS, Plantilla, obtener_plantilla
+
+# Extracción por coordenadas: en lugar de adivinar las columnas contando números en el texto
+# aplanado, se localiza la fila de cabecera de la tabla (Pred, LLN, Pre, %Pred, Post...) con
+# extract_words y cada número se asigna a la columna bajo la que está. Los textos de cabecera y
+# las etiquetas de fila son los de la plantilla (ver plantillas.CABECERAS).
+
+# Mínimo de columnas reconocidas para considerar que una fila es la cabecera de la tabla
+MIN_COLUMNAS_CABECERA = 3
+
+# Distancia vertical máxima (pt) entre palabras de la misma fila
+TOLERANCIA_FILA = 3
+
+_VALOR = re.compile(r'-?\d+(?:[\.,]\d+)?')
+
+# Columnas por plantilla: firma de la cabecera -> (nombres de columna, límites x entre columnas).
+# Los informes de un mismo equipo repiten cabecera y posiciones, así que se calculan una vez.
+_columnas_por_plantilla: Dict[Tuple, Tuple[Tuple[str, ...], Tuple[float, ...]]] = {}
+_lock = threading.Lock()
+
+
+def agrupar_filas(palabras: List[Dict], tolerancia: float = TOLERANCIA_FILA) -> List[List[Dict]]:
+    """
+    Agrupa las palabras de extract_words en filas (por su coordenada 'top'), ordenadas de
+    arriba abajo y cada fila de izquierda a derecha.
+    """
+    filas = []
+    for palabra in sorted(palabras, key=lambda w: (round(w['top']), w['x0'])):
+        if filas and abs(palabra['top'] - filas[-1][0]['top']) <= tolerancia:
+            filas[-1].append(palabra)
+        else:
+            filas.append([palabra])
+    return [sorted(fila, key=lambda w: w['x0']) for fila in filas]
+
+
+def _columnas_cabecera(fila: List[Dict], cabeceras: Dict[str, str] = CABECERAS
+                       ) -> Optional[Tuple[Tuple, Tuple[str, ...], Tuple[float, ...]]]:
+    """
+    Si la fila es una cabecera de tabla devuelve (firma, columnas, límites x); si no, None.
+    """
+    nombres = []
+    centros = []
+    visto_post = False
+    for palabra in fila:
+        columna = cabeceras.get(palabra['text'].lower().strip('[]():'))
+        if columna is None:
+            continue
+        if columna == '%pred':
+            columna = '%pred post' if visto_post else '%pred pre'
+        elif columna == 'post':
+            visto_post = True
+        nombres.append(columna)
+        centros.append((palabra['x0'] + palabra['x1']) / 2)
+    if len(set(nombres)) < MIN_COLUMNAS_CABECERA or 'pre' not in nombres:
+        return None
+
+    firma = tuple(nombres) + tuple(round(c) for c in centros)
+    with _lock:
+        if firma not in _columnas_por_plantilla:
+            # Límite entre columnas: punto medio entre los centros de cabeceras consecutivas
+            limites = tuple((a + b) / 2 for a, b in zip(centros, centros[1:]))
+            _columnas_por_plantilla[firma] = (tuple(nombres), limites)
+        columnas, limites = _columnas_por_plantilla[firma]
+    return firma, columnas, limites
+
+
+def _etiqueta_fila(texto: str, plantilla: Plantilla) -> Optional[str]:
+    texto = texto.lower()
+    etiquetas = [etiqueta for _, etiqueta, _ in plantilla.etiquetas]
+    for parametro, etiqueta, _ in plantilla.etiquetas:
+        # Una etiqueta contenida en otra presente en la fila ('dlco' en 'dlco/va') no cuenta
+        if etiqueta in texto and not any(etiqueta != otra and etiqueta in otra and otra in texto for otra in etiquetas):
+            return parametro
+    return None
+
+
+@medir('extraccion.tabla')
+def valores_tabla(filas: List[List[Dict]], plantilla=None) -> Dict[str, Dict[str, str]]:
+    """
+    Recorre las filas de una página y devuelve {parámetro: {columna: valor}} para las filas de la
+    tabla cuya etiqueta se reconoce. Los valores que caen en la fila siguiente a la etiqueta
+    (celdas partidas en dos líneas) se asignan a esa etiqueta.
+    """
+    plantilla = obtener_plantilla(plantilla)
+    cabeceras = dict(plantilla.cabeceras)
+    valores = {}
+    columnas = limites = None
+    pendiente = None
+    for fila in filas:
+        cabecera = _columnas_cabecera(fila, cabeceras)
+        if cabecera is not None:
+            _, columnas, limites = cabecera
+            pendiente = None
+            continue
+        if columnas is None:
+            continue
+
+        # Las palabras no numéricas forman la etiqueta; los números son celdas de su columna
+        etiqueta = ' '.join(w['text'] for w in fila if not _VALOR.fullmatch(w['text']))
+        celdas = {}
+        for palabra in fila:
+            if not _VALOR.fullmatch(palabra['text']):
+                continue
+            centro = (palabra['x0'] + palabra['x1']) / 2
+            columna = columnas[bisect_right(limites, centro)]
+            celdas.setdefault(columna, palabra['text'].replace(',', '.'))
+
+        parametro = _etiqueta_fila(etiqueta, plantilla)
+        if parametro is not None:
+            if parametro in plantilla.primera_aparicion and parametro in valores:
+                continue
+            valores[parametro] = celdas
+            pendiente = parametro if not celdas else None
+        elif pendiente is not None and celdas:
+            valores[pendiente] = celdas
+            pendiente = None
+    return valores
+
+
+def texto_desde_filas(filas: List[List[Dict]]) -> str:
+    return '\n'.join(' '.join(w['text'] for w in fila) for fila in filas)
+
+
+class ExtraccionTablaIncremental(ExtraccionIncremental):
+    """
+    Extracción por coordenadas página a página (ver ExtraccionIncremental): se añaden las
+    palabras de cada página en lugar de su texto.
+    """
+
+    def __init__(self, campos: Sequence[str] = CAMPOS_REQUERIDOS, plantilla=None):
+        super().__init__(campos, plantilla)
+        self.tablas: Dict[int, Dict[str, Dict[str, str]]] = {}
+
+    def añadir_pagina(self, palabras: List[Dict], indice: Optional[int] = None) -> Dict:
+        indice = len(self.textos) if indice is None else indice
+        filas = agrupar_filas(palabras)
+        self.textos[indice] = texto_desde_filas(filas)
+        self.tablas[indice] = valores_tabla(filas, self.plantilla)
+
+        valores = {}
+        for i in sorted(self.tablas):
+            for parametro, celdas in self.tablas[i].items():
+                # Como en el parser de texto: primera o última aparición según la plantilla
+                if parametro not in self.plantilla.primera_aparicion or parametro not in valores:
+                    valores[parametro] = celdas
+
+        datos = self.parser.extraer('\n'.join(self.paginas))
+        for parametro, celdas in valores.items():
+            if parametro in PARAMETROS_PRE_POST:
+                if 'pre' in celdas:
+                    datos[f'{parametro} pre'] = celdas['pre']
+                    datos[f'{parametro} post'] = celdas.get('post', 'Valor no encontrado')
+            elif 'pre' in celdas:
+                datos[parametro] = celdas['pre']
+        self.datos = datos
+        return datos
+
+
+def extract_datos_pulmonar_tabla(paginas_palabras: List[List[Dict]], plantilla=None) -> Tuple[List[str], Dict]:
+    """
+    Extrae los datos de un informe a partir de las palabras (extract_words) de cada página.
+    Devuelve (texto por página, datos) con el mismo formato que extract_datos_pulmonar: los
+    parámetros se leen de su columna de la tabla y los datos demográficos y los parámetros que no
+    aparecen en la tabla, del texto reconstruido de las filas.
+    """
+    extraccion = ExtraccionTablaIncremental(plantilla=plantilla)
+    for palabras in paginas_palabras:
+        extraccion.añadir_pagina(palabras)
+    return extraccion.paginas, extraccion.datos or extraccion.parser.extraer('')
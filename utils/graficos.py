@@ -0,0 +1,348 @@
+import hashlib
+import io
+import json
+import math
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+from matplotlib import patches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from utils.cache_lru import CacheLRU
+
+# Renderizado de gráficos en memoria. Las figuras se crean con matplotlib.figure.Figure en lugar
+# de pyplot: no comparten el estado global de pyplot entre las sesiones de Streamlit (cada una en
+# su hilo) y no hace falta cerrarlas. El resultado son bytes (PNG/SVG) o un array RGBA, nunca un
+# archivo en disco, así que dos sesiones no pueden pisarse el gráfico.
+
+# Resolución por destino: en pantalla st.image reescala al ancho del contenedor; en el PDF se
+# imprime a tamaño real
+DPI_POR_DESTINO = {
+    'pantalla': 150,
+    'pdf': 300
+}
+
+# Gráficos ya codificados por hash de (tipo, datos dibujados, destino, formato, dpi): una nueva
+# ejecución del script de Streamlit por un widget ajeno al gráfico no vuelve a dibujarlo. Acotado
+# por memoria (bytes de PNG/SVG), compartido por todas las sesiones del proceso.
+MAX_BYTES_GRAFICOS = 64 * 1024 * 1024
+cache_graficos = CacheLRU(max_entradas=512, max_bytes=MAX_BYTES_GRAFICOS)
+
+
+def nueva_figura(figsize: Tuple[float, float], filas: int = 1, columnas: int = 1):
+    """
+    (figura, ejes) fuera de pyplot, con la misma forma de ejes que plt.subplots.
+    """
+    figura = Figure(figsize=figsize)
+    FigureCanvasAgg(figura)
+    return figura, figura.subplots(filas, columnas)
+
+
+def dpi_destino(destino: str = 'pantalla', dpi: Optional[int] = None) -> int:
+    if dpi is not None:
+        return dpi
+    if destino not in DPI_POR_DESTINO:
+        raise ValueError(f"Destino de gráfico no válido: {destino} (use {', '.join(DPI_POR_DESTINO)})")
+    return DPI_POR_DESTINO[destino]
+
+
+def renderizar_figura(figura: Figure, destino: str = 'pantalla', formato: str = 'png', dpi: Optional[int] = None,
+                      transparente: bool = True) -> bytes:
+    """
+    Codifica la figura (PNG o SVG) en memoria con la resolución del destino ('pantalla' o 'pdf').
+    """
+    buffer = io.BytesIO()
+    figura.savefig(buffer, format=formato, dpi=dpi_destino(destino, dpi), bbox_inches='tight',
+                   transparent=transparente, facecolor='none' if transparente else 'white')
+    return buffer.getvalue()
+
+
+def figura_a_array(figura: Figure, destino: str = 'pantalla', dpi: Optional[int] = None) -> np.ndarray:
+    """
+    Píxeles RGBA de la figura (alto x ancho x 4, uint8), sin codificar a PNG.
+    """
+    figura.set_dpi(dpi_destino(destino, dpi))
+    lienzo = FigureCanvasAgg(figura)
+    lienzo.draw()
+    return np.asarray(lienzo.buffer_rgba()).copy()
+
+
+def clave_grafico(tipo: str, datos: Any, destino: str = 'pantalla', formato: str = 'png',
+                  dpi: Optional[int] = None) -> str:
+    """
+    SHA-256 del tipo de gráfico, los datos que dibuja (serializables a JSON) y la salida.
+    """
+    contenido = json.dumps([tipo, datos, formato, dpi_destino(destino, dpi)], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def grafico_cacheado(tipo: str, datos: Any, dibujar: Callable[[], Figure], destino: str = 'pantalla',
+                     formato: str = 'png', dpi: Optional[int] = None) -> bytes:
+    """
+    Bytes del gráfico: los guardados para el mismo tipo, datos y salida, o los de renderizar
+    dibujar(). `datos` debe contener todo lo que determina el dibujo.
+    """
+    clave = clave_grafico(tipo, datos, destino, formato, dpi)
+    return cache_graficos.obtener_o_calcular(clave, lambda: renderizar_figura(dibujar(), destino, formato, dpi))
+
+
+def estadisticas_cache_graficos() -> Dict:
+    """
+    Aciertos y ocupación (entradas y bytes) del caché de gráficos.
+    """
+    return cache_graficos.estadisticas()
+
+
+# Gráficos de puntuaciones Z (espirometría, DLCO, volúmenes): una fila por parámetro con su banda
+# coloreada según la severidad, una estrella en el z-score y su valor. Lo que no depende del
+# paciente (ejes, rejilla, líneas LLN y predicho, título) se dibuja una vez por plantilla y se
+# guarda como fondo; cada paciente solo restaura el fondo y dibuja bandas, estrellas y textos
+# (blitting), sin construir la figura ni recalcular el layout.
+Z_LLN = -1.64
+Z_SEVERO = -2.5
+Z_MAX_DEFECTO = 3
+Z_MIN_DEFECTO = -5
+ANCHO_FIGURA_Z = 10  # pulgadas
+
+# (color de la banda, color de la estrella y el texto) por severidad
+COLORES_Z = {
+    'normal': ('#90EE90', 'green'),
+    'leve': ('#FFB347', 'orange'),
+    'grave': ('#FFB6C1', 'red')
+}
+
+
+def _colores_z(z: float) -> Tuple[str, str]:
+    if z >= Z_LLN:
+        return COLORES_Z['normal']
+    if z >= Z_SEVERO:
+        return COLORES_Z['leve']
+    return COLORES_Z['grave']
+
+
+def rango_z(z_scores) -> Tuple[int, int]:
+    """
+    Límites enteros del eje X: [-5, 3], ampliados de 5 en 5 hasta que quepan todos los z-scores
+    (con una unidad de margen). Al redondear, pacientes con valores extremos parecidos comparten
+    plantilla.
+    """
+    z_min, z_max = min(z_scores) - 1, max(z_scores) + 1
+    return (Z_MIN_DEFECTO if z_min >= Z_MIN_DEFECTO else 5 * math.floor(z_min / 5),
+            Z_MAX_DEFECTO if z_max <= Z_MAX_DEFECTO else 5 * math.ceil(z_max / 5))
+
+
+def _fragmento_png(tipo: bytes, datos: bytes) -> bytes:
+    return struct.pack('>I', len(datos)) + tipo + datos + struct.pack('>I', zlib.crc32(tipo + datos) & 0xffffffff)
+
+
+def _adler32_concatenado(adler1: int, adler2: int, longitud2: int) -> int:
+    """
+    Adler-32 de a + b a partir del de a, el de b y la longitud de b (adler32_combine de zlib).
+    """
+    base = 65521
+    resto = longitud2 % base
+    suma1 = adler1 & 0xffff
+    suma2 = (resto * suma1) % base
+    suma1 = (suma1 + (adler2 & 0xffff) + base - 1) % base
+    suma2 = (suma2 + ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - resto) % base
+    return suma1 | (suma2 << 16)
+
+
+class CodificadorPNGFranjas:
+    """
+    Codificador PNG (RGB o RGBA de 8 bits, sin filtro por fila) para imágenes que solo cambian dentro de
+    unas franjas de filas fijas. Las filas fuera de las franjas se comprimen una vez, a partir del
+    fondo; en cada imagen solo se comprimen las franjas. Cada tramo se cierra con Z_FULL_FLUSH, que
+    vacía el diccionario de deflate, así que los tramos comprimidos por separado se concatenan en
+    un único flujo zlib válido.
+    """
+
+    def __init__(self, fondo: np.ndarray, franjas, nivel: int = 1, nivel_fondo: int = 6):
+        alto, ancho, canales = fondo.shape
+        self.forma = fondo.shape
+        self.nivel = nivel
+        tipo_color = {3: 2, 4: 6}[canales]  # truecolor, truecolor con alfa
+        self.cabecera = b'\x89PNG\r\n\x1a\n' + _fragmento_png(
+            b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 8, tipo_color, 0, 0, 0))
+        # Tramos (inicio, fin, None) para las franjas y (inicio, fin, (comprimido, adler, longitud)) para el fondo
+        self.tramos = []
+        posicion = 0
+        for inicio, fin in self._unir(franjas, alto):
+            if inicio > posicion:
+                self.tramos.append((posicion, inicio, self._comprimir(fondo[posicion:inicio], nivel_fondo)))
+            self.tramos.append((inicio, fin, None))
+            posicion = fin
+        if posicion < alto:
+            self.tramos.append((posicion, alto, self._comprimir(fondo[posicion:alto], nivel_fondo)))
+
+    @staticmethod
+    def _unir(franjas, alto: int):
+        unidas = []
+        for inicio, fin in sorted((max(0, int(i)), min(alto, int(f))) for i, f in franjas):
+            if fin <= inicio:
+                continue
+            if unidas and inicio <= unidas[-1][1]:
+                unidas[-1][1] = max(unidas[-1][1], fin)
+            else:
+                unidas.append([inicio, fin])
+        return unidas
+
+    @staticmethod
+    def _comprimir(pixeles: np.ndarray, nivel: int) -> Tuple[bytes, int, int]:
+        alto = pixeles.shape[0]
+        filas = np.zeros((alto, pixeles.shape[1] * pixeles.shape[2] + 1), dtype=np.uint8)  # byte 0: filtro 'None'
+        filas[:, 1:] = pixeles.reshape(alto, -1)
+        datos = filas.tobytes()
+        compresor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        return compresor.compress(datos) + compresor.flush(zlib.Z_FULL_FLUSH), zlib.adler32(datos), len(datos)
+
+    def tamano(self) -> int:
+        """
+        Bytes de las filas de fondo ya comprimidas.
+        """
+        return sum(len(fondo[0]) for _, _, fondo in self.tramos if fondo)
+
+    def codificar(self, pixeles: np.ndarray) -> bytes:
+        """
+        PNG de `pixeles` (alto x ancho x canales, uint8), que fuera de las franjas debe coincidir con el fondo.
+        """
+        if pixeles.shape != self.forma:
+            raise ValueError(f"Tamaño de imagen {pixeles.shape} distinto del fondo {self.forma}")
+        partes = [b'\x78\x01']
+        adler = 1
+        for inicio, fin, fondo in self.tramos:
+            comprimido, adler_tramo, longitud = fondo or self._comprimir(pixeles[inicio:fin], self.nivel)
+            partes.append(comprimido)
+            adler = _adler32_concatenado(adler, adler_tramo, longitud)
+        partes.append(b'\x03\x00')  # bloque final vacío
+        partes.append(struct.pack('>I', adler))
+        return self.cabecera + _fragmento_png(b'IDAT', b''.join(partes)) + _fragmento_png(b'IEND', b'')
+
+
+class PlantillaZScores:
+    """
+    Figura de puntuaciones Z con el fondo ya dibujado para un título, unos parámetros (filas),
+    un rango del eje X y una resolución. Sin transparencia el PNG es RGB sobre fondo blanco (más
+    ligero de incrustar en un PDF). renderizar() es seguro entre hilos.
+    """
+
+    def __init__(self, titulo: str, parametros: Tuple[str, ...], rango: Tuple[int, int], dpi: int,
+                 transparente: bool = True):
+        self.parametros = parametros
+        self.rango = rango
+        self.canales = 4 if transparente else 3
+        x_min, x_max = rango
+        n = len(parametros)
+        self.figura = Figure(figsize=(ANCHO_FIGURA_Z, 2.6 + 0.35 * n), dpi=dpi,
+                             facecolor='none' if transparente else 'white')
+        self.lienzo = FigureCanvasAgg(self.figura)
+        ax = self.figura.add_axes([0.14, 0.2, 0.83, 0.56])
+        ax.patch.set_alpha(0)
+
+        ax.axvline(x=Z_LLN, color='black', linewidth=3)
+        ax.axvline(x=0, color='black', linewidth=3)
+        # Etiquetas de las líneas sobre el eje, hacia fuera para que no se solapen
+        ax.text(Z_LLN, 1.04, 'LLN ', transform=ax.get_xaxis_transform(), ha='right', va='bottom',
+                fontsize=11, fontweight='bold')
+        ax.text(0, 1.04, ' Predicho', transform=ax.get_xaxis_transform(), ha='left', va='bottom',
+                fontsize=11, fontweight='bold')
+        ax.set_title(titulo, fontsize=16, fontweight='bold', pad=34)
+        ax.set_xlim(x_min, x_max)
+        ax.set_ylim(-0.5, n - 0.5)
+        ax.set_yticks(range(n))
+        ax.set_yticklabels(parametros, fontsize=12, fontweight='bold')
+        ax.set_xlabel('Puntuación Z', fontsize=14, fontweight='bold')
+        ax.grid(axis='x', alpha=0.3, linestyle='--')
+
+        # Artistas que cambian con cada paciente (animated: no entran en el fondo)
+        desplazamiento = 0.02 * (x_max - x_min)
+        self.desplazamiento = desplazamiento
+        self.bandas = []
+        self.estrellas = []
+        self.textos = []
+        for i in range(n):
+            banda = patches.Rectangle((x_min, i - 0.15), x_max - x_min, 0.3, alpha=0.3, edgecolor='gray',
+                                      linewidth=0.5, animated=True)
+            ax.add_patch(banda)
+            estrella, = ax.plot([0], [i], '*', markersize=15, markeredgecolor='white', markeredgewidth=1,
+                                animated=True)
+            texto = ax.text(0, i, '', ha='left', va='center', fontsize=10, fontweight='bold', animated=True)
+            self.bandas.append(banda)
+            self.estrellas.append(estrella)
+            self.textos.append(texto)
+
+        self.lienzo.draw()
+        self.fondo = self.lienzo.copy_from_bbox(self.figura.bbox)
+        # Filas de píxeles que pueden cambiar: la altura de la banda o de la estrella (la mayor)
+        # alrededor del centro de cada fila, con margen para el antialiasing
+        alto = int(self.figura.bbox.height)
+        medio = max(0.15 * ax.transData.get_matrix()[1, 1], 15 * dpi / 72 / 2) + 3
+        centros = ax.transData.transform([(0, i) for i in range(n)])[:, 1]
+        self.codificador = CodificadorPNGFranjas(self._pixeles(),
+                                                 [(alto - c - medio, alto - c + medio + 1) for c in centros])
+        self._lock = threading.Lock()
+
+    def _pixeles(self) -> np.ndarray:
+        return np.asarray(self.lienzo.buffer_rgba())[:, :, :self.canales]
+
+    def tamano(self) -> int:
+        """
+        Bytes aproximados que ocupa la plantilla: el lienzo RGBA, la copia del fondo (del mismo
+        tamaño) y el fondo comprimido del codificador.
+        """
+        alto, ancho = self.codificador.forma[:2]
+        return 2 * alto * ancho * 4 + self.codificador.tamano()
+
+    def renderizar(self, z_scores: Tuple[float, ...]) -> bytes:
+        """
+        PNG con los z-scores (uno por parámetro, en el orden de la plantilla).
+        """
+        with self._lock:
+            self.lienzo.restore_region(self.fondo)
+            for banda, estrella, texto, z in zip(self.bandas, self.estrellas, self.textos, z_scores):
+                color_banda, color = _colores_z(z)
+                banda.set_facecolor(color_banda)
+                estrella.set_data([z], [estrella.get_ydata()[0]])
+                estrella.set_color(color)
+                texto.set_position((z + self.desplazamiento, texto.get_position()[1]))
+                texto.set_text(f'{z:.2f}')
+                texto.set_color(color)
+                for artista in (banda, estrella, texto):
+                    self.figura.draw_artist(artista)
+            return self.codificador.codificar(self._pixeles())
+
+
+# Plantillas ya dibujadas por (título, parámetros, rango del eje X, dpi, transparencia). Cada una
+# guarda dos copias de la imagen sin comprimir (~12 MB a la resolución del PDF): se acotan por memoria
+MAX_BYTES_PLANTILLAS = 128 * 1024 * 1024
+plantillas_z_scores = CacheLRU(max_entradas=32, max_bytes=MAX_BYTES_PLANTILLAS,
+                               tamano=lambda plantilla: plantilla.tamano())
+
+
+def grafico_z_scores(titulo: str, resultados: Mapping[str, Mapping], destino: str = 'pantalla',
+                     dpi: Optional[int] = None, transparente: bool = True) -> Optional[bytes]:
+    """
+    PNG de las puntuaciones Z de los parámetros de `resultados` ({parámetro: {'z_score', ...}}),
+    o None si ninguno tiene z-score.
+    """
+    filas = [(parametro, float(r['z_score'])) for parametro, r in resultados.items()
+             if isinstance(r, Mapping) and r.get('z_score') is not None and not math.isnan(float(r['z_score']))]
+    if not filas:
+        return None
+    parametros = tuple(p for p, _ in filas)
+    z_scores = tuple(z for _, z in filas)
+    dpi = dpi_destino(destino, dpi)
+
+    def renderizar():
+        rango = rango_z(z_scores)
+        plantilla = plantillas_z_scores.obtener_o_calcular(
+            (titulo, parametros, rango, dpi, transparente),
+            lambda: PlantillaZScores(titulo, parametros, rango, dpi, transparente))
+        return plantilla.renderizar(z_scores)
+
+    clave = clave_grafico('z_scores', [titulo, filas, transparente], destino, 'png', dpi)
+    return cache_graficos.obtener_o_calcular(clave, renderizar)
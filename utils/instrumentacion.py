@@ -0,0 +1,220 @@
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Medición de tiempos por etapa del flujo (apertura del PDF, texto, parser, tablas GLI,
+# predicciones, gráficos, exportación). Las etapas se marcan con medir('etapa') como
+# context manager o decorador y sus duraciones se acumulan en histogramas compartidos por todo el
+# proceso, que se pueden volcar al log, servir en formato Prometheus o mostrar en la app.
+# Desactivada (por defecto) cada etapa cuesta una comprobación de un booleano.
+
+logger = logging.getLogger('pulmoreport.metricas')
+
+# Variables de entorno: PULMOREPORT_METRICAS=1 activa la medición; PULMOREPORT_METRICAS_PUERTO
+# sirve además el texto Prometheus en http://127.0.0.1:<puerto>/metrics
+VARIABLE_ACTIVAR = 'PULMOREPORT_METRICAS'
+VARIABLE_PUERTO = 'PULMOREPORT_METRICAS_PUERTO'
+
+# Límites superiores (s) de los intervalos de los histogramas
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_activo = os.environ.get(VARIABLE_ACTIVAR, '').lower() in ('1', 'true', 'si', 'sí')
+
+
+def activar_metricas(activo: bool = True) -> None:
+    global _activo
+    _activo = activo
+
+
+def metricas_activas() -> bool:
+    return _activo
+
+
+class Histograma:
+    """
+    Número de observaciones por intervalo de LIMITES_SEGUNDOS (el último, sin límite), suma y máximo.
+    """
+
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_SEGUNDOS):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos: float) -> None:
+        self.cuentas[bisect_left(self.limites, segundos)] += 1
+        self.n += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def cuantil(self, q: float) -> float:
+        """
+        Estimación del cuantil q (0-1) interpolando dentro del intervalo en que cae, como
+        histogram_quantile de Prometheus; acotada por el máximo observado.
+        """
+        if not self.n:
+            return 0.0
+        objetivo = q * self.n
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            if cuenta and acumulado + cuenta >= objetivo:
+                inferior = self.limites[i - 1] if i > 0 else 0.0
+                superior = self.limites[i] if i < len(self.limites) else self.maximo
+                return min(inferior + (superior - inferior) * (objetivo - acumulado) / cuenta, self.maximo)
+            acumulado += cuenta
+        return self.maximo
+
+
+class RegistroMetricas:
+    """
+    Histogramas por etapa. Es seguro entre hilos (ingerir_pdfs y las sesiones de Streamlit
+    registran a la vez).
+    """
+
+    def __init__(self):
+        self._histogramas: Dict[str, Histograma] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, etapa: str, segundos: float) -> None:
+        with self._lock:
+            histograma = self._histogramas.get(etapa)
+            if histograma is None:
+                histograma = self._histogramas[etapa] = Histograma()
+            histograma.observar(segundos)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._histogramas.clear()
+
+    def resumen(self) -> List[Dict]:
+        """
+        Una fila por etapa (ordenadas por tiempo total): n, total, media, p50, p95 y máximo.
+        """
+        with self._lock:
+            filas = [{
+                'etapa': etapa,
+                'n': h.n,
+                'total_s': round(h.suma, 4),
+                'media_ms': round(h.suma / h.n * 1000, 3),
+                'p50_ms': round(h.cuantil(0.5) * 1000, 3),
+                'p95_ms': round(h.cuantil(0.95) * 1000, 3),
+                'max_ms': round(h.maximo * 1000, 3)
+            } for etapa, h in self._histogramas.items()]
+        return sorted(filas, key=lambda fila: fila['total_s'], reverse=True)
+
+    def texto_prometheus(self, nombre: str = 'pulmoreport_etapa_segundos') -> str:
+        """
+        Histogramas en el formato de texto de Prometheus (etiqueta 'etapa').
+        """
+        lineas = [f'# HELP {nombre} Duración de cada etapa del flujo de informes.', f'# TYPE {nombre} histogram']
+        with self._lock:
+            for etapa, h in sorted(self._histogramas.items()):
+                acumulado = 0
+                for limite, cuenta in zip(h.limites, h.cuentas):
+                    acumulado += cuenta
+                    lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="+Inf"}} {h.n}')
+                lineas.append(f'{nombre}_sum{{etapa="{etapa}"}} {h.suma}')
+                lineas.append(f'{nombre}_count{{etapa="{etapa}"}} {h.n}')
+        return '\n'.join(lineas) + '\n'
+
+    def registrar_en_log(self, nivel: int = logging.INFO) -> None:
+        for fila in self.resumen():
+            logger.log(nivel, "%s: n=%d total=%.3fs media=%.3fms p50=%.3fms p95=%.3fms max=%.3fms",
+                       fila['etapa'], fila['n'], fila['total_s'], fila['media_ms'], fila['p50_ms'],
+                       fila['p95_ms'], fila['max_ms'])
+
+
+registro_metricas = RegistroMetricas()
+
+
+class Etapa:
+    """
+    Medición de una etapa (ver medir).
+    """
+    __slots__ = ('nombre', '_inicio')
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._inicio = None
+
+    def __enter__(self) -> 'Etapa':
+        self._inicio = time.perf_counter() if _activo else None
+        return self
+
+    def __exit__(self, *excepcion) -> bool:
+        if self._inicio is not None:
+            registro_metricas.observar(self.nombre, time.perf_counter() - self._inicio)
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        nombre = self.nombre
+
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return func(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registro_metricas.observar(nombre, time.perf_counter() - inicio)
+        return envoltura
+
+
+def medir(etapa: str) -> Etapa:
+    """
+    Mide una etapa como context manager (`with medir('pdf.abrir'):`) o como decorador
+    (`@medir('gli.analisis')`). Si la medición está desactivada no se toma ningún tiempo.
+    """
+    return Etapa(etapa)
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = registro_metricas.texto_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        logger.debug(formato, *args)
+
+
+_servidor: Optional[ThreadingHTTPServer] = None
+_lock_servidor = threading.Lock()
+
+
+def servir_metricas(puerto: Optional[int] = None, host: str = '127.0.0.1') -> Optional[ThreadingHTTPServer]:
+    """
+    Sirve /metrics (formato Prometheus) en un hilo aparte, una sola vez por proceso (Streamlit
+    ejecuta el script en cada interacción). Sin puerto se usa PULMOREPORT_METRICAS_PUERTO; si
+    tampoco está definido no se sirve nada.
+    """
+    global _servidor
+    if puerto is None:
+        if not os.environ.get(VARIABLE_PUERTO):
+            return None
+        puerto = int(os.environ[VARIABLE_PUERTO])
+    with _lock_servidor:
+        if _servidor is None:
+            try:
+                _servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+            except OSError as e:
+                print(f"No se pudo servir las métricas en el puerto {puerto}: {e}")
+                return None
+            threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+        return _servidor
@@ -0,0 +1,114 @@
+import math
+from typing import Tuple
+
+import numpy as np
+from scipy.special import ndtr
+
+from utils.tablas_gli import obtener_tabla
+
+# z-score del límite inferior de la normalidad (percentil 5)
+Z_LLN = -1.645
+
+# S aproximado (RSE) para los parámetros cuyas tablas no traen coeficientes S/L
+# (DLCO y volúmenes): con L = 0 el z-score LMS coincide con (ln(obs) - ln(M)) / RSE.
+RSE_APROXIMADO = {
+    'fev1': 0.12,
+    'fvc': 0.12,
+    'fef2575': 0.12,
+    'dlco': 0.15,
+    'kco': 0.15,
+    'va': 0.12,
+    'tlc': 0.12,
+    'vc': 0.12,
+    'rv': 0.15,
+    'rvtlc': 0.15
+}
+
+# Por debajo de este |L| se usa el límite L -> 0 de las fórmulas LMS
+_L_CERO = 1e-10
+
+
+def obtener_s_l(parametro: str, edad: float, sexo: str, interpolar: bool = False) -> Tuple[float, float]:
+    """
+    Devuelve (S, L) GLI para el parámetro, edad y sexo dados.
+    Si las tablas no incluyen coeficientes S/L se usa S = RSE aproximado y L = 0.
+    """
+    s_l = obtener_tabla(parametro, sexo).s_l(edad, interpolar)
+    if s_l is None:
+        return RSE_APROXIMADO[parametro.lower()], 0.0
+    return s_l
+
+
+def calcular_z_score_lms(valor_observado: float, m: float, s: float, l: float) -> float:
+    """
+    Calcula el z-score LMS: z = ((observado/M)^L - 1) / (L*S), o ln(observado/M)/S si L = 0.
+    """
+    if valor_observado <= 0 or m <= 0:
+        return 0
+    if abs(l) < _L_CERO:
+        return math.log(valor_observado / m) / s
+    return ((valor_observado / m) ** l - 1) / (l * s)
+
+
+def calcular_limite_lms(m: float, s: float, l: float, z: float = Z_LLN) -> float:
+    """
+    Valor correspondiente a un z-score dado: M*(1 + L*S*z)^(1/L), o M*exp(S*z) si L = 0.
+    Con el z por defecto devuelve el LLN; con -Z_LLN, el ULN.
+    """
+    if abs(l) < _L_CERO:
+        return m * math.exp(s * z)
+    base = 1 + l * s * z
+    return m * base ** (1 / l) if base > 0 else 0.0
+
+
+def calcular_percentil(z_score: float) -> float:
+    """
+    Percentil (0-100) de la distribución normal estándar para el z-score.
+    """
+    return 50 * (1 + math.erf(z_score / math.sqrt(2)))
+
+
+def obtener_s_l_lote(parametro: str, edades: np.ndarray, es_mujer: np.ndarray,
+                     interpolar: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Versión vectorizada de obtener_s_l con los S/L precalculados por edad de cada tabla.
+    """
+    edades = np.asarray(edades, dtype=float)
+    s = np.full(edades.shape, RSE_APROXIMADO[parametro])
+    l = np.zeros(edades.shape)
+    for sexo, mascara in (('Femenino', es_mujer), ('Masculino', ~es_mujer)):
+        if not mascara.any():
+            continue
+        s_l = obtener_tabla(parametro, sexo).s_l_lote(edades[mascara], interpolar)
+        if s_l is not None:
+            s[mascara], l[mascara] = s_l
+    return s, l
+
+
+def z_scores_lms_lote(observado: np.ndarray, m: np.ndarray, s: np.ndarray, l: np.ndarray) -> np.ndarray:
+    """
+    Versión vectorizada de calcular_z_score_lms (NaN se propaga; observado <= 0 da 0).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = observado / m
+        l_seguro = np.where(np.abs(l) < _L_CERO, 1.0, l)
+        z = np.where(np.abs(l) < _L_CERO, np.log(ratio) / s, (ratio ** l_seguro - 1) / (l_seguro * s))
+    return np.where((observado <= 0) & ~np.isnan(m), 0.0, z)
+
+
+def limites_lms_lote(m: np.ndarray, s: np.ndarray, l: np.ndarray, z: float = Z_LLN) -> np.ndarray:
+    """
+    Versión vectorizada de calcular_limite_lms.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        l_seguro = np.where(np.abs(l) < _L_CERO, 1.0, l)
+        base = 1 + l_seguro * s * z
+        potencia = np.where(base > 0, m * np.abs(base) ** (1 / l_seguro), 0.0)
+        return np.where(np.abs(l) < _L_CERO, m * np.exp(s * z), potencia)
+
+
+def percentiles_lote(z_scores: np.ndarray) -> np.ndarray:
+    """
+    Versión vectorizada de calcular_percentil.
+    """
+    return ndtr(z_scores) * 100
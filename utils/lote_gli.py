@@ -0,0 +1,138 @@
+from typing import Dict, Sequence, Union
+
+import numpy as np
+
+from utils.analisis_gli import UMBRALES_SEVERIDAD
+from utils.lms_gli import obtener_s_l_lote, z_scores_lms_lote, limites_lms_lote, percentiles_lote
+from utils.tablas_gli import TablaReferencia, obtener_tabla
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+# Forma de cada ecuación GLI: ln(M) = a + signo*coef*f(altura) + signo*coef*f(edad) + Mspline
+# Cada entrada indica (coeficiente, transformación, signo) para altura y para edad.
+ECUACIONES = {
+    'fev1': {'altura': ('p', 'log', 1), 'edad': ('q', 'log', 1)},
+    'fvc': {'altura': ('p', 'log', 1), 'edad': ('q', 'log', 1)},
+    'fef2575': {'altura': ('p', 'log', 1), 'edad': ('q', 'log', 1)},
+    'dlco': {'altura': ('p', 'log', 1), 'edad': ('q', 'log', -1)},
+    'kco': {'altura': ('p', 'log', -1), 'edad': ('q', 'log', -1)},
+    'va': {'altura': ('p', 'log', 1), 'edad': ('q', 'log', 1)},
+    'tlc': {'altura': ('q', 'log', 1), 'edad': ('p', 'log', 1)},
+    'vc': {'altura': ('q', 'log', 1), 'edad': ('p', 'lineal', 1)},
+    'rv': {'altura': ('q', 'lineal', 1), 'edad': ('p', 'lineal', 1)},
+    'rvtlc': {'altura': ('q', 'lineal', 1), 'edad': ('p', 'lineal', 1)}
+}
+
+# Nombre del parámetro en los resultados -> (clave de tabla, rango de edad válido)
+PARAMETROS_LOTE = {
+    'FEV1': ('fev1', (3, 95)),
+    'FVC': ('fvc', (3, 95)),
+    'FEF25-75%': ('fef2575', (3, 95)),
+    'DLCO': ('dlco', (5, 90)),
+    'KCO': ('kco', (5, 90)),
+    'VA': ('va', (5, 90)),
+    'TLC': ('tlc', (5, 90)),
+    'VC': ('vc', (5, 90)),
+    'RV': ('rv', (5, 90)),
+    'RV/TLC': ('rvtlc', (5, 90))
+}
+
+RANGO_ALTURA = (100, 250)
+
+# Código de severidad para valores no calculables (dato ausente o fuera de rango)
+SIN_SEVERIDAD = -1
+
+
+def _es_mujer(sexo: ArrayLike, n: int) -> np.ndarray:
+    sexo = np.asarray(sexo)
+    if sexo.dtype == bool:
+        return np.broadcast_to(sexo, (n,))
+    return np.broadcast_to(np.char.find(np.char.lower(sexo.astype(str)), 'femenino') >= 0, (n,))
+
+
+def _termino(tabla: TablaReferencia, spec, valores: np.ndarray) -> np.ndarray:
+    coef, transformacion, signo = spec
+    x = np.log(valores) if transformacion == 'log' else valores
+    return signo * getattr(tabla, coef) * x
+
+
+def calcular_valores_esperados_lote(parametro: str, edad: ArrayLike, altura: ArrayLike, sexo: ArrayLike,
+                                    interpolar: bool = False) -> np.ndarray:
+    """
+    Calcula el valor esperado (M) de un parámetro GLI ('fev1', 'dlco', 'rvtlc'...) para N pacientes.
+    `sexo` puede ser un array de textos ('Masculino'/'Femenino') o un array booleano (True = mujer).
+    Con interpolar=True el spline se interpola entre las edades tabuladas (pasos de 0.25 años).
+    """
+    edad = np.asarray(edad, dtype=float)
+    altura = np.asarray(altura, dtype=float)
+    es_mujer = _es_mujer(sexo, len(edad))
+    ecuacion = ECUACIONES[parametro]
+    ln_valor = np.empty_like(edad)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for sexo_tabla, mascara in (('Femenino', es_mujer), ('Masculino', ~es_mujer)):
+            if not mascara.any():
+                continue
+            tabla = obtener_tabla(parametro, sexo_tabla)
+            e = edad[mascara]
+            h = altura[mascara]
+            spline = tabla.splines(e, 'M', interpolar)
+            ln_valor[mascara] = (tabla.a + _termino(tabla, ecuacion['altura'], h)
+                                 + _termino(tabla, ecuacion['edad'], e) + spline)
+        return np.exp(ln_valor)
+
+
+def codigos_severidad_lote(z_scores: np.ndarray) -> np.ndarray:
+    """
+    Versión vectorizada de codigo_severidad: 0 (normal) a 4 (muy severa), -1 si el z-score es NaN.
+    """
+    z_scores = np.asarray(z_scores, dtype=float)
+    codigos = np.zeros(z_scores.shape, dtype=np.int8)
+    for umbral in UMBRALES_SEVERIDAD:
+        codigos += z_scores < umbral
+    codigos[np.isnan(z_scores)] = SIN_SEVERIDAD
+    return codigos
+
+
+def analizar_lote(edad: ArrayLike, altura: ArrayLike, sexo: ArrayLike,
+                  observados: Dict[str, ArrayLike], interpolar: bool = False) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Analiza N estudios de una sola vez con ecuaciones GLI.
+
+    `observados` asocia cada parámetro ('FEV1', 'DLCO', 'RV/TLC'...) a un array de N valores
+    observados (NaN si falta). Devuelve, por parámetro, arrays de 'esperado', 'z_score' (LMS),
+    'lln', 'percentil' y 'severidad' (código de SEVERIDADES, -1 si no calculable). Las filas con
+    edad o altura fuera de rango quedan como NaN, igual que los analizadores por paciente
+    devuelven error.
+    """
+    edad = np.asarray(edad, dtype=float)
+    altura = np.asarray(altura, dtype=float)
+    es_mujer = _es_mujer(sexo, len(edad))
+    altura_valida = (altura >= RANGO_ALTURA[0]) & (altura <= RANGO_ALTURA[1])
+    resultados = {}
+
+    for nombre, valores in observados.items():
+        parametro, (edad_min, edad_max) = PARAMETROS_LOTE[nombre]
+        observado = np.asarray(valores, dtype=float)
+        validos = altura_valida & (edad >= edad_min) & (edad <= edad_max)
+
+        esperado = np.full(edad.shape, np.nan)
+        esperado[validos] = calcular_valores_esperados_lote(
+            parametro, edad[validos], altura[validos], es_mujer[validos], interpolar
+        )
+        if parametro == 'rvtlc':
+            # Igual que en los analizadores: normalizar el esperado si viene en porcentaje
+            esperado = np.where(esperado > 2, esperado / 100, esperado)
+
+        s, l = obtener_s_l_lote(parametro, edad, es_mujer, interpolar)
+        z = z_scores_lms_lote(observado, esperado, s, l)
+
+        resultados[nombre] = {
+            'esperado': esperado,
+            'z_score': z,
+            'lln': limites_lms_lote(esperado, s, l),
+            'percentil': percentiles_lote(z),
+            'severidad': codigos_severidad_lote(z)
+        }
+
+    return resultados
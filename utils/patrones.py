@@ -0,0 +1,198 @@
+# Detección de patrones funcionales a partir de los resultados GLI, sin dependencias de
+# Streamlit (la usan el dashboard, la exportación y el procesamiento por lotes).
+
+
+def detectar_patron_obstructivo(resultados_espiro, resultados_vol):
+    """
+    Detecta patrón obstructivo basado en criterios clínicos
+    """
+    if 'error' in resultados_espiro or 'error' in resultados_vol:
+        return False, "Datos insuficientes"
+    
+    # Criterios para patrón obstructivo
+    fev1_z = resultados_espiro.get('FEV1', {}).get('z_score', 0)
+    fvc_z = resultados_espiro.get('FVC', {}).get('z_score', 0)
+    fef_z = resultados_espiro.get('FEF25-75%', {}).get('z_score', 0)
+    fev1_fvc_ratio = resultados_espiro.get('FEV1/FVC', {}).get('observado', 0)
+    
+    # Criterios de volúmenes
+    tlc_z = resultados_vol.get('TLC', {}).get('z_score', 0)
+    rv_z = resultados_vol.get('RV', {}).get('z_score', 0)
+    rv_tlc_z = resultados_vol.get('RV/TLC', {}).get('z_score', 0)
+    
+    # Patrón obstructivo: FEV1 < LLN, FEV1/FVC < LLN, TLC normal o aumentado
+    es_obstructivo = (
+        fev1_z < -1.64 and  # FEV1 reducido
+        fev1_fvc_ratio < 0.7 and  # Ratio FEV1/FVC reducido
+        tlc_z >= -1.64  # TLC normal o aumentado
+    )
+    
+    severidad = "Leve"
+    if fev1_z < -2.5:
+        severidad = "Moderado"
+    if fev1_z < -3.0:
+        severidad = "Severo"
+    
+    return es_obstructivo, f"Patrón obstructivo {severidad}"
+
+def detectar_patron_restrictivo(resultados_espiro, resultados_vol):
+    """
+    Detecta patrón restrictivo basado en criterios clínicos
+    """
+    if 'error' in resultados_espiro or 'error' in resultados_vol:
+        return False, "Datos insuficientes"
+    
+    # Criterios para patrón restrictivo
+    fev1_z = resultados_espiro.get('FEV1', {}).get('z_score', 0)
+    fvc_z = resultados_espiro.get('FVC', {}).get('z_score', 0)
+    fev1_fvc_ratio = resultados_espiro.get('FEV1/FVC', {}).get('observado', 0)
+    
+    # Criterios de volúmenes
+    tlc_z = resultados_vol.get('TLC', {}).get('z_score', 0)
+    vc_z = resultados_vol.get('VC', {}).get('z_score', 0)
+    
+    # Patrón restrictivo: FVC < LLN, TLC < LLN, FEV1/FVC normal o aumentado
+    es_restrictivo = (
+        fvc_z < -1.64 and  # FVC reducido
+        tlc_z < -1.64 and  # TLC reducido
+        fev1_fvc_ratio >= 0.7  # Ratio FEV1/FVC normal o aumentado
+    )
+    
+    severidad = "Leve"
+    if tlc_z < -2.5:
+        severidad = "Moderado"
+    if tlc_z < -3.0:
+        severidad = "Severo"
+    
+    return es_restrictivo, f"Patrón restrictivo {severidad}"
+
+def detectar_patron_mixto(resultados_espiro, resultados_vol):
+    """
+    Detecta patrón mixto (obstructivo + restrictivo)
+    """
+    es_obstructivo, _ = detectar_patron_obstructivo(resultados_espiro, resultados_vol)
+    es_restrictivo, _ = detectar_patron_restrictivo(resultados_espiro, resultados_vol)
+    
+    if es_obstructivo and es_restrictivo:
+        return True, "Patrón mixto (obstructivo + restrictivo)"
+    
+    return False, "No es patrón mixto"
+
+def detectar_alteracion_difusion(resultados_dlco):
+    """
+    Detecta alteración de la difusión
+    """
+    if 'error' in resultados_dlco:
+        return False, "Datos insuficientes"
+    
+    dlco_z = resultados_dlco.get('DLCO', {}).get('z_score', 0)
+    kco_z = resultados_dlco.get('KCO', {}).get('z_score', 0)
+    va_z = resultados_dlco.get('VA', {}).get('z_score', 0)
+    
+    # Alteración de difusión: DLCO < LLN
+    es_alteracion = dlco_z < -1.64
+    
+    if es_alteracion:
+        severidad = "Leve"
+        if dlco_z < -2.5:
+            severidad = "Moderada"
+        if dlco_z < -3.0:
+            severidad = "Severa"
+        
+        # Determinar tipo de alteración
+        if dlco_z < -1.64 and va_z < -1.64:
+            tipo = f"Alteración de difusión {severidad} con reducción de volumen alveolar"
+        elif dlco_z < -1.64 and kco_z < -1.64:
+            tipo = f"Alteración de difusión {severidad} con reducción de transferencia"
+        else:
+            tipo = f"Alteración de difusión {severidad}"
+        
+        return True, tipo
+    
+    return False, "Difusión normal"
+
+def detectar_broncodilatacion_significativa(datos):
+    """
+    Detecta respuesta significativa a broncodilatador usando doble umbral y preferencia FEV1.
+    """
+    fev1_pre = datos.get('FEV1 pre')
+    fev1_post = datos.get('FEV1 post')
+    fvc_pre = datos.get('FVC pre')
+    fvc_post = datos.get('FVC post')
+    
+    if fev1_pre and fev1_post and fvc_pre and fvc_post:
+        # Verificar que no sean "Valor no encontrado"
+        if (fev1_pre == 'Valor no encontrado' or fev1_post == 'Valor no encontrado' or
+            fvc_pre == 'Valor no encontrado' or fvc_post == 'Valor no encontrado'):
+            return False, "Datos de broncodilatación insuficientes"
+        try:
+            fev1_pre = float(fev1_pre)
+            fev1_post = float(fev1_post)
+            fvc_pre = float(fvc_pre)
+            fvc_post = float(fvc_post)
+            
+            # Cambios porcentuales y absolutos
+            cambio_fev1 = ((fev1_post - fev1_pre) / fev1_pre) * 100
+            cambio_fvc = ((fvc_post - fvc_pre) / fvc_pre) * 100
+            delta_fev1_ml = (fev1_post - fev1_pre) * 1000
+            delta_fvc_ml = (fvc_post - fvc_pre) * 1000
+            
+            # Doble umbral
+            respuesta_fev1 = cambio_fev1 >= 12 and delta_fev1_ml >= 200
+            respuesta_fvc = cambio_fvc >= 12 and delta_fvc_ml >= 200
+            respuesta_fev1_400 = delta_fev1_ml >= 400
+            
+            if respuesta_fev1:
+                if respuesta_fev1_400:
+                    return True, f"Broncodilatación positiva por FEV₁ (+{cambio_fev1:.1f}%, {delta_fev1_ml:.0f} mL, >400 mL: alta probabilidad de asma)"
+                return True, f"Broncodilatación positiva por FEV₁ (+{cambio_fev1:.1f}%, {delta_fev1_ml:.0f} mL)"
+            elif respuesta_fvc:
+                return True, f"Broncodilatación positiva por FVC (+{cambio_fvc:.1f}%, {delta_fvc_ml:.0f} mL)"
+            else:
+                return False, f"Sin respuesta significativa: FEV₁ +{cambio_fev1:.1f}%, {delta_fev1_ml:.0f} mL; FVC +{cambio_fvc:.1f}%, {delta_fvc_ml:.0f} mL. No usar FEV₁/FVC para determinar positividad."
+        except (ValueError, ZeroDivisionError):
+            return False, "Error en cálculo de broncodilatación"
+    return False, "Datos de broncodilatación insuficientes"
+
+def generar_diagnostico_patron(resultados_espiro, resultados_dlco, resultados_vol, datos):
+    """
+    Genera diagnóstico de patrón basado en todos los resultados
+    """
+    diagnostico = []
+    patrones = []
+    
+    # Detectar patrones ventilatorios
+    es_obstructivo, desc_obstructivo = detectar_patron_obstructivo(resultados_espiro, resultados_vol)
+    es_restrictivo, desc_restrictivo = detectar_patron_restrictivo(resultados_espiro, resultados_vol)
+    es_mixto, desc_mixto = detectar_patron_mixto(resultados_espiro, resultados_vol)
+    
+    if es_mixto:
+        patrones.append("🔄 Mixto")
+        diagnostico.append(desc_mixto)
+    elif es_obstructivo:
+        patrones.append("🫁 Obstructivo")
+        diagnostico.append(desc_obstructivo)
+    elif es_restrictivo:
+        patrones.append("📏 Restrictivo")
+        diagnostico.append(desc_restrictivo)
+    else:
+        patrones.append("✅ Normal")
+        diagnostico.append("Patrón ventilatorio normal")
+    
+    # Detectar alteración de difusión
+    es_alteracion_difusion, desc_difusion = detectar_alteracion_difusion(resultados_dlco)
+    if es_alteracion_difusion:
+        patrones.append("🩸 Alteración difusión")
+        diagnostico.append(desc_difusion)
+    else:
+        diagnostico.append("Difusión normal")
+    
+    # Detectar broncodilatación
+    es_broncodilatacion, desc_broncodilatacion = detectar_broncodilatacion_significativa(datos)
+    if es_broncodilatacion:
+        patrones.append("💨 Broncodilatación +")
+        diagnostico.append(desc_broncodilatacion)
+    else:
+        diagnostico.append("Sin respuesta significativa a broncodilatador")
+    
+    return patrones, diagnostico
@@ -0,0 +1,120 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Registro de plantillas de informe: cada equipo de laboratorio declara sus etiquetas y la
+# semántica de sus columnas, y extraccion compila un parser por plantilla. La plantilla de cada
+# PDF se detecta por la cabecera de su primera página.
+
+# Caracteres del inicio de la primera página en los que se buscan las huellas de la plantilla
+LONGITUD_CABECERA = 2000
+
+# Nombres de variable que delimitan el bloque de valores de un parámetro
+VARIABLES = ('fvc', 'fev1', 'fev1/fvc', 'fef25-75', 'pef', 'fet', 'dlco', 'dladj', 'va', 'dlco/va', 'kco', 'tlc', 'vcmax', 'rv', 'rv/tlc')
+
+# Etiquetas de parámetros: (clave en datos, etiqueta en minúsculas, nombre para delimitar el bloque).
+# El orden es la prioridad cuando una línea contiene varias etiquetas.
+ETIQUETAS = (
+    ('FVC', 'fvc [l]', 'fvc'),
+    ('FEV1', 'fev1 [l]', 'fev1'),
+    ('FEV1/FVC', 'fev1/fvc', 'fev1/fvc'),
+    ('FEF25-75%', 'fef25-75', 'fef25-75'),
+    ('DLCO/VA', 'dlco/va', None),
+    ('DLCO', 'dlco', 'dlco'),
+    ('VA', 'va sb [l]', 'va'),
+    ('TLC', 'tlc sb [l]', 'tlc'),
+    ('VC', 'vcmax [l]', None),
+    ('RV', 'rv sb [l]', 'rv'),
+    ('RV/TLC', 'rv/tlc sb', 'rv/tlc')
+)
+
+# Columnas pre/post según cuántos números tenga el bloque: (mínimo de números, índice pre, índice
+# post o None). Con 5 o más, Pred LLN Pre %Pred Post...; con 3-4, Pred LLN Pre; con 1-2, el primero.
+COLUMNAS_PRE_POST = (
+    (5, 0, 4),
+    (3, 2, None),
+    (1, 0, None)
+)
+
+# Texto de cabecera de tabla (minúsculas) -> columna, para la extracción por coordenadas.
+# '%pred' se desdobla según vaya antes o después de 'post'.
+CABECERAS = {
+    'pred': 'pred',
+    'teor': 'pred',
+    'teór': 'pred',
+    'ref': 'pred',
+    'lln': 'lln',
+    'lin': 'lln',
+    'pre': 'pre',
+    'actual': 'pre',
+    '%pred': '%pred',
+    '%teor': '%pred',
+    '%teór': '%pred',
+    'post': 'post',
+    'z-score': 'z',
+    'zscore': 'z',
+    'z': 'z'
+}
+
+
+@dataclass(frozen=True)
+class Plantilla:
+    """
+    Formato de informe de un equipo de laboratorio.
+    """
+    nombre: str
+    huellas: Tuple[str, ...] = ()  # textos (minúsculas) que deben aparecer en la cabecera de la primera página
+    etiquetas: Tuple[Tuple[str, str, Optional[str]], ...] = ETIQUETAS
+    variables: Tuple[str, ...] = VARIABLES
+    columnas_pre_post: Tuple[Tuple[int, int, Optional[int]], ...] = COLUMNAS_PRE_POST
+    cabeceras: Tuple[Tuple[str, str], ...] = tuple(CABECERAS.items())
+    en_linea: Tuple[str, ...] = ('VC',)  # parámetros con el valor en la misma línea de la etiqueta
+    lineas_siguientes: Tuple[str, ...] = ('DLCO/VA',)  # valor en alguna de las 4 líneas siguientes
+    primera_aparicion: Tuple[str, ...] = ('DLCO', 'DLCO/VA')  # solo cuenta la primera vez que aparecen
+    paginas: Tuple[int, ...] = ()  # páginas a leer primero (índices desde 0; -1 es la última)
+
+
+PLANTILLA_POR_DEFECTO = Plantilla(nombre='por_defecto')
+
+# Plantillas registradas por orden de registro; la de por defecto no tiene huellas y se usa
+# cuando ninguna otra coincide
+PLANTILLAS: Dict[str, Plantilla] = {PLANTILLA_POR_DEFECTO.nombre: PLANTILLA_POR_DEFECTO}
+
+
+def registrar_plantilla(plantilla: Plantilla) -> Plantilla:
+    """
+    Añade (o reemplaza) una plantilla en el registro.
+    """
+    PLANTILLAS[plantilla.nombre] = plantilla
+    return plantilla
+
+
+def firma_registro() -> str:
+    """
+    Huella corta del contenido del registro (cambia al registrar o modificar una plantilla).
+    """
+    return hashlib.sha256(repr(tuple(PLANTILLAS.values())).encode()).hexdigest()[:12]
+
+
+def obtener_plantilla(plantilla=None) -> Plantilla:
+    """
+    Devuelve la plantilla a partir de su nombre, la propia plantilla o None (por defecto).
+    """
+    if plantilla is None:
+        return PLANTILLA_POR_DEFECTO
+    if isinstance(plantilla, Plantilla):
+        return plantilla
+    if plantilla not in PLANTILLAS:
+        raise ValueError(f"Plantilla no registrada: {plantilla}")
+    return PLANTILLAS[plantilla]
+
+
+def detectar_plantilla(texto_primera_pagina: str) -> Plantilla:
+    """
+    Primera plantilla registrada cuyas huellas aparecen todas en la cabecera de la primera página.
+    """
+    cabecera = texto_primera_pagina[:LONGITUD_CABECERA].lower()
+    for plantilla in PLANTILLAS.values():
+        if plantilla.huellas and all(huella in cabecera for huella in plantilla.huellas):
+            return plantilla
+    return PLANTILLA_POR_DEFECTO
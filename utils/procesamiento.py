@@ -0,0 +1,134 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.analisis_gli import analizar_estudio
+from utils.cache_extraccion import extraer_pdf
+from utils.instrumentacion import medir
+
+# Flujo PDF -> texto -> datos -> análisis GLI, sin dependencias de Streamlit
+# (lo usan tanto la app como el procesamiento por lotes en procesos hijos).
+
+# Archivos subidos que se procesan a la vez en la app. Son hilos y no procesos: comparten los
+# cachés en memoria (extracción, tablas GLI) y reciben directamente los UploadedFile.
+WORKERS_INGESTA = 4
+
+
+def mapear_claves_pre(datos):
+    """
+    Mapea automáticamente los valores extraídos a las claves con sufijo 'pre' si no existen.
+    """
+    claves = ['DLCO', 'KCO', 'VA', 'TLC', 'VC', 'RV', 'RV/TLC', 'FEV1', 'FVC', 'FEF25-75%']
+    for clave in claves:
+        if clave in datos and datos[clave] not in [None, '', 'Valor no encontrado']:
+            clave_pre = clave + ' pre' if clave not in ['RV/TLC'] else 'RV/TLC pre'
+            if clave_pre not in datos or datos[clave_pre] in [None, '', 'Valor no encontrado']:
+                datos[clave_pre] = datos[clave]
+    return datos
+
+
+def fecha_desde_nombre(nombre: str) -> str:
+    """
+    Fecha del estudio tomada del prefijo del nombre de archivo ('2024-03-01_informe.pdf').
+    """
+    return nombre.split('_')[0] if '_' in nombre else "Fecha N/A"
+
+
+def analizar_datos(datos: Dict, archivo: str) -> Optional[Dict]:
+    """
+    Analiza los datos extraídos de un informe y devuelve la entrada
+    {'archivo', 'fecha', 'datos', 'espiro', 'dlco', 'vol'}, o None si faltan edad, altura o sexo.
+    """
+    if not (datos.get('Edad') and datos.get('Altura') and datos.get('Sexo')):
+        return None
+    if datos['Edad'] == 'Valor no encontrado' or datos['Altura'] == 'Valor no encontrado':
+        return None
+    estudio = analizar_estudio(datos)
+    return {
+        'archivo': archivo,
+        'fecha': fecha_desde_nombre(archivo),
+        'datos': datos,
+        'espiro': estudio['espiro'],
+        'dlco': estudio['dlco'],
+        'vol': estudio['vol']
+    }
+
+
+def _nombre_archivo(origen) -> str:
+    return os.path.basename(origen) if isinstance(origen, str) else getattr(origen, 'name', '')
+
+
+def procesar_pdf(origen, archivo: Optional[str] = None, modo: str = 'texto') -> Optional[Dict]:
+    """
+    Extrae (con caché por contenido) y analiza un PDF de funcionalismo pulmonar (ver analizar_datos).
+    modo: 'texto' o 'tabla' (ver extraer_pdf).
+    """
+    if archivo is None:
+        archivo = _nombre_archivo(origen)
+    _, datos = extraer_pdf(origen, modo=modo)
+    datos = mapear_claves_pre(datos)
+    return analizar_datos(datos, archivo)
+
+
+@medir('ingesta.archivo')
+def _ingerir(origen, indice: int, estados: List[str], modo: str) -> Dict:
+    """
+    Lectura, extracción y análisis de un archivo subido. Los errores se devuelven en el resultado
+    para no interrumpir el resto de archivos.
+    """
+    archivo = _nombre_archivo(origen)
+    inicio = time.perf_counter()
+    try:
+        estados[indice] = 'extrayendo'
+        paginas, datos = extraer_pdf(origen, modo=modo)
+        datos = mapear_claves_pre(datos)
+        estados[indice] = 'analizando'
+        estudio = analizar_datos(datos, archivo)
+        estados[indice] = 'listo'
+        return {
+            'archivo': archivo,
+            'paginas': paginas,
+            'datos': datos,
+            'estudio': estudio,
+            'error': None,
+            'segundos': time.perf_counter() - inicio
+        }
+    except Exception as e:
+        estados[indice] = 'error'
+        return {
+            'archivo': archivo,
+            'paginas': [],
+            'datos': {},
+            'estudio': None,
+            'error': str(e),
+            'segundos': time.perf_counter() - inicio
+        }
+
+
+def ingerir_pdfs(archivos: Sequence, workers: Optional[int] = None, modo: str = 'texto', intervalo: float = 0.25,
+                 al_esperar: Optional[Callable[[List[str]], None]] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    Procesa los archivos en un pool de hilos acotado y devuelve (índice, resultado) en el orden en
+    que terminan, de modo que el primer resultado no espera al archivo más lento. Mientras quedan
+    pendientes se llama a al_esperar(estados) como mucho cada `intervalo` segundos con la etapa de
+    cada archivo ('en cola', 'extrayendo', 'analizando', 'listo' o 'error'), desde el hilo que itera.
+    El resultado es {'archivo', 'paginas', 'datos', 'estudio', 'error', 'segundos'}, donde
+    'estudio' es la entrada de analizar_datos (None si faltan datos demográficos).
+    """
+    if not archivos:
+        return
+    estados = ['en cola'] * len(archivos)
+    executor = ThreadPoolExecutor(max_workers=min(workers or WORKERS_INGESTA, len(archivos)))
+    try:
+        futuros = {executor.submit(_ingerir, origen, i, estados, modo): i for i, origen in enumerate(archivos)}
+        pendientes = set(futuros)
+        while pendientes:
+            terminados, pendientes = wait(pendientes, timeout=intervalo, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                yield futuros[futuro], futuro.result()
+            if pendientes and al_esperar is not None:
+                al_esperar(estados)
+    finally:
+        # Si se deja de iterar (p.ej. Streamlit relanza el script) no se empiezan los pendientes
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,230 @@
+import io
+import re
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Mapping, Optional
+from xml.sax.saxutils import escape
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image as RLImage
+from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from utils.analisis_gli import generar_interpretacion_general
+from utils.graficos import ANCHO_FIGURA_Z, grafico_z_scores
+from utils.instrumentacion import medir
+
+# Reporte PDF de un estudio, sin dependencias de Streamlit (lo usan el botón de cada archivo y la
+# exportación masiva). Estilos de párrafo y de tabla se construyen una vez al importar el módulo y
+# se comparten entre reportes: ReportLab no los modifica al componer el documento.
+
+PIE_REPORTE = "© 2025 PulmoReport AI - Diseñado por Edmundo Rosales Mayor"
+
+_ESTILOS = getSampleStyleSheet()
+ESTILO_NORMAL = _ESTILOS['Normal']
+ESTILO_TITULO = ParagraphStyle(
+    'CustomTitle',
+    parent=_ESTILOS['Heading1'],
+    fontSize=18,
+    spaceAfter=30,
+    alignment=1,  # Centrado
+    textColor=colors.HexColor('#1f77b4')
+)
+ESTILO_SUBTITULO = ParagraphStyle(
+    'CustomSubtitle',
+    parent=_ESTILOS['Heading2'],
+    fontSize=14,
+    spaceAfter=20,
+    textColor=colors.HexColor('#2c3e50')
+)
+ESTILO_PIE = ParagraphStyle('Footer', fontSize=8, alignment=1, textColor=colors.grey)
+
+ESTILO_TABLA_PACIENTE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+ESTILO_TABLA_RESULTADOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+ANCHOS_TABLA_PACIENTE = [2 * inch, 3 * inch]
+ANCHOS_TABLA_RESULTADOS = [1.2 * inch, 1 * inch, 1 * inch, 1 * inch, 2.8 * inch]
+CABECERA_RESULTADOS = ['Parámetro', 'Observado', 'Esperado', 'Z-Score', 'Interpretación']
+ANCHO_GRAFICO = 6.5 * inch
+# Gráficos a 300 ppp en el tamaño impreso, opacos (sin canal alfa que incrustar como máscara)
+DPI_GRAFICOS = round(300 * ANCHO_GRAFICO / inch / ANCHO_FIGURA_Z)
+
+# Secciones de resultados: (título, título del gráfico de puntuaciones Z, parámetros)
+SECCIONES_RESULTADOS = [
+    ('RESULTADOS DE ESPIROMETRÍA', 'Análisis de Espirometría - Puntuaciones Z', ['FEV1', 'FVC', 'FEF25-75%']),
+    ('RESULTADOS DE DLCO', 'Análisis de DLCO - Puntuaciones Z', ['DLCO', 'KCO', 'VA']),
+    ('RESULTADOS DE VOLÚMENES PULMONARES', 'Análisis de Volúmenes Pulmonares - Puntuaciones Z',
+     ['TLC', 'VC', 'RV', 'RV/TLC'])
+]
+
+# Las fuentes estándar de PDF (Helvetica) no tienen emojis ni algunos símbolos que usan los textos
+# de interpretación: se sustituyen o se quitan para que no aparezcan como cuadros negros
+_SUSTITUCIONES_PDF = str.maketrans({'≥': '>=', '≤': '<=', '₁': '1', '₂': '2', '‍': None, '️': None})
+_NEGRITA = re.compile(r'\*\*(.+?)\*\*')
+
+
+def texto_pdf(texto: str) -> str:
+    """
+    Texto con el markdown de las interpretaciones (**negrita** y saltos de línea) como marcado de
+    Paragraph, sin los caracteres que las fuentes estándar no pueden dibujar.
+    """
+    texto = str(texto).translate(_SUSTITUCIONES_PDF)
+    texto = ''.join(c for c in texto if ord(c) < 0x2000 or c in '€•–—‘’“”…')
+    texto = _NEGRITA.sub(r'<b>\1</b>', escape(texto.strip()))
+    return texto.replace('\n', '<br/>')
+
+
+def _tamano_png(png: bytes):
+    """
+    (ancho, alto) en píxeles leídos de la cabecera IHDR, sin decodificar la imagen.
+    """
+    return struct.unpack('>II', png[16:24])
+
+
+def _imagen_grafico(titulo: str, resultados: Mapping) -> Optional[RLImage]:
+    png = grafico_z_scores(titulo, resultados, destino='pdf', dpi=DPI_GRAFICOS, transparente=False)
+    if png is None:
+        return None
+    ancho, alto = _tamano_png(png)
+    return RLImage(io.BytesIO(png), width=ANCHO_GRAFICO, height=ANCHO_GRAFICO * alto / ancho)
+
+
+def _tabla_resultados(resultados: Mapping, parametros: List[str]) -> Optional[Table]:
+    filas = [CABECERA_RESULTADOS]
+    for param in parametros:
+        if param in resultados:
+            datos_analisis = resultados[param]
+            filas.append([
+                param,
+                f"{datos_analisis['observado']:.2f}",
+                f"{datos_analisis['esperado']:.2f}",
+                f"{datos_analisis['z_score']:.2f}",
+                datos_analisis['interpretacion']
+            ])
+    if len(filas) == 1:
+        return None
+    return Table(filas, colWidths=ANCHOS_TABLA_RESULTADOS, style=ESTILO_TABLA_RESULTADOS)
+
+
+# Flujos del PDF solo comprimidos, sin la codificación ASCII85 (texto imprimible), que ReportLab
+# hace en Python puro y que era la mayor parte del tiempo de incrustar los gráficos. ReportLab solo
+# lo permite como opción global (rl_config.useA85): se desactiva mientras haya algún reporte
+# componiéndose (los de la exportación masiva se componen en paralelo) y al terminar el último se
+# restaura el valor anterior
+_lock_a85 = threading.Lock()
+_componiendo = 0
+_use_a85_anterior = None
+
+
+@contextmanager
+def _sin_ascii85():
+    global _componiendo, _use_a85_anterior
+    with _lock_a85:
+        if _componiendo == 0:
+            _use_a85_anterior = rl_config.useA85
+            rl_config.useA85 = 0
+        _componiendo += 1
+    try:
+        yield
+    finally:
+        with _lock_a85:
+            _componiendo -= 1
+            if _componiendo == 0:
+                rl_config.useA85 = _use_a85_anterior
+
+
+def _valido(resultados) -> bool:
+    return bool(resultados) and "error" not in resultados
+
+
+@medir('reporte.pdf')
+def generar_reporte_pdf(datos: Dict, resultados_espiro: Mapping, resultados_dlco: Mapping, resultados_vol: Mapping,
+                        interpretacion_bd: Optional[str] = None, recomendaciones: Optional[str] = None,
+                        titulo: str = "PulmoReport AI") -> bytes:
+    """
+    Reporte PDF (A4) del análisis de función pulmonar de un estudio: datos del paciente,
+    diagnóstico, tabla y gráfico de puntuaciones Z por sección, broncodilatación y recomendaciones.
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=titulo, author="PulmoReport AI")
+    story = [
+        Paragraph("PulmoReport AI", ESTILO_TITULO),
+        Paragraph("Análisis Inteligente de Funcionalismo Pulmonar", ESTILO_NORMAL),
+        Spacer(1, 20),
+        Paragraph("INFORMACIÓN DEL PACIENTE", ESTILO_SUBTITULO)
+    ]
+
+    # Información del paciente
+    if datos.get('Edad') and datos.get('Altura') and datos.get('Sexo'):
+        info_paciente = [
+            ['Edad', datos.get('Edad', 'N/A')],
+            ['Altura', f"{datos.get('Altura', 'N/A')} cm"],
+            ['Sexo', datos.get('Sexo', 'N/A')],
+            ['Peso', f"{datos['Peso']} kg" if datos.get('Peso') else 'N/A']
+        ]
+        story.append(Table(info_paciente, colWidths=ANCHOS_TABLA_PACIENTE, style=ESTILO_TABLA_PACIENTE))
+    story.append(Spacer(1, 20))
+
+    # Diagnóstico detallado
+    story.append(Paragraph("DIAGNÓSTICO DETALLADO", ESTILO_SUBTITULO))
+    try:
+        interpretacion_general = generar_interpretacion_general(resultados_espiro)
+    except Exception as e:
+        interpretacion_general = f"Error generando diagnóstico: {str(e)}"
+    story.append(Paragraph(texto_pdf(interpretacion_general), ESTILO_NORMAL))
+    story.append(Spacer(1, 20))
+
+    # Resultados por sección: tabla y gráfico de puntuaciones Z
+    for resultados, (seccion, titulo_grafico, parametros) in zip(
+            (resultados_espiro, resultados_dlco, resultados_vol), SECCIONES_RESULTADOS):
+        if not _valido(resultados):
+            continue
+        tabla = _tabla_resultados(resultados, parametros)
+        if tabla is None:
+            continue
+        bloque = [Paragraph(seccion, ESTILO_SUBTITULO), tabla]
+        imagen = _imagen_grafico(titulo_grafico, {p: resultados[p] for p in parametros if p in resultados})
+        if imagen is not None:
+            bloque += [Spacer(1, 10), imagen]
+        # Título, tabla y gráfico de la sección en la misma página
+        story.append(KeepTogether(bloque))
+        story.append(Spacer(1, 20))
+
+    # Interpretación de broncodilatación
+    if interpretacion_bd:
+        story.append(Paragraph("ANÁLISIS DE BRONCODILATACIÓN", ESTILO_SUBTITULO))
+        story.append(Paragraph(texto_pdf(interpretacion_bd), ESTILO_NORMAL))
+        story.append(Spacer(1, 20))
+
+    # Recomendaciones
+    if recomendaciones and _valido(resultados_espiro):
+        story.append(Paragraph("ANÁLISIS CLÍNICO", ESTILO_SUBTITULO))
+        story.append(Paragraph(texto_pdf(recomendaciones), ESTILO_NORMAL))
+        story.append(Spacer(1, 20))
+
+    story.append(Paragraph(PIE_REPORTE, ESTILO_PIE))
+    with _sin_ascii85():
+        doc.build(story)
+    return buffer.getvalue()
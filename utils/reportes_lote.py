@@ -0,0 +1,254 @@
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.procesamiento import WORKERS_INGESTA, procesar_pdf
+from utils.reporte_pdf import generar_reporte_pdf
+
+# Reportes PDF de muchos estudios en un solo archivo (ZIP con un PDF por estudio o un único PDF
+# combinado). Los reportes se generan en un pool de workers y se escriben en el destino en el orden
+# de entrada a medida que terminan; solo hay 2 reportes por worker en vuelo o esperando a ser
+# escritos, así que la memoria no depende del número de estudios.
+
+_FIN = object()
+
+# Tamaño a partir del cual la exportación de la app pasa el archivo de reportes a disco
+MAX_BYTES_REPORTES_EN_MEMORIA = 32 * 1024 * 1024
+
+TIPOS_MIME_REPORTES = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf'
+}
+
+
+def nombre_reporte(archivo: Optional[str]) -> str:
+    """
+    '2024-03-01_informe.pdf' -> 'PulmoReport_2024-03-01_informe.pdf' (como el botón de cada archivo).
+    """
+    base = os.path.basename(archivo or 'estudio')
+    return f"PulmoReport_{base[:-4] if base.lower().endswith('.pdf') else base}.pdf"
+
+
+def reporte_estudio(estudio: Dict) -> Tuple[str, bytes]:
+    """
+    (nombre, PDF) del reporte de una entrada de analizar_datos o de estudios_desde_cohorte.
+    """
+    nombre = nombre_reporte(estudio.get('archivo'))
+    pdf = generar_reporte_pdf(estudio['datos'], estudio['espiro'], estudio['dlco'], estudio['vol'],
+                              titulo=nombre[:-4])
+    return nombre, pdf
+
+
+def reporte_desde_pdf(ruta: str) -> Tuple[str, bytes]:
+    """
+    (nombre, PDF) del reporte de un informe de funcionalismo: extracción, análisis y reporte en el
+    mismo worker.
+    """
+    estudio = procesar_pdf(ruta)
+    if estudio is None:
+        raise ValueError("Faltan edad, altura o sexo")
+    return reporte_estudio(estudio)
+
+
+def generar_reportes(tareas: Iterable, crear: Callable[[Any], Tuple[str, bytes]] = reporte_estudio,
+                     workers: Optional[int] = None,
+                     procesos: bool = False) -> Iterator[Tuple[Any, Optional[str], Optional[bytes], Optional[str]]]:
+    """
+    Aplica crear(tarea) -> (nombre, PDF) a cada tarea en un pool y devuelve (tarea, nombre, PDF, error)
+    en el orden de `tareas`, consumiéndolas a medida que se libera sitio en la ventana de
+    2 * workers. Con procesos=True el pool es de procesos (para el CLI: `crear` y las tareas deben
+    poder serializarse); por defecto es de hilos, que comparten los cachés de la app.
+    """
+    workers = workers or ((os.cpu_count() or 1) if procesos else WORKERS_INGESTA)
+    executor = (ProcessPoolExecutor if procesos else ThreadPoolExecutor)(max_workers=workers)
+    try:
+        en_vuelo = deque()
+        pendientes = iter(tareas)
+        agotado = False
+        while True:
+            while not agotado and len(en_vuelo) < 2 * workers:
+                tarea = next(pendientes, _FIN)
+                if tarea is _FIN:
+                    agotado = True
+                else:
+                    en_vuelo.append((tarea, executor.submit(crear, tarea)))
+            if not en_vuelo:
+                break
+            tarea, futuro = en_vuelo.popleft()
+            try:
+                nombre, pdf = futuro.result()
+            except Exception as e:
+                yield tarea, None, None, str(e)
+            else:
+                yield tarea, nombre, pdf, None
+    finally:
+        # Si se deja de iterar no se empiezan los reportes pendientes
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class EscritorReportesZIP:
+    """
+    Un PDF por estudio dentro de un ZIP. Los PDF ya van comprimidos, así que se guardan sin volver
+    a comprimir. `destino` puede ser una ruta o un archivo binario (también no posicionable).
+    """
+
+    def __init__(self, destino):
+        self.zip = zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED)
+        self.nombres = set()
+
+    def agregar(self, nombre: str, pdf: bytes) -> None:
+        base, extension = os.path.splitext(nombre)
+        sufijo = 1
+        while nombre in self.nombres:
+            sufijo += 1
+            nombre = f"{base}_{sufijo}{extension}"
+        self.nombres.add(nombre)
+        self.zip.writestr(nombre, pdf)
+
+    def cerrar(self) -> None:
+        self.zip.close()
+
+
+_REFERENCIA = re.compile(rb'(\d+) 0 R\b')
+
+
+def _objetos_pdf(pdf: bytes) -> Tuple[Dict[int, bytes], int, Optional[int]]:
+    """
+    ({número: cuerpo entre 'N 0 obj' y 'endobj'}, número del catálogo, número de /Info) de un PDF
+    con tabla xref clásica y sin flujos de objetos, como los que escribe ReportLab.
+    """
+    inicio_xref = int(pdf[pdf.rindex(b'startxref') + 9:].split()[0])
+    lineas = pdf[inicio_xref:].split(b'\n', 2)
+    if lineas[0].strip() != b'xref':
+        raise ValueError("El reporte no tiene una tabla xref clásica")
+    primero, cantidad = (int(x) for x in lineas[1].split())
+    entradas = lineas[2][:20 * cantidad]
+    posiciones = {}
+    for i in range(cantidad):
+        entrada = entradas[20 * i:20 * i + 20].split()
+        if entrada[2] == b'n':
+            posiciones[primero + i] = int(entrada[0])
+    trailer = pdf[inicio_xref + len(lineas[0]) + len(lineas[1]) + 2 + 20 * cantidad:]
+    raiz = int(re.search(rb'/Root (\d+) 0 R', trailer).group(1))
+    info = re.search(rb'/Info (\d+) 0 R', trailer)
+
+    limites = sorted(posiciones.values()) + [inicio_xref]
+    siguiente = dict(zip(limites, limites[1:]))
+    objetos = {}
+    for numero, posicion in posiciones.items():
+        segmento = pdf[posicion:siguiente[posicion]]
+        cabecera = f'{numero} 0 obj'.encode()
+        if not segmento.startswith(cabecera):
+            raise ValueError(f"Posición xref incorrecta para el objeto {numero}")
+        objetos[numero] = segmento[len(cabecera):segmento.rindex(b'endobj')].strip(b'\r\n') + b'\n'
+    return objetos, raiz, int(info.group(1)) if info else None
+
+
+class EscritorReportesPDF:
+    """
+    Todos los reportes en un único PDF, escrito a medida que llegan. Los objetos de cada reporte se
+    copian al destino con números nuevos, y su árbol de páginas cuelga del árbol raíz; en memoria
+    solo quedan la posición de cada objeto (para la tabla xref final) y la raíz de páginas de cada
+    reporte. Admite los PDF de generar_reporte_pdf (ReportLab: xref clásica, sin flujos de objetos).
+    `destino` puede ser una ruta o un archivo binario (también no posicionable).
+    """
+
+    def __init__(self, destino):
+        self.propio = isinstance(destino, (str, os.PathLike))
+        self.archivo = open(destino, 'wb') if self.propio else destino
+        self.posicion = 0
+        self.posiciones: List[Optional[int]] = []  # posición del objeto número i + 1
+        self.kids: List[int] = []
+        self.paginas = 0
+        self._escribir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        # El árbol de páginas raíz se escribe al cerrar, pero los reportes ya lo referencian
+        self.numero_paginas = self._reservar()
+
+    def _escribir(self, datos: bytes) -> None:
+        self.archivo.write(datos)
+        self.posicion += len(datos)
+
+    def _reservar(self) -> int:
+        self.posiciones.append(None)
+        return len(self.posiciones)
+
+    def _objeto(self, numero: int, cuerpo: bytes) -> None:
+        self.posiciones[numero - 1] = self.posicion
+        self._escribir(f'{numero} 0 obj\n'.encode() + cuerpo + b'endobj\n')
+
+    def agregar(self, nombre: str, pdf: bytes) -> None:
+        objetos, raiz, info = _objetos_pdf(pdf)
+        paginas = int(re.search(rb'/Pages (\d+) 0 R', objetos[raiz]).group(1))
+        # El catálogo y la información del documento se sustituyen por los del PDF combinado
+        copiar = sorted(n for n in objetos if n not in (raiz, info))
+        nuevos = {viejo: self._reservar() for viejo in copiar}
+
+        def renumerar(coincidencia):
+            return b'%d 0 R' % nuevos[int(coincidencia.group(1))]
+
+        for viejo in copiar:
+            cuerpo = objetos[viejo]
+            # Las referencias solo se reescriben en el diccionario, nunca dentro del flujo binario
+            corte = cuerpo.find(b'stream') if b'endstream' in cuerpo else len(cuerpo)
+            diccionario = _REFERENCIA.sub(renumerar, cuerpo[:corte])
+            if viejo == paginas:
+                diccionario = diccionario.replace(b'<<', b'<<\n/Parent %d 0 R' % self.numero_paginas, 1)
+                self.paginas += int(re.search(rb'/Count (\d+)', diccionario).group(1))
+            self._objeto(nuevos[viejo], diccionario + cuerpo[corte:])
+        self.kids.append(nuevos[paginas])
+
+    def cerrar(self) -> None:
+        try:
+            kids = b' '.join(b'%d 0 R' % n for n in self.kids)
+            self._objeto(self.numero_paginas,
+                         b'<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>\n' % (self.paginas, kids))
+            catalogo = self._reservar()
+            self._objeto(catalogo, b'<<\n/Pages %d 0 R /Type /Catalog\n>>\n' % self.numero_paginas)
+            info = self._reservar()
+            self._objeto(info, b'<<\n/Producer (PulmoReport AI) /Title (PulmoReport AI - Reportes)\n>>\n')
+
+            inicio_xref = self.posicion
+            tabla = [b'xref\n0 %d\n0000000000 65535 f \n' % (len(self.posiciones) + 1)]
+            tabla.extend(b'%010d 00000 n \n' % posicion for posicion in self.posiciones)
+            tabla.append(b'trailer\n<<\n/Info %d 0 R /Root %d 0 R /Size %d\n>>\nstartxref\n%d\n%%%%EOF\n'
+                         % (info, catalogo, len(self.posiciones) + 1, inicio_xref))
+            self._escribir(b''.join(tabla))
+        finally:
+            if self.propio:
+                self.archivo.close()
+
+
+ESCRITORES_REPORTES = {
+    'zip': EscritorReportesZIP,
+    'pdf': EscritorReportesPDF
+}
+
+
+def exportar_reportes(tareas: Iterable, destino, formato: str = 'zip',
+                      crear: Callable[[Any], Tuple[str, bytes]] = reporte_estudio, workers: Optional[int] = None,
+                      procesos: bool = False,
+                      al_avanzar: Optional[Callable[[int, Any, Optional[str]], None]] = None) -> Dict[str, int]:
+    """
+    Genera los reportes de `tareas` (estudios por defecto, ver generar_reportes) y los escribe en
+    `destino` en formato 'zip' o 'pdf'. Tras cada reporte se llama a al_avanzar(completados, tarea,
+    error). Devuelve {'generados', 'errores'}.
+    """
+    if formato not in ESCRITORES_REPORTES:
+        raise ValueError(f"Formato de reportes no soportado: '{formato}' (use {', '.join(ESCRITORES_REPORTES)})")
+    escritor = ESCRITORES_REPORTES[formato](destino)
+    totales = {'generados': 0, 'errores': 0}
+    try:
+        for completados, (tarea, nombre, pdf, error) in enumerate(generar_reportes(tareas, crear, workers, procesos), 1):
+            if error is None:
+                escritor.agregar(nombre, pdf)
+                totales['generados'] += 1
+            else:
+                totales['errores'] += 1
+            if al_avanzar is not None:
+                al_avanzar(completados, tarea, error)
+    finally:
+        escritor.cerrar()
+    return totales
@@ -0,0 +1,159 @@
+from collections.abc import Mapping
+from enum import IntEnum
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+# Etiquetas por código de severidad: (interpretación, severidad)
+SEVERIDADES = (
+    ("Normal", "Sin alteración"),
+    ("Ligeramente reducido", "Leve"),
+    ("Moderadamente reducido", "Moderada"),
+    ("Severamente reducido", "Severa"),
+    ("Muy severamente reducido", "Muy severa")
+)
+
+
+class Severidad(IntEnum):
+    """
+    Código de severidad ATS/ERS de un z-score (índice en SEVERIDADES).
+    """
+    NORMAL = 0
+    LEVE = 1
+    MODERADA = 2
+    SEVERA = 3
+    MUY_SEVERA = 4
+
+    @property
+    def interpretacion(self) -> str:
+        return SEVERIDADES[self][0]
+
+    @property
+    def etiqueta(self) -> str:
+        return SEVERIDADES[self][1]
+
+
+# Parámetros en el orden de las filas de ResultadoEstudio
+PARAMETROS = ('FEV1', 'FVC', 'FEF25-75%', 'DLCO', 'KCO', 'VA', 'TLC', 'VC', 'RV', 'RV/TLC')
+_FILA = {nombre: i for i, nombre in enumerate(PARAMETROS)}
+
+# Columnas numéricas de ResultadoEstudio
+COLUMNAS = ('observado', 'esperado', 'z_score', 'lln', 'percentil')
+
+# Claves de la vista tipo dict de un ResultadoParametro (formato histórico de los analizadores)
+CLAVES_RESULTADO = COLUMNAS + ('interpretacion', 'severidad')
+
+SIN_DATO = -1
+
+
+class ResultadoParametro(Mapping):
+    """
+    Resultado GLI de un parámetro. Registro compacto (__slots__) que además se comporta como el
+    dict de siempre: r['z_score'], r.get('severidad'), r.items()...
+    """
+    __slots__ = ('observado', 'esperado', 'z_score', 'lln', 'percentil', 'codigo')
+
+    def __init__(self, observado: float, esperado: float, z_score: float, lln: float,
+                 percentil: float, codigo: Severidad):
+        self.observado = observado
+        self.esperado = esperado
+        self.z_score = z_score
+        self.lln = lln
+        self.percentil = percentil
+        self.codigo = Severidad(codigo)
+
+    @property
+    def interpretacion(self) -> str:
+        return self.codigo.interpretacion
+
+    @property
+    def severidad(self) -> str:
+        return self.codigo.etiqueta
+
+    def __getitem__(self, clave: str):
+        if clave not in CLAVES_RESULTADO:
+            raise KeyError(clave)
+        return getattr(self, clave)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CLAVES_RESULTADO)
+
+    def __len__(self) -> int:
+        return len(CLAVES_RESULTADO)
+
+    def __repr__(self) -> str:
+        return f"ResultadoParametro({dict(self)!r})"
+
+
+class VistaDominio(Mapping):
+    """
+    Vista tipo dict {parámetro: ResultadoParametro} de un dominio (espirometría, DLCO o volúmenes)
+    sobre un ResultadoEstudio; no copia datos.
+    """
+    __slots__ = ('_estudio', '_parametros')
+
+    def __init__(self, estudio: 'ResultadoEstudio', parametros: Tuple[str, ...]):
+        self._estudio = estudio
+        self._parametros = tuple(p for p in parametros if estudio.tiene(p))
+
+    def __getitem__(self, parametro: str) -> ResultadoParametro:
+        if parametro not in self._parametros:
+            raise KeyError(parametro)
+        return self._estudio.parametro(parametro)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._parametros)
+
+    def __len__(self) -> int:
+        return len(self._parametros)
+
+    def __repr__(self) -> str:
+        return f"VistaDominio({ {p: dict(r) for p, r in self.items()}!r})"
+
+
+class ResultadoEstudio:
+    """
+    Resultados GLI de un estudio en formato columnar: una matriz float (parámetro x COLUMNAS) y un
+    array int8 de códigos de severidad (-1 = parámetro no disponible), más los errores por dominio.
+
+    estudio['espiro'], estudio['dlco'] y estudio['vol'] devuelven la vista de cada dominio con el
+    formato de los analizadores ({"error": ...} si el dominio no pudo analizarse).
+    """
+    __slots__ = ('valores', 'codigos', 'errores', 'dominios')
+
+    def __init__(self, dominios: Dict[str, Tuple[str, ...]], errores: Optional[Dict[str, str]] = None):
+        self.valores = np.full((len(PARAMETROS), len(COLUMNAS)), np.nan)
+        self.codigos = np.full(len(PARAMETROS), SIN_DATO, dtype=np.int8)
+        self.errores = errores if errores is not None else {}
+        self.dominios = dominios
+
+    def registrar(self, parametro: str, valores: Tuple[float, ...], codigo: int) -> None:
+        fila = _FILA[parametro]
+        self.valores[fila] = valores
+        self.codigos[fila] = codigo
+
+    def tiene(self, parametro: str) -> bool:
+        return self.codigos[_FILA[parametro]] != SIN_DATO
+
+    def parametro(self, parametro: str) -> ResultadoParametro:
+        fila = _FILA[parametro]
+        return ResultadoParametro(*self.valores[fila].tolist(), int(self.codigos[fila]))
+
+    def vista(self, dominio: str):
+        if dominio in self.errores:
+            return {"error": self.errores[dominio]}
+        return VistaDominio(self, self.dominios[dominio])
+
+    def __getitem__(self, dominio: str):
+        if dominio not in self.dominios:
+            raise KeyError(dominio)
+        return self.vista(dominio)
+
+    def a_dict(self) -> Dict[str, Dict]:
+        """
+        Copia en dicts planos de todas las vistas (para serializar).
+        """
+        return {
+            dominio: {p: dict(r) for p, r in vista.items()} if isinstance(vista, VistaDominio) else dict(vista)
+            for dominio, vista in ((d, self.vista(d)) for d in self.dominios)
+        }
@@ -0,0 +1,410 @@
+import bisect
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentacion import medir
+
+# Directorio raíz del proyecto, donde residen los archivos Excel de lookup
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ARCHIVO_GLI = 'lookuptables.xlsx'
+ARCHIVO_DLCO = 'lookuptablesdlco.xlsx'
+ARCHIVO_VOL = 'lookuptablesvol.xlsx'
+
+# Caché binario compilado a partir de los tres Excel (ver compilar_cache)
+ARCHIVO_CACHE = 'lookuptables_gli.npz'
+VERSION_CACHE = 1
+
+# Coeficientes fijos para ecuaciones GLI 2017 DLCO
+DLCO_COEFFICIENTS = {
+    'males': {'a': -7.034920, 'p': 2.018368, 'q': 0.012425},
+    'females': {'a': -5.159451, 'p': 1.618697, 'q': 0.015390}
+}
+
+KCO_COEFFICIENTS = {
+    'males': {'a': 4.088408, 'p': 0.415334, 'q': 0.113166},
+    'females': {'a': 5.131492, 'p': 0.645656, 'q': 0.097395}
+}
+
+VA_COEFFICIENTS = {
+    'males': {'a': -11.086573, 'p': 2.430021, 'q': 0.097047},
+    'females': {'a': -9.873970, 'p': 2.182316, 'q': 0.082868}
+}
+
+# Coeficientes fijos para ecuaciones GLI 2021 Volúmenes
+TLC_COEFFICIENTS = {
+    'males': {'a': -10.5861, 'p': 0.1433, 'q': 2.3155},
+    'females': {'a': -10.1128, 'p': 0.1062, 'q': 2.2259}
+}
+
+VC_COEFFICIENTS = {
+    'males': {'a': -10.134371, 'p': -0.003532, 'q': 2.307980},
+    'females': {'a': -9.230600, 'p': -0.005517, 'q': 2.116822}
+}
+
+RV_COEFFICIENTS = {
+    'males': {'a': -2.37211, 'p': 0.01346, 'q': 0.01307},
+    'females': {'a': -2.50593, 'p': 0.01307, 'q': 0.01379}
+}
+
+RVTLC_COEFFICIENTS = {
+    'males': {'a': 2.634, 'p': 0.01302, 'q': -0.00008862},
+    'females': {'a': 2.666, 'p': 0.01411, 'q': -0.00003689}
+}
+
+# Hojas de cada archivo Excel por (parámetro, sexo)
+HOJAS_GLI = {
+    ('fev1', 'males'): 'FEV1 males',
+    ('fev1', 'females'): 'FEV1 females',
+    ('fvc', 'males'): 'FVC males',
+    ('fvc', 'females'): 'FVC females',
+    ('fef2575', 'males'): 'FEF2575 males',
+    ('fef2575', 'females'): 'FEF2575 females'
+}
+
+HOJAS_DLCO = {
+    ('dlco', 'males'): 'DLCO_m',
+    ('dlco', 'females'): 'DLCO_f',
+    ('kco', 'males'): 'KCO_m',
+    ('kco', 'females'): 'KCO_f',
+    ('va', 'males'): 'VA_m',
+    ('va', 'females'): 'VA_f'
+}
+
+HOJAS_VOL = {
+    ('tlc', 'males'): 'tlc_m_lookuptable',
+    ('tlc', 'females'): 'tlc_f_lookuptable',
+    ('vc', 'males'): 'vc_m_lookuptable',
+    ('vc', 'females'): 'vc_f_lookuptable',
+    ('rv', 'males'): 'rv_m_lookuptable',
+    ('rv', 'females'): 'rv_f_lookuptable',
+    ('rvtlc', 'males'): 'rvtlc_m_lookuptable',
+    ('rvtlc', 'females'): 'rvtlc_f_lookuptable'
+}
+
+# Coeficientes fijos a, p, q de los parámetros cuyo Excel solo contiene splines
+COEFICIENTES_FIJOS = {
+    'dlco': DLCO_COEFFICIENTS,
+    'kco': KCO_COEFFICIENTS,
+    'va': VA_COEFFICIENTS,
+    'tlc': TLC_COEFFICIENTS,
+    'vc': VC_COEFFICIENTS,
+    'rv': RV_COEFFICIENTS,
+    'rvtlc': RVTLC_COEFFICIENTS
+}
+
+
+@dataclass(frozen=True)
+class TablaReferencia:
+    """
+    Tabla de referencia GLI de un parámetro y sexo: coeficientes fijos y splines por edad.
+    """
+    edad: np.ndarray
+    lspline: np.ndarray
+    mspline: np.ndarray
+    sspline: np.ndarray
+    a: float
+    p: float
+    q: float
+    coef_s: Optional[Tuple[float, float]] = None  # p0, p1 (solo espirometría)
+    coef_l: Optional[Tuple[float, float]] = None  # q0, q1 (solo espirometría)
+    # S y L precalculados por edad tabulada (None si el Excel no trae coeficientes S/L)
+    s_edad: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+    l_edad: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.coef_s is not None and self.coef_l is not None:
+            ln_edad = np.log(self.edad)
+            object.__setattr__(self, 's_edad', np.exp(self.coef_s[0] + self.coef_s[1] * ln_edad + self.sspline))
+            object.__setattr__(self, 'l_edad', self.coef_l[0] + self.coef_l[1] * ln_edad + self.lspline)
+
+    def indice_edad(self, edad: float) -> int:
+        """
+        Devuelve el índice de la fila cuya edad es la más cercana a la dada.
+        Búsqueda binaria O(log n) sobre las edades ordenadas; ante empate elige la edad menor.
+        """
+        n = len(self.edad)
+        idx = min(max(bisect.bisect_left(self.edad, edad), 1), n - 1)
+        return idx - 1 if edad - self.edad[idx - 1] <= self.edad[idx] - edad else idx
+
+    def indices_edad(self, edades: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de indice_edad (np.searchsorted) para un array de edades.
+        """
+        edades = np.asarray(edades, dtype=float)
+        idx = np.clip(np.searchsorted(self.edad, edades), 1, len(self.edad) - 1)
+        anterior = self.edad[idx - 1]
+        siguiente = self.edad[idx]
+        return np.where(edades - anterior <= siguiente - edades, idx - 1, idx)
+
+    def _valores(self, columna: str) -> np.ndarray:
+        return {'L': self.lspline, 'M': self.mspline, 'S': self.sspline}[columna]
+
+    def spline(self, edad: float, columna: str = 'M', interpolar: bool = False) -> float:
+        """
+        Devuelve el valor del spline L, M o S para la edad más cercana, o interpolado
+        linealmente entre las dos edades tabuladas que la rodean si interpolar=True.
+        """
+        valores = self._valores(columna)
+        if interpolar:
+            return float(np.interp(edad, self.edad, valores))
+        return float(valores[self.indice_edad(edad)])
+
+    def splines(self, edades: np.ndarray, columna: str = 'M', interpolar: bool = False) -> np.ndarray:
+        """
+        Versión vectorizada de spline para un array de edades.
+        """
+        valores = self._valores(columna)
+        if interpolar:
+            return np.interp(edades, self.edad, valores)
+        return valores[self.indices_edad(edades)]
+
+
+    def s_l(self, edad: float, interpolar: bool = False) -> Optional[Tuple[float, float]]:
+        """
+        Devuelve (S, L) de las ecuaciones LMS para la edad dada, o None si la tabla no los trae.
+        """
+        if self.s_edad is None:
+            return None
+        if interpolar:
+            return float(np.interp(edad, self.edad, self.s_edad)), float(np.interp(edad, self.edad, self.l_edad))
+        i = self.indice_edad(edad)
+        return float(self.s_edad[i]), float(self.l_edad[i])
+
+    def s_l_lote(self, edades: np.ndarray, interpolar: bool = False) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Versión vectorizada de s_l para un array de edades.
+        """
+        if self.s_edad is None:
+            return None
+        if interpolar:
+            return np.interp(edades, self.edad, self.s_edad), np.interp(edades, self.edad, self.l_edad)
+        idx = self.indices_edad(edades)
+        return self.s_edad[idx], self.l_edad[idx]
+
+
+# Almacén de tablas, cargado una sola vez por proceso
+_tablas: Dict[Tuple[str, str], TablaReferencia] = {}
+_lock = threading.Lock()
+# Se incrementa en cada carga; permite invalidar cachés derivados de las tablas
+_version = 0
+
+
+def sexo_en(sexo: str) -> str:
+    """
+    Traduce el sexo del informe ('Masculino'/'Femenino') a la clave usada en las tablas.
+    """
+    return 'females' if 'femenino' in str(sexo).lower() else 'males'
+
+
+def _parsear_splines(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Localiza la cabecera 'age' de una hoja y devuelve los arrays edad, L, M y S.
+    """
+    fila, columna = next(
+        (i, j) for i in range(len(df)) for j in range(df.shape[1])
+        if str(df.iat[i, j]).strip().lower() == 'age'
+    )
+    cabecera = {str(df.iat[fila, j]).strip(): j for j in range(columna, df.shape[1])}
+    datos = df.iloc[fila + 1:]
+    edad = pd.to_numeric(datos.iloc[:, columna], errors='coerce').to_numpy(dtype=float)
+    validas = ~np.isnan(edad)
+
+    def _columna(nombre):
+        if nombre not in cabecera:
+            return np.zeros(int(validas.sum()))
+        valores = pd.to_numeric(datos.iloc[:, cabecera[nombre]], errors='coerce').to_numpy(dtype=float)
+        return np.nan_to_num(valores[validas])
+
+    return edad[validas], _columna('Lspline'), _columna('Mspline'), _columna('Sspline')
+
+
+def _cargar_hojas_espirometria(ruta: str) -> Dict[Tuple[str, str], TablaReferencia]:
+    """
+    Carga las hojas de espirometría: splines y coeficientes a, p, q, S y L del propio Excel.
+    """
+    tablas = {}
+    hojas = pd.read_excel(ruta, sheet_name=list(HOJAS_GLI.values()), header=None, engine='openpyxl')
+    for key, sheet in HOJAS_GLI.items():
+        df = hojas[sheet]
+        edad, lspline, mspline, sspline = _parsear_splines(df)
+        # I4, I5, I6: intercepto (a0), altura (a1) y edad (a2) de la ecuación M
+        a = float(df.iloc[3, 8])
+        p = float(df.iloc[4, 8])
+        q = float(df.iloc[5, 8])
+        # L4, L6: p0 y p1 de la ecuación S; O4, O6: q0 y q1 de la ecuación L
+        coef_s = (float(df.iloc[3, 11]), float(df.iloc[5, 11]))
+        coef_l = (float(df.iloc[3, 14]), float(df.iloc[5, 14]))
+        tablas[key] = TablaReferencia(edad, lspline, mspline, sspline, a, p, q, coef_s, coef_l)
+    return tablas
+
+
+def _cargar_hojas_splines(ruta: str, hojas_por_clave: Dict[Tuple[str, str], str]) -> Dict[Tuple[str, str], TablaReferencia]:
+    """
+    Carga hojas que solo contienen splines y les asocia los coeficientes fijos del módulo.
+    """
+    tablas = {}
+    hojas = pd.read_excel(ruta, sheet_name=list(hojas_por_clave.values()), header=None, engine='openpyxl')
+    for (parametro, sexo), sheet in hojas_por_clave.items():
+        edad, lspline, mspline, sspline = _parsear_splines(hojas[sheet])
+        coef = COEFICIENTES_FIJOS[parametro][sexo]
+        tablas[(parametro, sexo)] = TablaReferencia(edad, lspline, mspline, sspline, coef['a'], coef['p'], coef['q'])
+    return tablas
+
+
+@medir('gli.tablas_excel')
+def _cargar_desde_excel() -> Dict[Tuple[str, str], TablaReferencia]:
+    """
+    Parsea los tres archivos Excel de lookup (lento: openpyxl).
+    """
+    tablas = _cargar_hojas_espirometria(os.path.join(BASE_DIR, ARCHIVO_GLI))
+    tablas.update(_cargar_hojas_splines(os.path.join(BASE_DIR, ARCHIVO_DLCO), HOJAS_DLCO))
+    tablas.update(_cargar_hojas_splines(os.path.join(BASE_DIR, ARCHIVO_VOL), HOJAS_VOL))
+    return tablas
+
+
+def _rutas_fuente() -> List[str]:
+    return [os.path.join(BASE_DIR, f) for f in (ARCHIVO_GLI, ARCHIVO_DLCO, ARCHIVO_VOL)]
+
+
+def _firma_fuentes(rutas: List[str]) -> np.ndarray:
+    """
+    Tamaño y mtime (ns) de cada archivo fuente: comprobación rápida sin leer su contenido.
+    """
+    return np.array([[os.stat(r).st_size, os.stat(r).st_mtime_ns] for r in rutas], dtype=np.int64)
+
+
+def _hash_fuentes(rutas: List[str]) -> str:
+    """
+    SHA-256 del contenido de los archivos fuente y de la versión del formato de caché.
+    """
+    h = hashlib.sha256(f'v{VERSION_CACHE}'.encode())
+    for ruta in rutas:
+        with open(ruta, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def _guardar_cache(tablas: Dict[Tuple[str, str], TablaReferencia], ruta_cache: str, hash_fuentes: str, firma: np.ndarray) -> None:
+    """
+    Escribe todas las tablas en un único .npz (escritura atómica mediante archivo temporal).
+    """
+    arrays = {'__hash__': np.array(hash_fuentes), '__firma__': firma}
+    for (parametro, sexo), tabla in tablas.items():
+        nombre = f'{parametro}_{sexo}'
+        coef_s = tabla.coef_s or (np.nan, np.nan)
+        coef_l = tabla.coef_l or (np.nan, np.nan)
+        arrays[nombre] = np.vstack([tabla.edad, tabla.lspline, tabla.mspline, tabla.sspline])
+        arrays[nombre + '_coef'] = np.array([tabla.a, tabla.p, tabla.q, *coef_s, *coef_l])
+    tmp = f'{ruta_cache}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, ruta_cache)
+
+
+@medir('gli.tablas_cache')
+def _leer_cache(ruta_cache: str, rutas: List[str]) -> Optional[Dict[Tuple[str, str], TablaReferencia]]:
+    """
+    Lee el .npz compilado si corresponde a los archivos fuente actuales; None si falta o está obsoleto.
+    """
+    if not os.path.exists(ruta_cache):
+        return None
+    firma = _firma_fuentes(rutas)
+    with np.load(ruta_cache, allow_pickle=False) as npz:
+        # Si tamaño y mtime coinciden no hace falta leer los Excel; si no, decide el hash del contenido
+        hash_cache = str(npz['__hash__'])
+        firma_obsoleta = not np.array_equal(npz['__firma__'], firma)
+        if firma_obsoleta and hash_cache != _hash_fuentes(rutas):
+            return None
+        tablas = {}
+        for key in [*HOJAS_GLI, *HOJAS_DLCO, *HOJAS_VOL]:
+            nombre = f'{key[0]}_{key[1]}'
+            edad, lspline, mspline, sspline = npz[nombre]
+            a, p, q, s0, s1, l0, l1 = npz[nombre + '_coef'].tolist()
+            coef_s = None if np.isnan(s0) else (s0, s1)
+            coef_l = None if np.isnan(l0) else (l0, l1)
+            tablas[key] = TablaReferencia(edad, lspline, mspline, sspline, a, p, q, coef_s, coef_l)
+    if firma_obsoleta:
+        # Mismo contenido con otro mtime (p.ej. tras un checkout): se actualiza la firma para que
+        # las próximas cargas no vuelvan a calcular el hash de los Excel
+        try:
+            _guardar_cache(tablas, ruta_cache, hash_cache, firma)
+        except OSError as e:
+            print(f"No se pudo actualizar la firma del caché de tablas GLI: {e}")
+    return tablas
+
+
+def compilar_cache(ruta_cache: Optional[str] = None) -> str:
+    """
+    Paso de build: parsea los Excel y escribe el caché binario. Devuelve la ruta escrita.
+    """
+    ruta_cache = ruta_cache or os.path.join(BASE_DIR, ARCHIVO_CACHE)
+    rutas = _rutas_fuente()
+    _guardar_cache(_cargar_desde_excel(), ruta_cache, _hash_fuentes(rutas), _firma_fuentes(rutas))
+    return ruta_cache
+
+
+def cargar_tablas_referencia(forzar: bool = False) -> bool:
+    """
+    Carga una sola vez por proceso todas las tablas GLI (espirometría, DLCO y volúmenes).
+    Usa el caché binario compilado si está vigente; si no, parsea los Excel y lo regenera.
+    """
+    global _version
+    if _tablas and not forzar:
+        return True
+    with _lock:
+        if _tablas and not forzar:
+            return True
+        ruta_cache = os.path.join(BASE_DIR, ARCHIVO_CACHE)
+        rutas = _rutas_fuente()
+        try:
+            tablas = _leer_cache(ruta_cache, rutas)
+        except Exception as e:
+            print(f"Caché de tablas GLI ilegible, se regenerará: {e}")
+            tablas = None
+        if tablas is None:
+            try:
+                tablas = _cargar_desde_excel()
+            except Exception as e:
+                print(f"Error cargando tablas de referencia GLI: {e}")
+                print("Asegúrate de que los archivos de lookup estén presentes y que openpyxl esté instalado correctamente.")
+                return False
+            try:
+                _guardar_cache(tablas, ruta_cache, _hash_fuentes(rutas), _firma_fuentes(rutas))
+            except OSError as e:
+                # Sistema de archivos de solo lectura: se sigue con las tablas en memoria
+                print(f"No se pudo escribir el caché de tablas GLI: {e}")
+        _tablas.clear()
+        _tablas.update(tablas)
+        _version += 1
+        return True
+
+
+def version_tablas() -> int:
+    """
+    Número de versión de las tablas cargadas (0 si aún no se han cargado).
+    """
+    return _version
+
+
+def obtener_tabla(parametro: str, sexo: str) -> TablaReferencia:
+    """
+    Devuelve la tabla de referencia del parámetro ('fev1', 'dlco', 'rvtlc'...) para el sexo dado.
+    """
+    if not cargar_tablas_referencia():
+        raise RuntimeError('No se pudieron cargar las tablas de referencia GLI')
+    key = (parametro.lower(), sexo_en(sexo))
+    if key not in _tablas:
+        raise ValueError(f'Parámetro no soportado: {parametro}')
+    return _tablas[key]
+
+
+if __name__ == '__main__':
+    # Paso de build: python -m utils.tablas_gli
+    print(f"Caché de tablas GLI escrito en {compilar_cache()}")